@@ -13,11 +13,13 @@ from setuptools.command.install_scripts import install_scripts
 from setuptools.command.sdist import sdist
 from wheel.bdist_wheel import bdist_wheel
 
+#: The grammar variants of the xonsh parser, one per module in xonsh/parsers.
+GRAMMAR_VARIANTS = ["v310", "v313"]
+
 TABLES = [
     "xonsh/lexer_table.py",
-    "xonsh/parser_table.py",
-    "xonsh/completion_parser_table.py",
-]
+    "xonsh/completion_parser_table.marshal",
+] + [f"xonsh/parser_table_{variant}.marshal" for variant in GRAMMAR_VARIANTS]
 
 
 def python_tag():
@@ -37,18 +39,23 @@ os.environ["XONSH_DEBUG"] = "1"
 
 
 def build_tables():
-    """Build the lexer/parser modules."""
+    """Build the lexer/parser modules, along with the parser tables of every
+    grammar variant, so that none of them are generated at startup.
+    """
     print("Building lexer and parser tables.", file=sys.stderr)
     root_dir = os.path.abspath(os.path.dirname(__file__))
     sys.path.insert(0, root_dir)
-    from xonsh.parser import Parser
+    import importlib
+
     from xonsh.parsers.completion_context import CompletionContextParser
 
-    Parser(
-        yacc_table="parser_table",
-        outputdir=os.path.join(root_dir, "xonsh"),
-        yacc_debug=True,
-    )
+    for variant in GRAMMAR_VARIANTS:
+        module = importlib.import_module(f"xonsh.parsers.{variant}")
+        module.Parser(
+            yacc_table="parser_table",
+            outputdir=os.path.join(root_dir, "xonsh"),
+            yacc_debug=True,
+        )
     CompletionContextParser(
         yacc_table="completion_parser_table",
         outputdir=os.path.join(root_dir, "xonsh"),
@@ -167,7 +174,7 @@ class xsdist(sdist):
         clean_tables()
         build_tables()
         dirty = dirty_version()
-        files.extend(TABLES)
+        files.extend(f for f in TABLES if os.path.isfile(f))
         super().make_release_tree(basedir, files)
         if dirty:
             restore_version()
@@ -2,18 +2,26 @@
 
 # pylint: disable=protected-access
 
+import json
+import os
 import shlex
 
 import pytest
 
 from xonsh.history.json import (
     JsonHistory,
+    JsonHistoryGC,
+    JsonHistoryIndex,
+    JsonHistoryLoader,
+    JsonHistoryManifest,
+    JsonHistorySearchIndex,
     _xhj_gc_bytes_to_rmfiles,
     _xhj_gc_commands_to_rmfiles,
     _xhj_gc_files_to_rmfiles,
     _xhj_gc_seconds_to_rmfiles,
 )
 from xonsh.history.main import HistoryAlias, history_main
+from xonsh.history.stats import history_stats
 from xonsh.lib.lazyjson import LazyJSON
 
 CMDS = ["ls", "cat hello kitty", "abc", "def", "touch me", "grep from me"]
@@ -308,6 +316,15 @@ def test_parse_args_help(args, capsys):
     assert "show this help message and exit" in capsys.readouterr()[0]
 
 
+def test_show_missing_file(tmpdir, xession, capsys):
+    missing = str(tmpdir.join("nope"))
+    with pytest.raises(SystemExit):
+        history_main(["show", "zsh", "-l", missing])
+    assert f"history: error: [Errno 2] No such file or directory: {missing!r}" in (
+        capsys.readouterr()[1]
+    )
+
+
 @pytest.mark.parametrize(
     "args, session, slice, numerate, reverse",
     [
@@ -615,6 +632,33 @@ def test_hist_on_cmd(hist, xession, capsys, tmpdir):
     assert len(xession.history) == 6
 
 
+def test_hist_all_items_from_index(tmpdir, xession, monkeypatch):
+    """all_items() is served by the index and falls back to files it misses."""
+    xession.env["XONSH_DATA_DIR"] = str(tmpdir)
+    xession.env["HISTCONTROL"] = set()
+    old = JsonHistory(gc=False)
+    old.append({"inp": "old", "rtn": 0, "ts": [1, 2]})
+    old.flush(at_exit=True)
+    # forget about the session, as if it was written by an older xonsh
+    index = JsonHistoryIndex()
+    os.remove(index.filename)
+
+    hist = JsonHistory(gc=False)
+    for ts, cmd in enumerate(CMDS):
+        hist.append({"inp": cmd, "rtn": 0, "ts": [ts + 3, ts + 4], "out": "x"})
+    hist.flush(at_exit=True)
+    # all_items() also lists the session items after the files
+    assert [i["inp"] for i in hist.all_items()][:7] == ["old"] + CMDS
+
+    files, _ = index.read()
+    assert files[hist.filename][1][-1] == {"inp": CMDS[-1], "rtn": 0, "ts": [8, 9]}
+    monkeypatch.setattr(LazyJSON, "load", lambda self: pytest.fail("loaded"))
+    monkeypatch.setattr(hist, "items", lambda: iter(()))
+    assert [i["inp"] for i in hist.all_items(newest_first=True)] == CMDS[::-1] + [
+        "old"
+    ]
+
+
 @pytest.mark.parametrize(
     "src_sessionid", [None, "e2265764-041c-4c57-acba-49d4e4f676e5"]
 )
@@ -703,3 +747,257 @@ def test_hist_pull_mixed(ptk_shell, tmpdir, xonsh_session, monkeypatch):
 
     hist_strings = ptk_shell[2].prompter.history.get_strings()
     assert hist_strings == ["a1", "b1", "a2", "b2"]
+
+
+def test_hist_search(tmpdir, xession, capsys, monkeypatch):
+    """history search goes through the inverted index and the buffer."""
+    xession.env["XONSH_DATA_DIR"] = str(tmpdir)
+    xession.env["HISTCONTROL"] = set()
+    old = JsonHistory(gc=False)
+    old.append({"inp": "git commit -m fix", "rtn": 1, "ts": [1, 2], "cwd": "/a"})
+    old.append({"inp": "git status", "rtn": 0, "ts": [3, 4], "cwd": "/b"})
+    old.flush(at_exit=True)
+    hist = JsonHistory(gc=False)
+    xession.history = hist
+    hist.append({"inp": "git commit --amend", "rtn": 0, "ts": [5, 6], "cwd": "/a"})
+    hist.flush(at_exit=True)
+    hist.append({"inp": "echo git", "rtn": 0, "ts": [7, 8], "cwd": "/a"})
+
+    inps = lambda results: [r["inp"] for r in results]  # noqa: E731
+    assert inps(hist.search("git")) == [
+        "echo git",
+        "git commit --amend",
+        "git status",
+        "git commit -m fix",
+    ]
+    commits = ["git commit --amend", "git commit -m fix"]
+    assert inps(hist.search('"git com"*')) == commits
+    assert inps(hist.search("git", cwd="/a", rtn=0)) == ["echo git", commits[0]]
+    assert inps(hist.search("git", start_time=3, end_time=5)) == ["git status"]
+    assert inps(hist.search("commit git")) == commits
+    assert hist.search('"commit git"') == []
+
+    index = JsonHistorySearchIndex()
+    assert set(index.files) == {old.filename, hist.filename}
+    with open(index.filename) as f:
+        lines = f.readlines()
+    assert "git status" not in "".join(lines)  # inputs are not copied
+    hist.search("git")
+    with open(index.filename) as f:
+        assert f.readlines() == lines
+    hist.append({"inp": "git log", "rtn": 0, "ts": [9, 10]})
+    hist.flush(at_exit=True)
+    # only the changed history file is read, the history index is not
+    read = []
+    inputs = JsonHistorySearchIndex._inputs
+    with monkeypatch.context() as m:
+        m.setattr(
+            JsonHistorySearchIndex,
+            "_inputs",
+            staticmethod(lambda path: read.append(path) or inputs(path)),
+        )
+        m.setattr(JsonHistoryIndex, "commands", None)
+        assert inps(hist.search("log")) == ["git log"]
+    assert read == [hist.filename]
+    with open(index.filename) as f:
+        added = f.readlines()[len(lines) :]
+    # only the flushed commands are indexed
+    assert len(added) == 1 and '"start": 1, "count": 2' in added[0]
+    assert JsonHistorySearchIndex().files[hist.filename]["count"] == 3
+
+    history_main(["search", "-n", "1", "git"])
+    out, _ = capsys.readouterr()
+    assert out == "git log\n"
+
+
+def test_hist_gc_manifest(tmpdir, xession, monkeypatch):
+    """gc only opens the history files that changed since its last run."""
+    xession.env["XONSH_DATA_DIR"] = str(tmpdir)
+    xession.env["HISTCONTROL"] = set()
+    xession.env["XONSH_HISTORY_SIZE"] = (2, "commands")
+    hists = []
+    for i in range(3):
+        hist = JsonHistory(gc=False, ts=[i + 1, None])
+        hist.append({"inp": f"cmd{i}", "rtn": 0, "ts": [i + 1, i + 2]})
+        hist.flush(at_exit=True)
+        hists.append(hist)
+
+    gc = JsonHistoryGC(wait_for_shell=False)
+    gc.join()
+    assert not os.path.exists(hists[0].filename)
+    manifest = JsonHistoryManifest()
+    assert set(manifest.files) == {hists[1].filename, hists[2].filename}
+    assert manifest.files[hists[2].filename]["ncmds"] == 1
+
+    hists[2].append({"inp": "cmd3", "rtn": 0, "ts": [4, 5]})
+    hists[2].flush(at_exit=True)
+    scanned = []
+    scan = JsonHistoryManifest._scan
+
+    def tracking_scan(path, stat):
+        scanned.append(path)
+        return scan(path, stat)
+
+    monkeypatch.setattr(JsonHistoryManifest, "_scan", staticmethod(tracking_scan))
+    JsonHistoryGC(wait_for_shell=False, size=(10, "commands")).join()
+    assert scanned == [hists[2].filename]
+    manifest = JsonHistoryManifest()
+    assert manifest.files[hists[2].filename]["ncmds"] == 2
+
+
+def test_hist_pull_from_index_cursor(ptk_shell, tmpdir, xonsh_session, monkeypatch):
+    """pull only reads what was appended to the history index since the last
+    pull, and starts over when the index gets compacted.
+    """
+    xonsh_session.env["XONSH_DATA_DIR"] = str(tmpdir)
+    monkeypatch.setattr(xonsh_session.shell, "shell", ptk_shell[2])
+    hist_a = JsonHistory(gc=False)
+    hist_main = JsonHistory(gc=False)
+
+    def cmd(inp):
+        # windows time.time() has ~16ms granularity
+        time.sleep(0.032)
+        start, end = time.time(), time.time()
+        return {"inp": inp, "rtn": 0, "ts": [start, end]}
+
+    hist_a.append(cmd("a1"))
+    hist_a.flush(at_exit=True)
+    with monkeypatch.context() as m:
+        m.setattr(LazyJSON, "load", lambda self: pytest.fail("loaded"))
+        assert hist_main.pull() == 1
+    _, offset = hist_main.last_pull_cursors[None]
+    assert offset == os.path.getsize(JsonHistoryIndex().filename)
+
+    hist_a.append(cmd("a2"))
+    hist_a.flush(at_exit=True)
+    index = JsonHistoryIndex()
+    files = index.commands([hist_a.filename])
+    index.compact({path: (index._stat(path), cmds) for path, cmds in files})
+    assert hist_main.pull() == 1
+    assert ptk_shell[2].prompter.history.get_strings() == ["a1", "a2"]
+
+
+@pytest.mark.parametrize("compression", ["zlib", "lzma"])
+def test_hist_store_compressed_stdout(compression, hist, xession):
+    """Large outputs are compressed in the file and read back transparently."""
+    xession.env["HISTCONTROL"] = set()
+    xession.env["XONSH_STORE_STDOUT"] = True
+    xession.env["XONSH_HISTORY_COMPRESSION"] = compression
+    xession.env["XONSH_STORE_STDOUT_MAX_SIZE"] = 3000
+    out = "".join(f"line {i}\n" for i in range(1000))
+    hist.append({"inp": "seq", "rtn": 0, "out": out})
+    hist.append({"inp": "echo", "rtn": 0, "out": "short"})
+    hist.flush(at_exit=True)
+    with LazyJSON(hist.filename) as lj:
+        stored = lj["cmds"][0]["out"].load()
+        assert list(stored) == [compression]
+        assert lj["cmds"][1]["out"] == "short"
+    assert hist.outs[0] == out[-3000:]
+    assert hist.outs[1] == "short"
+
+
+def test_hist_flush_appends(hist, xession, monkeypatch):
+    """Flushes only append the new commands, the file is rewritten at exit."""
+    xession.env["HISTCONTROL"] = set()
+    for i, cmd in enumerate(CMDS):
+        hist.append({"inp": cmd, "rtn": 0, "ts": [i, i + 1]})
+        with monkeypatch.context() as m:
+            m.setattr(LazyJSON, "load", lambda self: pytest.fail("rewritten"))
+            hist.flush().join()
+    hist.append({"inp": "exit", "rtn": 0, "ts": [9, 10]})
+    hist.flush(at_exit=True)
+    with LazyJSON(hist.filename) as lj:
+        assert [c["inp"] for c in lj["cmds"]] == CMDS + ["exit"]
+        assert lj["locked"] is False
+    assert list(hist.inps) == CMDS + ["exit"]
+
+
+def test_hist_stats(tmpdir, xession, capsys):
+    """history stats aggregates the commands of all sessions."""
+    xession.env["XONSH_DATA_DIR"] = str(tmpdir)
+    xession.env["HISTCONTROL"] = set()
+    old = JsonHistory(gc=False)
+    old.append({"inp": "make all", "rtn": 2, "ts": [0, 10], "cwd": "/src"})
+    old.append({"inp": "make", "rtn": 0, "ts": [20, 22], "cwd": "/src"})
+    old.flush(at_exit=True)
+    hist = JsonHistory(gc=False)
+    xession.history = hist
+    hist.append({"inp": "ls -l", "rtn": 0, "ts": [3600, 3601], "cwd": "/"})
+
+    columns = hist.columns()
+    assert len(columns) == 3
+    stats = history_stats(columns)
+    assert stats["commands by hour"][:2] != [0, 0]
+    make, ls = stats["most used commands"]
+    assert make["command"] == "make"
+    assert (make["count"], make["failures"], make["failure_rate"]) == (2, 1, 0.5)
+    assert make["mean"] == 6
+    assert make["p95"] == pytest.approx(9.6)
+    assert ls["command"] == "ls"
+    assert stats["busiest directories"] == [("/src", 2), ("/", 1)]
+
+    history_main(["stats", "--json", "-n", "1"])
+    out, _ = capsys.readouterr()
+    assert [c["command"] for c in json.loads(out)["most used commands"]] == ["make"]
+
+    # no return code nor end time
+    hist.append({"inp": "pwd", "ts": [7200, None]})
+    history_main(["stats", "--json", "-n", "3"])
+    out, _ = capsys.readouterr()
+
+    def parse_constant(name):
+        raise ValueError(f"invalid JSON constant {name}")
+
+    pwd = json.loads(out, parse_constant=parse_constant)["most used commands"][2]
+    assert pwd["command"] == "pwd"
+    assert pwd["failure_rate"] is pwd["mean"] is pwd["p95"] is None
+
+
+@pytest.mark.parametrize("workers, window", [(None, None), (1, 1)])
+def test_hist_loader_merges_sessions(workers, window, tmpdir, xession):
+    """The loader merges the commands of concurrent sessions by start time."""
+    xession.env["XONSH_DATA_DIR"] = str(tmpdir)
+    xession.env["HISTCONTROL"] = set()
+    xession.env["XONSH_STORE_STDOUT"] = True
+    xession.env["XONSH_HISTORY_COMPRESSION_THRESHOLD"] = 1
+    first, second = JsonHistory(gc=False), JsonHistory(gc=False)
+    now = time.time()
+    for ts, hist in enumerate([first, second, first, second, second]):
+        cmd = {"inp": f"echo {ts}", "rtn": 0, "ts": [now + ts, now + ts + 0.5]}
+        hist.append(dict(cmd, out=f"{ts}\n" * 100))
+    first.flush(at_exit=True)
+    second.flush(at_exit=True)
+
+    loader = JsonHistoryLoader(
+        [second.filename, first.filename], workers=workers, window=window
+    )
+    cmds = list(loader)
+    assert [c["inp"] for c in cmds] == [f"echo {ts}" for ts in range(5)]
+    assert cmds[3]["out"] == "3\n" * 100
+    assert list(second.all_items(full=True)) == cmds
+
+
+def test_hist_transfer_to_sqlite(tmpdir, xession):
+    """history transfer copies the complete commands, merged by time."""
+    from xonsh.history.sqlite import SqliteHistory
+
+    xession.env["XONSH_DATA_DIR"] = str(tmpdir)
+    xession.env["HISTCONTROL"] = set()
+    xession.env["XONSH_HISTORY_SQLITE_WRITE_DELAY"] = 0
+    xession.history = first = JsonHistory(gc=False)
+    second = JsonHistory(gc=False)
+    now = time.time()
+    for ts, hist in enumerate([second, first, second]):
+        cmd = {"inp": f"echo {ts}", "rtn": ts, "ts": [now + ts, now + ts + 1]}
+        hist.append(dict(cmd, cwd=f"/{ts}"))
+    first.flush(at_exit=True)
+    second.flush(at_exit=True)
+
+    db = str(tmpdir / "history.sqlite")
+    HistoryAlias().transfer("json", target="sqlite", target_file=db)
+    items = list(SqliteHistory(filename=db, gc=False).all_items())
+    assert [(i["inp"], i["rtn"], i["cwd"]) for i in items] == [
+        ("echo 0", 0, "/0"),
+        ("echo 1", 1, "/1"),
+        ("echo 2", 2, "/2"),
+    ]
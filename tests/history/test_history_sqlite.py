@@ -4,11 +4,13 @@
 import itertools
 import os
 import shlex
+import sqlite3
 import sys
 import time
 
 import pytest
 
+import xonsh.history.search as xhs
 from xonsh.history.main import history_main
 from xonsh.history.sqlite import SqliteHistory, _xh_sqlite_get_conn
 from xonsh.platform import ON_WINDOWS
@@ -375,6 +377,9 @@ def test_hist_pull(src_sessionid, tmpdir, ptk_shell, monkeypatch):
     after = time.time() + 1
     hist_a.append({"inp": "cmd hist_a after", "rtn": 0, "ts": [after, after]})
     hist_b.append({"inp": "cmd hist_b after", "rtn": 0, "ts": [after + 1, after + 1]})
+    # the other sessions write their commands in the background
+    hist_a.flush()
+    hist_b.flush()
 
     # pull only works with PTK shell
     monkeypatch.setattr("xonsh.built_ins.XSH.shell.shell", ptk_shell[2])
@@ -389,6 +394,33 @@ def test_hist_pull(src_sessionid, tmpdir, ptk_shell, monkeypatch):
         assert hist_strings == ["cmd hist_a after"]
 
 
+def test_hist_write_behind(hist, xession):
+    """Commands are written in batches, after a bounded delay."""
+    xession.env["HISTCONTROL"] = set()
+    xession.env["XONSH_HISTORY_SQLITE_WRITE_DELAY"] = 0.05
+    hist.append({"inp": "ls", "rtn": 0, "ts": [1, 2]})
+    hist.append({"inp": "pwd", "rtn": 0, "ts": [3, 4]})
+
+    def count():
+        with _xh_sqlite_get_conn(hist.filename) as conn:
+            try:
+                sql = "SELECT count(*) FROM xonsh_history"
+                return conn.execute(sql).fetchone()[0]
+            except sqlite3.OperationalError:
+                return 0  # no table yet
+
+    assert len(hist.buffer) == 2 and count() == 0
+    deadline = time.time() + 5
+    while count() < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert not hist.buffer and count() == 2
+    assert [i["inp"] for i in hist.all_items()] == ["ls", "pwd"]
+    with _xh_sqlite_get_conn(hist.filename) as conn:
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "wal"
+    _clean_up(hist)
+
+
 def test_hist_pull_mixed(ptk_shell, tmpdir, xonsh_session, monkeypatch):
     """Test that mixing general pull with session-specific pull
     does not result in missed or duplicate items.
@@ -409,6 +441,8 @@ def test_hist_pull_mixed(ptk_shell, tmpdir, xonsh_session, monkeypatch):
     time.sleep(0.032)
     hist_a.append(cmd("a1"))
     hist_b.append(cmd("b1"))
+    hist_a.flush()
+    hist_b.flush()
     hist_main.pull(src_sessionid=str(hist_a.sessionid))
     # at this point, hist_main will only have "a1" in its history
     assert ptk_shell[2].prompter.history.get_strings() == ["a1"]
@@ -416,8 +450,63 @@ def test_hist_pull_mixed(ptk_shell, tmpdir, xonsh_session, monkeypatch):
     time.sleep(0.032)
     hist_a.append(cmd("a2"))
     hist_b.append(cmd("b2"))
+    hist_a.flush()
+    hist_b.flush()
     hist_main.pull()
     # hist_main should now have all the items we just added
 
     hist_strings = ptk_shell[2].prompter.history.get_strings()
     assert hist_strings == ["a1", "b1", "a2", "b2"]
+
+
+def test_hist_search(hist, xession):
+    """history search goes through the FTS5 index."""
+    xession.env["HISTCONTROL"] = set()
+    xession.env["XONSH_STORE_STDOUT"] = True
+    hist.append({"inp": "git commit -m fix", "rtn": 1, "ts": [1, 2], "out": "oops"})
+    hist.append({"inp": "git status", "rtn": 0, "ts": [3, 4], "out": "clean"})
+    hist.append({"inp": "git commit --amend", "rtn": 0, "ts": [5, 6]})
+    inps = lambda results: [r["inp"] for r in results]  # noqa: E731
+    assert inps(hist.search("git")) == [
+        "git commit --amend",
+        "git status",
+        "git commit -m fix",
+    ]
+    assert inps(hist.search("com*")) == ["git commit --amend", "git commit -m fix"]
+    assert inps(hist.search("git", rtn=0, start_time=4)) == ["git commit --amend"]
+    assert inps(hist.search("oops")) == []
+    assert inps(hist.search("oops", outputs=True)) == ["git commit -m fix"]
+    hist.delete("git status")
+    assert inps(hist.search("status")) == []
+    _clean_up(hist)
+
+
+@pytest.mark.parametrize("query", ["foo_bar", "bar", "foo*", "cafe", "CAFÉ"])
+def test_hist_search_tokens_like_json(hist, xession, query):
+    """The FTS5 index and the JSON backend split words the same way."""
+    xession.env["HISTCONTROL"] = set()
+    items = [
+        {"inp": inp, "rtn": 0, "ts": [i, i + 1]}
+        for i, inp in enumerate(["ls foo_bar", "foo bar", "foobar", "café"])
+    ]
+    for item in items:
+        hist.append(dict(item))
+    inps = lambda results: sorted(r["inp"] for r in results)  # noqa: E731
+    assert inps(hist.search(query)) == inps(xhs.search_items(items, query))
+    _clean_up(hist)
+
+
+def test_hist_store_compressed_stdout(hist, xession):
+    """Large outputs are compressed in the database and can still be searched."""
+    xession.env["HISTCONTROL"] = set()
+    xession.env["XONSH_STORE_STDOUT"] = True
+    out = "".join(f"line {i}\n" for i in range(1000)) + "needle\n"
+    hist.append({"inp": "seq", "rtn": 0, "ts": [1, 2], "out": out})
+    hist.append({"inp": "echo", "rtn": 0, "ts": [3, 4], "out": "needle"})
+    with hist._db() as conn:
+        (stored,) = conn.execute("SELECT out FROM xonsh_history WHERE inp='seq'")
+    assert isinstance(stored[0], bytes)
+    assert len(stored[0]) < len(out)
+    results = hist.search("needle", outputs=True)
+    assert [(r["inp"], r["out"]) for r in results] == [("echo", "needle"), ("seq", out)]
+    _clean_up(hist)
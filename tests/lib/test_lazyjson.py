@@ -2,7 +2,7 @@
 
 from io import StringIO
 
-from xonsh.lib.lazyjson import LazyJSON, LJNode, index, ljdump
+from xonsh.lib.lazyjson import LazyJSON, LJNode, dumps, index, ljappend, ljdump
 
 
 def test_index_int():
@@ -171,3 +171,27 @@ def test_lazy_dict_dict_int():
     assert 42 == lj["wakka"]["jawaka"]
     assert 1 == len(lj)
     assert x == lj.load()
+
+
+def test_ljappend(tmpdir):
+    f = str(tmpdir / "lj.json")
+    obj = {"cmds": [], "ts": [1, None], "wakka": "jawaka"}
+    with open(f, "w", newline="\n") as fp:
+        ljdump(obj, fp, sort_keys=True, append_key="cmds")
+    assert ljappend(f, "cmds", [{"inp": "ls", "rtn": 0}], sort_keys=True) == 0
+    assert ljappend(f, "cmds", [{"inp": "é"}, [42]], sort_keys=True) == 1
+    obj["cmds"] = [{"inp": "ls", "rtn": 0}, {"inp": "é"}, [42]]
+    with open(f, newline="\n") as fp:
+        assert fp.read() == dumps(obj, sort_keys=True, append_key="cmds")
+    with LazyJSON(f) as lj:
+        assert lj["cmds"][1]["inp"] == "é"
+        assert lj.load() == obj
+
+
+def test_ljappend_not_appendable(tmpdir):
+    f = str(tmpdir / "lj.json")
+    with open(f, "w", newline="\n") as fp:
+        ljdump({"cmds": []}, fp)
+    assert ljappend(f, "cmds", [1]) is None
+    with LazyJSON(f) as lj:
+        assert lj.load() == {"cmds": []}
@@ -9,6 +9,7 @@ import pytest
 from xonsh.parser import Parser
 from xonsh.parsers.ast import AST, Call, Pass, With, is_const_str
 from xonsh.parsers.fstring_adaptor import FStringAdaptor
+from xonsh.parsers.ply import yacc
 from xonsh.pytest.tools import (
     ON_WINDOWS,
     VER_MAJOR_MINOR,
@@ -3569,3 +3570,22 @@ match (...[...][...]):
 """,
         run=False,
     )
+
+
+def test_compact_parser_tables(parser):
+    lr = parser.parser
+    action = lr.action.to_dict(lr.symbols)
+    goto = lr.goto.to_dict(lr.symbols)
+    assert lr.defaulted_states == {
+        state: next(iter(row.values()))
+        for state, row in action.items()
+        if len(row) == 1 and next(iter(row.values())) < 0
+    }
+
+    tables = yacc.LRTable()
+    tables.lr_action = action
+    tables.lr_goto = goto
+    tables.compact()
+    assert tables.lr_symbols == lr.symbols
+    assert tables.lr_action.to_dict(lr.symbols) == action
+    assert tables.lr_goto.to_dict(lr.symbols) == goto
@@ -0,0 +1,90 @@
+"""Tests the in-process channels between callable aliases."""
+
+import threading
+
+import pytest
+
+from xonsh.procs.channels import Channel, format_record
+
+
+@pytest.fixture
+def channel(xession):
+    return Channel(maxsize=4, chunksize=4)
+
+
+def test_channel_lines(channel):
+    channel.writer.write("a\r\nbc")
+    channel.writer.write("\rd\n")
+    channel.writer.buffer.write("é".encode()[:1])
+    channel.writer.buffer.write("é\n".encode()[1:])
+    channel.writer.close()
+    assert list(channel.reader) == ["a\n", "bc\n", "d\n", "é\n"]
+
+
+def test_channel_empty_writes(channel):
+    channel.writer.write("a\n")
+    channel.writer.write("")
+    channel.writer.flush()
+    print("", end="", file=channel.writer, flush=True)
+    channel.writer.write("b\n")
+    channel.writer.close()
+    assert channel.reader.read() == "a\nb\n"
+
+
+def test_channel_read_sizes(channel):
+    channel.writer.write("hello\nworld")
+    channel.writer.close()
+    assert channel.reader.readline(3) == "hel"
+    assert channel.reader.read(5) == "lo\nwo"
+    assert channel.reader.readline() == "rld"
+    assert channel.reader.read() == ""
+
+
+def test_channel_backpressure(channel):
+    written = []
+
+    def write():
+        try:
+            for i in range(100):
+                channel.writer.write(f"{i}\n")
+                written.append(i)
+        except BrokenPipeError:
+            written.append("broken")
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    assert channel.reader.readline() == "0\n"
+    channel.reader.close()
+    writer.join(timeout=5)
+    assert not writer.is_alive()
+    assert written[-1] == "broken"
+
+
+@pytest.mark.parametrize(
+    "record, line",
+    [
+        ("a", "a\n"),
+        ("a\n", "a\n"),
+        (1.5, "1.5\n"),
+        ({"a": [1, None]}, '{"a": [1, null]}\n'),
+        (("a", 1), "a\t1\n"),
+        (None, "None\n"),
+    ],
+)
+def test_format_record(record, line):
+    assert format_record(record) == line
+
+
+def test_channel_records(channel):
+    records = [{"a": 1}, ("b", 2), 3]
+    channel.writer.write("x\n")
+    channel.writer.write_records(iter(records))
+    channel.writer.close()
+    assert list(channel.reader.records()) == ["x", *records]
+
+
+def test_channel_records_as_text(channel):
+    channel.writer.write("x")
+    channel.writer.write_records(iter([("b", 2), 3]))
+    channel.writer.close()
+    assert list(channel.reader) == ["xb\t2\n", "3\n"]
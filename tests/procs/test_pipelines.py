@@ -3,6 +3,8 @@ Tests for command pipelines.
 """
 
 import os
+import threading
+import time
 
 import pytest
 
@@ -133,6 +135,58 @@ def test_casting(cmdline, result, xonsh_execer):
     assert xonsh_execer.eval(f"{cmdline}") == result
 
 
+@skip_if_on_windows
+def test_capture_large_output(xonsh_execer):
+    pipeline = xonsh_execer.eval("!(seq 1 100000)")
+    assert pipeline.out.split() == [str(i) for i in range(1, 100001)]
+
+
+@skip_if_on_windows
+def test_capture_output_munged_once(xonsh_execer):
+    pipeline = xonsh_execer.eval(
+        r"""!(printf 'a\r\n\033[1mb\033[0m\rc\001x\002\n')"""
+    )
+    assert pipeline.out == "a\nb\rc\n"
+    assert pipeline.lines == ["a\n", "b\rc\n"]
+    assert pipeline.raw_out == b"a\r\n\x1b[1mb\x1b[0m\rc\x01x\x02\n"
+
+
+@skip_if_on_windows
+def test_capture_keeps_carriage_returns(xonsh_execer):
+    pipeline = xonsh_execer.eval(r"""!(printf 'a\rb\r\nc\r')""")
+    assert pipeline.out == "a\rb\nc\n"
+    assert pipeline.lines == ["a\rb\n", "c\n"]
+    pipeline = xonsh_execer.eval(r"""!(printf 'a\rb\r\nc\r' 1>&2)""")
+    assert pipeline.err == "a\rb\nc\n"
+
+
+@skip_if_on_windows
+def test_capture_stdout_and_stderr_after_idle(xonsh_execer):
+    pipeline = xonsh_execer.eval("!(sh -c 'sleep 0.2; echo out; echo err 1>&2')")
+    assert pipeline.out == "out"
+    assert pipeline.err == "err\n"
+
+
+@skip_if_on_windows
+def test_endless_alias_into_head(xonsh_session, xonsh_execer):
+    stop = threading.Event()
+
+    def _endless():
+        # endless until the test is over, but bounded if the pipeline hangs
+        deadline = time.monotonic() + 10
+        while not stop.is_set() and time.monotonic() < deadline:
+            print("x")
+
+    xonsh_session.aliases["endless"] = _endless
+    start = time.monotonic()
+    try:
+        output = xonsh_execer.eval("$(endless | head -n 1)")
+    finally:
+        stop.set()
+    assert output == "x"
+    assert time.monotonic() - start < 5
+
+
 @skip_if_on_windows
 @skip_if_on_unix
 def test_background_pgid(xonsh_session, monkeypatch):
@@ -1,12 +1,15 @@
 """Tests the xonsh.procs.specs"""
 
 import itertools
+import os
 import signal
 import sys
-from subprocess import CalledProcessError, Popen
+from subprocess import CalledProcessError, Popen, check_output
 
 import pytest
 
+from xonsh.procs.channels import ChannelReader, ChannelWriter
+from xonsh.procs.jobs import ignore_sigtstp
 from xonsh.procs.posix import PopenThread
 from xonsh.procs.proxies import STDOUT_DISPATCHER, ProcProxy, ProcProxyThread
 from xonsh.procs.specs import (
@@ -460,6 +463,72 @@ def test_on_command_not_found_doesnt_fire_in_non_interactive_mode(xession):
     assert not fired
 
 
+@skip_if_on_windows
+@pytest.mark.parametrize("channels", [True, False])
+def test_alias_pipeline_channels(channels, xession):
+    def _gen(args, stdout):
+        for i in range(1000):
+            print(i, file=stdout)
+
+    def _up(args, stdin, stdout):
+        for line in stdin:
+            stdout.write(line.upper() + "x\n")
+
+    xession.aliases.update({"gen": _gen, "up": _up})
+    xession.env["THREAD_SUBPROCS"] = True
+    xession.env["XONSH_ALIAS_CHANNELS"] = channels
+    cmds = [["gen"], "|", ["up"], "|", ["head", "-n", "4"]]
+    specs = cmds_to_specs(cmds, captured="stdout")
+    assert isinstance(specs[0].stdout, ChannelWriter) is channels
+    assert isinstance(specs[1].stdin, ChannelReader) is channels
+    assert isinstance(specs[1].stdout, int)
+    (p := _run_command_pipeline(specs, cmds)).end()
+    assert p.output == "0\nx\n1\nx\n"
+
+
+@skip_if_on_windows
+def test_alias_pipeline_records(xession):
+    def _gen(args):
+        return iter([{"n": 1}, {"n": 2}, ("a", 3)])
+
+    def _keys(records):
+        for record in records:
+            yield type(record).__name__, record[1] if type(record) is tuple else 0
+
+    xession.aliases.update({"gen": _gen, "keys": _keys})
+    xession.env["THREAD_SUBPROCS"] = True
+    cmds = [["gen"], "|", ["keys"], "|", ["cat"]]
+    specs = cmds_to_specs(cmds, captured="stdout")
+    assert isinstance(specs[0].stdout, ChannelWriter)
+    assert isinstance(specs[1].stdout, int)
+    (p := _run_command_pipeline(specs, cmds)).end()
+    assert p.output == "dict\t0\ndict\t0\ntuple\t3\n"
+
+
+@skip_if_on_windows
+@pytest.mark.parametrize("in_pipeline_group", [True, False])
+def test_process_group_without_preexec(in_pipeline_group, xession):
+    xession.env["XONSH_INTERACTIVE"] = True
+    pipeline_group = os.getpgid(0) if in_pipeline_group else None
+    kwargs = {}
+    SubprocSpec.build(["true"]).prep_process_group(kwargs, pipeline_group)
+    assert "preexec_fn" not in kwargs
+    code = (
+        "import os, signal\n"
+        "tstp_default = signal.getsignal(signal.SIGTSTP) == signal.SIG_DFL\n"
+        "print(os.getpid(), os.getpgid(0), tstp_default)"
+    )
+    old_handler = signal.getsignal(signal.SIGTSTP)
+    ignore_sigtstp()
+    try:
+        out = check_output([sys.executable, "-c", code], text=True, **kwargs)
+    finally:
+        signal.signal(signal.SIGTSTP, old_handler)
+    pid, pgid, tstp_default = out.split()
+    assert int(pgid) == (pipeline_group or int(pid))
+    assert tstp_default == "True"
+
+
 def test_redirect_to_substitution(xession):
     s = SubprocSpec.build(
         # `echo hello > @('file')`
@@ -20,3 +20,32 @@ def test_obj(history_obj):
     assert ["line10"] == history_obj.get_strings()
     assert len(history_obj) == 1
     assert ["line10"] == [x for x in history_obj]
+
+
+def test_load_history_window(xession, monkeypatch):
+    """Entries are handed over one window at a time."""
+    import threading
+
+    from xonsh.shells.ptk_shell.history import PromptToolkitHistory
+
+    def all_items(newest_first=False):
+        for i in range(5):
+            yield {"inp": str(i)}
+
+    monkeypatch.setattr(xession.history, "all_items", all_items, raising=False)
+    hist = PromptToolkitHistory(window=2)
+    lines = hist.load_history_strings()
+    assert [next(lines), next(lines)] == ["0", "1"]
+
+    loaded = []
+    loader = threading.Thread(target=lambda: loaded.extend(lines))
+    loader.start()
+    loader.join(0.05)
+    assert loader.is_alive() and loaded == []
+    hist.request_more()
+    hist.request_more()  # a window at a time
+    loader.join(0.05)
+    assert loaded == ["2", "3"]
+    hist.request_more()
+    loader.join(1)
+    assert loaded == ["2", "3", "4"]
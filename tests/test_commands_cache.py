@@ -1,5 +1,4 @@
 import os
-import pickle
 import stat
 import time
 from tempfile import TemporaryDirectory
@@ -10,6 +9,8 @@ from xonsh.commands_cache import (
     SHELL_PREDICTOR_PARSER,
     CaseInsensitiveDict,
     CommandsCache,
+    CommandsCacheFile,
+    StatPathsWatcher,
     _Commands,
     executables_in,
     predict_false,
@@ -48,26 +49,76 @@ class TestCommandsCacheSaveIntermediate:
             "bin2",
         ]
 
-        files = tmp_path.glob("*.pickle")
+        files = tmp_path.glob(CommandsCache.CACHE_FILE)
         assert len(list(files)) == 1
         exin_mock.assert_called_once()
 
+    def test_removes_legacy_cache_file(self, exin_mock, xession, tmp_path):
+        legacy = tmp_path / CommandsCache.LEGACY_CACHE_FILE
+        legacy.write_bytes(b"old")
+        assert xession.commands_cache.all_commands
+        assert (tmp_path / CommandsCache.CACHE_FILE).exists()
+        assert not legacy.exists()
+
     def test_loading_cache(self, exin_mock, tmp_path, xession):
         cc = xession.commands_cache
         file = tmp_path / CommandsCache.CACHE_FILE
-        file.touch()
+        store = CommandsCacheFile(file)
+        store.update({})  # create the file before taking the mtime of its dir
         cached = {
             str(tmp_path): _Commands(
                 mtime=tmp_path.stat().st_mtime, cmds=("bin1", "bin2")
             )
         }
 
-        file.write_bytes(pickle.dumps(cached))
+        store.update(cached)
         assert str(cc.cache_file) == str(file)
         assert [b.lower() for b in cc.all_commands.keys()] == ["bin1", "bin2"]
         exin_mock.assert_not_called()
 
 
+def test_commands_cache_file(tmp_path):
+    file = tmp_path / "cache.bin"
+    store = CommandsCacheFile(file)
+    assert store.load(["/a"]) == {}
+
+    store.update({"/a": _Commands(1.0, ("x", "y")), "/b": _Commands(2.0, ())})
+    size = file.stat().st_size
+    store.update({"/a": _Commands(3.0, ("z",))})
+    # sections are appended instead of rewriting the file
+    assert file.stat().st_size > size
+    assert CommandsCacheFile(file).load(["/a", "/b", "/c"]) == {
+        "/a": _Commands(3.0, ("z",)),
+        "/b": _Commands(2.0, ()),
+    }
+
+    # outdated sections are dropped once they outweigh the current ones
+    for i in range(5):
+        store.update({"/a": _Commands(4.0 + i, ("z",) * 10)})
+    assert CommandsCacheFile(file).load(["/a"]) == {"/a": _Commands(8.0, ("z",) * 10)}
+    assert file.stat().st_size < size * 4
+
+    # a truncated tail and a corrupted section only lose those directories
+    data = bytearray(file.read_bytes())
+    file.write_bytes(data[:-1])
+    assert CommandsCacheFile(file).load(["/b"]) == {"/b": _Commands(2.0, ())}
+    data[-1] ^= 0xFF
+    file.write_bytes(data)
+    assert CommandsCacheFile(file).load(["/a", "/b"]) == {"/b": _Commands(2.0, ())}
+
+    file.write_bytes(b"garbage")
+    assert CommandsCacheFile(file).load(["/a"]) == {}
+    # the sizes of the previous file do not carry over to a foreign one
+    file.unlink()
+    store = CommandsCacheFile(file)
+    store.update({"/a": _Commands(1.0, ("x",))})
+    store.update({"/a": _Commands(2.0, ("x",))})
+    assert store._dead > 0
+    file.write_bytes(b"garbage")
+    store.load(["/a"])
+    assert store._live == store._dead == 0
+
+
 TRUE_SHELL_ARGS = [
     ["-c", "yo"],
     ["-c=yo"],
@@ -217,6 +268,47 @@ def test_update_cache(xession, tmp_path):
     assert file2.samefile(cached[basename][0])
 
 
+@skip_if_on_windows
+@pytest.mark.parametrize("kind", ["stat", "inotify"])
+def test_update_cache_with_watcher(kind, xession, tmp_path, monkeypatch):
+    subdir1 = tmp_path / "subdir1"
+    subdir2 = tmp_path / "subdir2"
+    subdir1.mkdir()
+    subdir2.mkdir()
+    for path in (subdir1 / "both", subdir2 / "both", subdir2 / "second"):
+        path.touch()
+        path.chmod(0o755)
+
+    paths = [subdir1, subdir2]
+    cache = CommandsCache({"PATH": paths, "COMMANDS_CACHE_WATCHER": kind})
+    cache.aliases["second"] = ["echo"]
+    monkeypatch.setattr(StatPathsWatcher, "interval", 0.0)
+    assert cache["both"] == (str(subdir1 / "both"), None)
+    assert cache["second"] == (str(subdir2 / "second"), False)
+    assert cache["third"] is None
+
+    (subdir1 / "both").unlink()
+    for path in (subdir1 / "second", subdir1 / "third"):
+        path.touch()
+        path.chmod(0o755)
+    # the stat watcher relies on the mtime of the directory
+    os.utime(subdir1, (0, 0))
+
+    def expected():
+        return {
+            "both": (str(subdir2 / "both"), None),
+            "second": (str(subdir1 / "second"), False),
+            "third": (str(subdir1 / "third"), None),
+        }
+
+    for _ in range(100):
+        if {k: cache.get(k) for k in expected()} == expected():
+            break
+        time.sleep(0.01)
+    assert {k: cache.get(k) for k in expected()} == expected()
+    cache.watcher.close()
+
+
 @pytest.fixture
 def faux_binary(tmp_path):
     """
@@ -1,4 +1,5 @@
 import itertools
+import os
 from unittest import mock
 
 import pytest
@@ -887,3 +888,24 @@ exit()
 )
 def test_multiline_python(code):
     assert_match(code, is_main_command=True)
+
+
+def test_parser_tables_fallback_to_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XONSH_CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "readonly").touch()
+    outputdir = str(tmp_path / "readonly" / "xonsh")
+    shipped, cached = ctx.yacc_table_files("completion_parser_table", outputdir)
+    assert shipped == os.path.join(outputdir, "completion_parser_table.marshal")
+    assert cached == os.path.join(
+        tmp_path, "cache", "parser_tables", "completion_parser_table.marshal"
+    )
+
+    # the shipped table cannot be written, so the generated one is cached
+    parser = CompletionContextParser(outputdir=outputdir)
+    assert os.path.isfile(cached)
+    mtime = os.stat(cached).st_mtime_ns
+
+    # and loaded from the cache the next time around
+    CompletionContextParser(outputdir=outputdir)
+    assert os.stat(cached).st_mtime_ns == mtime
+    assert parser.parse("ls -l", 2) is not None
@@ -67,10 +67,73 @@ def test_env_detype_mutable_access_clear(path1, path2):
     env = Env(MYPATH=path1)
     assert path1[0] + os.pathsep + path1[1] == env.detype()["MYPATH"]
     env["MYPATH"][0] = path2
-    assert env._detyped is None
     assert path2 + os.pathsep + path1[1] == env.detype()["MYPATH"]
 
 
+def test_env_detype_incremental():
+    env = Env(MYPATH=["wakka"], MYVAR="1")
+    env.detype()
+    detyped = []
+    env.register(
+        "MYVAR",
+        validate=always_true,
+        convert=None,
+        detype=lambda x: detyped.append(x) or str(x),
+    )
+    path = env["MYPATH"]
+    env["OTHER"] = "2"
+    det = env.detype()
+    assert detyped == [] and det["OTHER"] == "2"
+    # mutations through a held reference are picked up by version
+    path.append("jawaka")
+    assert env.detype()["MYPATH"] == "wakka" + os.pathsep + "jawaka"
+    det["MYPATH"] = "mutated"
+    env["MYVAR"] = "3"
+    det = env.detype()
+    assert detyped == ["3"]
+    assert det["MYPATH"] == "wakka" + os.pathsep + "jawaka"
+    del env["MYVAR"]
+    assert "MYVAR" not in env.detype()
+
+
+def test_env_get_detyped_and_view():
+    env = Env(MYPATH=["wakka"])
+    view = env.detyped_view()
+    with pytest.raises(TypeError):
+        view["MYPATH"] = "mutated"
+    env["MYPATH"].append("jawaka")
+    assert env.get_detyped("MYPATH") == "wakka" + os.pathsep + "jawaka"
+    assert env.get_detyped("NOPE") is None
+    det = env.detype()
+    det["MYPATH"] = "mutated"
+    assert env.detyped_view()["MYPATH"] == "wakka" + os.pathsep + "jawaka"
+
+
+def test_env_detype_only_changed(monkeypatch, xession):
+    env = xession.env
+    env.update(PATH=["/bin"], MYPATH=["$SUB/wakka"], EXPAND_ENV_VARS=False, SUB="a")
+    view = env.detyped_view()
+    detyped = []
+    detype_key = env._detype_key
+    monkeypatch.setattr(
+        env, "_detype_key", lambda ctx, key: detyped.append(key) or detype_key(ctx, key)
+    )
+    env["FOO"] = "y"
+    env.detyped_view()
+    assert detyped == ["FOO"]
+    assert "FOO" not in view
+
+    detyped.clear()
+    env["EXPAND_ENV_VARS"] = True
+    assert env.get_detyped("MYPATH") == "a/wakka"
+    assert set(detyped) == {"EXPAND_ENV_VARS", "PATH", "MYPATH"}
+
+    detyped.clear()
+    env["SUB"] = "b"
+    assert env.get_detyped("MYPATH") == "b/wakka"
+    assert set(detyped) == {"SUB", "MYPATH"}
+
+
 def test_env_detype_no_dict():
     env = Env(YO={"hey": 42})
     env.register("YO", validate=always_true, convert=None, detype=None)
@@ -1,9 +1,12 @@
 """Tests the xonsh lexer."""
 
+import ast
 import os
 
 import pytest
 
+from xonsh.built_ins import XSH
+from xonsh.codecache import CompiledCodeCache
 from xonsh.pytest.tools import ON_WINDOWS, skip_if_on_unix, skip_if_on_windows
 
 
@@ -194,3 +197,100 @@ def test_exec_scope_reuse(xonsh_execer_exec):
     assert xonsh_execer_exec("x = 0")
     with pytest.raises(NameError):
         xonsh_execer_exec("print(x)")
+
+
+def test_parse_statements_like_whole_input(xonsh_execer):
+    code = (
+        "x = 1\n"
+        "ls -l /tmp\n"
+        "if x:\n"
+        "    echo a\n"
+        "else:\n"
+        "    echo b\n"
+        's = """\n'
+        "ls -l\n"
+        '"""\n'
+        "# comment\n"
+        "echo c\n"
+    )
+    execer = XSH.execer
+    exp_tree, exp_input = execer._parse_wrapping(code, "exec", "<test>")
+    assert len(execer._split_statements(code)) == 5
+    tree, input = execer._parse_ctx_free(code, filename="<test>")
+    assert input == exp_input
+    assert ast.dump(tree, include_attributes=True) == ast.dump(
+        exp_tree, include_attributes=True
+    )
+    # the wrapping is remembered for the next time
+    assert execer._wrap_memo["exec", code] == exp_input
+    tree, input = execer._parse_ctx_free(code, filename="<test>")
+    assert input == exp_input
+
+
+def test_parse_statements_with_decorator(xonsh_execer, monkeypatch):
+    code = (
+        "import functools\n"
+        "ls -l\n"
+        "@functools.lru_cache\n"
+        "@functools.wraps(print)\n"
+        "def f(x):\n"
+        "    return x\n"
+    )
+    execer = XSH.execer
+    exp_tree, exp_input = execer._parse_wrapping(code, "exec", "<test>")
+    assert len(execer._split_statements(code)) == 3
+    parse_wrapping = execer._parse_wrapping
+    monkeypatch.setattr(
+        execer,
+        "_parse_wrapping",
+        lambda input, *args, **kwargs: (
+            pytest.fail("whole input wrapped")
+            if input == code
+            else parse_wrapping(input, *args, **kwargs)
+        ),
+    )
+    tree, input = execer._parse_ctx_free(code, filename="<test>")
+    assert input == exp_input
+    assert ast.dump(tree, include_attributes=True) == ast.dump(
+        exp_tree, include_attributes=True
+    )
+
+
+def test_wrap_memo_size(xonsh_execer, monkeypatch):
+    execer = XSH.execer
+    execer._wrap_memo.clear()
+    execer._wrap_memo_chars = 0
+    execer._parse_ctx_free("ls -l 0\n", filename="<test>")
+    size = execer._wrap_memo_chars
+    monkeypatch.setattr(execer, "wrap_memo_chars", 2 * size + 1)
+    for i in range(1, 10):
+        execer._parse_ctx_free(f"ls -l {i}\n", filename="<test>")
+    assert [inp for _, inp in execer._wrap_memo] == ["ls -l 8\n", "ls -l 9\n"]
+    assert execer._wrap_memo_chars == 2 * size
+    # too large to be remembered
+    execer._parse_ctx_free("ls " + "x" * 3 * size + "\n", filename="<test>")
+    assert len(execer._wrap_memo) == 2
+
+
+def test_compile_cache(xonsh_execer, tmp_path):
+    cache = CompiledCodeCache(maxsize=2)
+    glbs = {}
+    code = xonsh_execer.compile("ls -l", mode="single", glbs=glbs, locs={}, cache=cache)
+    assert "subproc_captured_hiddenobject" in code.co_names
+    assert xonsh_execer.compile("ls -l", "single", glbs, {}, cache=cache) is code
+
+    # variables shadow the command
+    glbs.update(ls=1, l=2)
+    pycode = xonsh_execer.compile("ls -l", "single", glbs, {}, cache=cache)
+    assert "subproc_captured_hiddenobject" not in pycode.co_names
+    assert xonsh_execer.compile("ls -l", "single", glbs, {}, cache=cache) is pycode
+    del glbs["l"]
+    assert xonsh_execer.compile("ls -l", "single", glbs, {}, cache=cache) is not pycode
+
+    cachefname = str(tmp_path / "cache")
+    cache.dump(cachefname)
+    loaded = CompiledCodeCache()
+    loaded.load(cachefname)
+    assert len(loaded) == 1
+    code = loaded.get("ls -l", "single", "<xonsh-code>", set(glbs))
+    assert "subproc_captured_hiddenobject" in code.co_names
@@ -5,7 +5,12 @@ import subprocess
 
 import pytest  # noqa F401
 
-from xonsh.foreign_shells import foreign_shell_data, parse_aliases, parse_env
+from xonsh.foreign_shells import (
+    dump_foreign_shell_cache,
+    foreign_shell_data,
+    parse_aliases,
+    parse_env,
+)
 from xonsh.pytest.tools import skip_if_on_unix, skip_if_on_windows
 
 
@@ -103,3 +108,51 @@ def test_foreign_cmd_data():
     assert "ENV_TO_BE_ADDED" in obsenv
     assert obsenv["ENV_TO_BE_ADDED"] == "Hallo world"
     assert "ENV_TO_BE_REMOVED" not in obsenv
+
+
+@skip_if_on_windows
+def test_foreign_bash_data_cache(xession, tmp_path, monkeypatch):
+    xession.env["XONSH_CACHE_FOREIGN_SHELLS"] = True
+    rcfile = tmp_path / "rc.sh"
+    rcfile.write_text("export EMERALD=SWORD\nalias l='ls -CF'\n")
+    currenv = (("PATH", os.environ.get("PATH", "")), ("KEEP", "ME"))
+    kwargs = dict(
+        currenv=currenv,
+        interactive=False,
+        prevcmd=f"source {rcfile}",
+        files=(str(rcfile),),
+        safe=False,
+    )
+    try:
+        obsenv, obsaliases = foreign_shell_data("bash", **kwargs)
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return
+    assert obsenv["EMERALD"] == "SWORD"
+    assert obsaliases["l"] == ["ls", "-CF"]
+    assert len(list((tmp_path / "foreign_shells").iterdir())) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("foreign shell should not be started")
+
+    check_output = subprocess.check_output
+    monkeypatch.setattr(subprocess, "check_output", fail)
+    foreign_shell_data.cache_clear()
+    assert foreign_shell_data("bash", **kwargs) == (obsenv, obsaliases)
+
+    # a changed sourced file invalidates the cache entry
+    monkeypatch.setattr(subprocess, "check_output", check_output)
+    rcfile.write_text("export EMERALD=SHIELD\n")
+    foreign_shell_data.cache_clear()
+    obsenv, obsaliases = foreign_shell_data("bash", **kwargs)
+    assert obsenv["EMERALD"] == "SHIELD"
+    assert obsenv["KEEP"] == "ME"
+    assert "l" not in obsaliases
+
+
+def test_dump_foreign_shell_cache_failure(xession, tmp_path):
+    cache_file = tmp_path / "cache.json"
+    # not serializable as JSON
+    dump_foreign_shell_cache(str(cache_file), [], {}, {"X": object()}, "")
+    assert list(tmp_path.iterdir()) == []
+    dump_foreign_shell_cache(str(cache_file), [], {}, {"X": "1"}, "")
+    assert list(tmp_path.iterdir()) == [cache_file]
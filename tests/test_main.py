@@ -2,6 +2,7 @@
 
 import builtins
 import gc
+import json
 import os
 import os.path
 import sys
@@ -10,9 +11,11 @@ from pathlib import Path
 
 import pytest
 
+import xonsh.codecache
 import xonsh.main
 from xonsh.main import XonshMode
 from xonsh.pytest.tools import ON_WINDOWS, TEST_DIR, skip_if_on_windows
+from xonsh.timings import format_startup_diff
 
 
 def Shell(*args, **kwargs):
@@ -146,6 +149,52 @@ def test_rcdir(shell, tmpdir, monkeypatch, capsys):
     assert len(stderr) == 0
 
 
+def test_rcdir_snapshot(shell, tmpdir, monkeypatch, capsys):
+    """Test that rc files are run from a startup snapshot which is rebuilt
+    when the files change."""
+
+    rcdir = tmpdir.join("rc.d")
+    rcdir.mkdir()
+    monkeypatch.setattr(sys.stdin, "isatty", lambda: True)
+    monkeypatch.setitem(os.environ, "XONSHRC_DIR", str(rcdir))
+    monkeypatch.setitem(os.environ, "XONSHRC", str(tmpdir.join("rc.xsh")))
+    monkeypatch.setitem(os.environ, "XONSH_DATA_DIR", str(tmpdir.join("data")))
+    monkeypatch.setitem(os.environ, "XONSH_CACHE_RC_SNAPSHOT", "True")
+
+    rcdir.join("1.xsh").write("print('1.xsh')")
+    rcdir.join("0.py").write("print('0.py')")
+    tmpdir.join("rc.xsh").write("print('rc.xsh')")
+
+    xonsh.main.premain([])
+    assert "rc.xsh\n0.py\n1.xsh" in capsys.readouterr().out
+    snapshots = list(Path(tmpdir, "data", "xonsh_script_cache").glob("rc_snapshot_*"))
+    assert len(snapshots) == 1
+
+    with monkeypatch.context() as m:
+        m.setattr(xonsh.codecache, "compile_code", None)  # nothing is compiled
+        xonsh.main.premain([])
+    assert "rc.xsh\n0.py\n1.xsh" in capsys.readouterr().out
+
+    rcdir.join("2.xsh").write("print('2.xsh')")
+    xonsh.main.premain([])
+    assert "rc.xsh\n0.py\n1.xsh\n2.xsh" in capsys.readouterr().out
+
+
+def test_rc_snapshot_files(tmp_path):
+    rcfile = tmp_path / "rc.xsh"
+    rcfile.write_text("x = 1")
+    gone = tmp_path / "gone.xsh"
+    # a file removed after the scan makes the snapshot stale
+    assert xonsh.codecache.rc_snapshot_deps([str(rcfile), str(gone)]) is None
+
+    snapshot = tmp_path / "snapshot"
+    deps = xonsh.codecache.rc_snapshot_deps([str(rcfile)])
+    codes = {str(rcfile): compile("x = 1", str(rcfile), "exec")}
+    xonsh.codecache.update_rc_snapshot(str(snapshot), deps, codes)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["rc.xsh", "snapshot"]
+    assert xonsh.codecache.load_rc_snapshot(str(snapshot), deps) == codes
+
+
 def test_rcdir_cli(shell, tmpdir, xession, monkeypatch):
     """Test that --rc DIR works"""
     rcdir = tmpdir.join("rcdir")
@@ -434,6 +483,37 @@ def test_premain_timings_arg(shell):
     xonsh.main.premain(["--timings"])
 
 
+def test_premain_profile_startup(shell, tmpdir, xonsh_events):
+    report = tmpdir.join("startup.json")
+    argv = ["--profile-startup-file", str(report), "-c", "echo"]
+    xonsh.main.premain(argv)
+    nhandlers = len(xonsh_events.on_timingprobe)
+    xonsh.main.premain(argv)
+    assert len(xonsh_events.on_timingprobe) == nhandlers
+    xonsh_events.on_exit.fire(exit_code=0)
+    assert len(xonsh_events.on_timingprobe) == nhandlers - 1
+    data = json.loads(report.read())
+    phases = {p["name"]: p for p in data["phases"]}
+    assert {"premain", "start_services", "execer_init", "rc"} <= set(phases)
+    assert {"xontribs_autoload", "shell_init"} <= set(phases)
+    assert phases["start_services"]["parent"] == "premain"
+    assert phases["shell_init"]["parent"] == "start_services"
+    assert phases["premain"]["wall"] >= phases["start_services"]["wall"]
+
+    diff = format_startup_diff(data, data)
+    assert "start_services" in diff
+
+
+def test_premain_profile_startup_keeps_script(shell, tmpdir, xonsh_events, capsys):
+    script = tmpdir.join("deploy.xsh")
+    script.write("echo deploy\n")
+    args = xonsh.main.premain(["--profile-startup", str(script)])
+    assert args.file == str(script)
+    xonsh_events.on_exit.fire(exit_code=0)
+    assert script.read() == "echo deploy\n"
+    assert '"phases"' in capsys.readouterr().err
+
+
 @skip_if_on_windows
 @pytest.mark.parametrize(
     ("env_shell", "rc_shells", "exp_shell"),
@@ -92,6 +92,7 @@ class FuncAlias:
         spec=None,
         stack=None,
         decorators=None,
+        records=None,
     ):
         return run_alias_by_params(
             self.func,
@@ -103,6 +104,7 @@ class FuncAlias:
                 "spec": spec,
                 "stack": stack,
                 "decorators": decorators,
+                "records": records,
             },
         )
 
@@ -540,6 +542,7 @@ def run_alias_by_params(func: tp.Callable, params: dict[str, tp.Any]):
         "spec": None,
         "stack": None,
         "decorators": None,
+        "records": None,
     }
     alias_params |= params
     sign = inspect.signature(func)
@@ -1,5 +1,7 @@
 """Tools for caching xonsh code."""
 
+import collections
+import contextlib
 import hashlib
 import marshal
 import os
@@ -179,6 +181,171 @@ def run_script_with_cache(filename, execer, glb=None, loc=None, mode="exec"):
     return run_compiled_code(ccode, glb, loc, mode)
 
 
+def rc_snapshot_filename(rcfiles, rcdirs):
+    """
+    Return the filename of the startup snapshot, which bundles the compiled
+    code of all the run control files found in ``rcfiles`` and ``rcdirs``.
+    """
+    key = "\0".join(map(os.path.realpath, (*rcfiles, "", *rcdirs)))
+    cachedir = os.path.join(XSH.env["XONSH_DATA_DIR"], "xonsh_script_cache")
+    name = f"rc_snapshot_{code_cache_name(key)}.{sys.implementation.cache_tag}"
+    return os.path.join(cachedir, name)
+
+
+def rc_snapshot_deps(filenames):
+    """
+    Return the list of ``(filename, mtime_ns)`` pairs that a startup snapshot
+    of the given files is valid for, or ``None`` if one of the files is gone.
+    """
+    try:
+        return [(fname, os.stat(fname).st_mtime_ns) for fname in filenames]
+    except OSError:
+        return None
+
+
+def load_rc_snapshot(cachefname, deps):
+    """
+    Load the startup snapshot at ``cachefname``.
+
+    Returns a dict mapping filenames to their compiled code, which is empty
+    if there is no snapshot or if it was made from other files (``deps``).
+    """
+    try:
+        with open(cachefname, "rb") as cfile:
+            if not _check_cache_versions(cfile):
+                return {}
+            cached_deps, codes = marshal.load(cfile)
+    except (OSError, EOFError, ValueError, TypeError):
+        return {}
+    if cached_deps != deps:
+        return {}
+    return codes
+
+
+def update_rc_snapshot(cachefname, deps, codes):
+    """
+    Update the startup snapshot at ``cachefname`` to contain the compiled code
+    of the run control files, valid for the given ``deps``.
+    """
+    try:
+        os.makedirs(os.path.dirname(cachefname), exist_ok=True)
+    except OSError:
+        return
+    if not is_writable_file(cachefname):
+        return
+    # another xonsh may be loading the snapshot while it is written
+    tmp = f"{cachefname}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as cfile:
+            cfile.write(XONSH_VERSION.encode() + b"\n")
+            cfile.write(bytes(PYTHON_VERSION_INFO_BYTES) + b"\n")
+            marshal.dump((deps, codes), cfile)
+        os.replace(tmp, cachefname)
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+
+
+def run_script_with_snapshot(filename, execer, snapshot, glb=None, loc=None):
+    """
+    Run a script using its compiled code from a startup snapshot. The script
+    is compiled and added to ``snapshot`` if it is not there yet.
+    See run_compiled_code for the return value.
+    """
+    ccode = snapshot.get(filename)
+    if ccode is None:
+        with open(filename, encoding="utf-8") as f:
+            code = f.read()
+        ccode = compile_code(filename, code, execer, glb, loc, "exec")
+        snapshot[filename] = ccode
+    return run_compiled_code(ccode, glb, loc, "exec")
+
+
+class CompiledCodeCache:
+    """LRU cache of the code compiled from interactive input.
+
+    Whether a line like ``ls -l`` compiles to a subprocess or to Python code
+    depends on which names are defined in the execution context. Entries are
+    therefore keyed by the source along with the names of the context that the
+    compilation depended on, and whether they were defined at the time. An
+    entry is only reused if all of these names are still (un)defined, so that
+    e.g. defining ``ls`` after running ``ls -l`` is picked up.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.dirty = False
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, input, mode, filename, ctx):
+        """Returns the code compiled from the input for the given context
+        (a set of names), or ``None`` if it is not cached.
+        """
+        key = (input, mode, filename)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        names, defined, code = entry
+        if tuple(name in ctx for name in names) != defined:
+            return None
+        self._entries.move_to_end(key)
+        return code
+
+    def put(self, input, mode, filename, names, ctx, code):
+        """Caches the code compiled from the input, which depended on the given
+        names of the context.
+        """
+        if self.maxsize <= 0:
+            return
+        key = (input, mode, filename)
+        names = tuple(sorted(names))
+        self._entries[key] = (names, tuple(name in ctx for name in names), code)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        self.dirty = True
+
+    def load(self, cachefname):
+        """Loads the entries stored at ``cachefname``, if it is valid."""
+        try:
+            with open(cachefname, "rb") as cfile:
+                if not _check_cache_versions(cfile):
+                    return
+                entries = marshal.load(cfile)
+        except (OSError, EOFError, ValueError, TypeError):
+            return
+        for input, mode, filename, names, defined, code in entries[-self.maxsize :]:
+            self._entries[input, mode, filename] = (names, defined, code)
+
+    def dump(self, cachefname):
+        """Stores the entries at ``cachefname``."""
+        entries = [(*key, *entry) for key, entry in self._entries.items()]
+        try:
+            os.makedirs(os.path.dirname(cachefname), exist_ok=True)
+        except OSError:
+            return
+        if not is_writable_file(cachefname):
+            return
+        tmpfname = f"{cachefname}.{os.getpid()}.tmp"
+        with open(tmpfname, "wb") as cfile:
+            cfile.write(XONSH_VERSION.encode() + b"\n")
+            cfile.write(bytes(PYTHON_VERSION_INFO_BYTES) + b"\n")
+            marshal.dump(entries, cfile)
+        os.replace(tmpfname, cachefname)
+        self.dirty = False
+
+
+def compiled_code_cache_filename():
+    """Return the filename where the cache of code compiled from interactive
+    input is persisted.
+    """
+    cachedir = os.path.join(XSH.env["XONSH_DATA_DIR"], "xonsh_code_cache")
+    return os.path.join(cachedir, f"interactive.{sys.implementation.cache_tag}")
+
+
 def code_cache_name(code):
     """
     Return an appropriate spoofed filename for the given code.
@@ -8,14 +8,19 @@ True) or must be run the foreground (returns False).
 
 import argparse
 import collections.abc as cabc
+import contextlib
+import mmap
 import os
-import pickle
+import select
+import struct
+import threading
 import time
 import typing as tp
+import zlib
 from pathlib import Path
 
 from xonsh.lib.lazyasd import lazyobject
-from xonsh.platform import ON_POSIX, ON_WINDOWS, pathbasename
+from xonsh.platform import ON_LINUX, ON_POSIX, ON_WINDOWS, pathbasename
 from xonsh.procs.executables import (
     get_paths,
     get_possible_names,
@@ -120,6 +125,316 @@ def executables_in(path) -> tp.Iterable[str]:
         return
 
 
+class StatPathsWatcher:
+    """Watches directories for changes by polling their modification time.
+
+    The directories are polled at most once per ``interval`` seconds, so
+    lookups in between don't touch the file system at all.
+    """
+
+    interval = 1.0
+
+    def __init__(self):
+        self._mtimes: dict[str, float | None] = {}
+        self._last_check = 0.0
+
+    def watch(self, paths: tp.Iterable[str]):
+        """Start watching the given directories, using their current state as
+        the baseline."""
+        for path in paths:
+            self._mtimes[path] = _getmtime(path)
+        self._last_check = time.monotonic()
+
+    def changed(self, paths: tp.Sequence[str]) -> set[str]:
+        """Returns the directories of ``paths`` that changed since the last call."""
+        now = time.monotonic()
+        if now - self._last_check < self.interval:
+            return set()
+        self._last_check = now
+        changed = set()
+        for path in paths:
+            mtime = _getmtime(path)
+            if self._mtimes.get(path) != mtime:
+                self._mtimes[path] = mtime
+                changed.add(path)
+        return changed
+
+    def close(self):
+        """Release resources held by the watcher."""
+
+
+class InotifyPathsWatcher(StatPathsWatcher):
+    """Watches directories for changes with Linux inotify.
+
+    Events are collected by a background thread, so checking for changes is
+    free of system calls. Directories that can't be watched (e.g. because the
+    inotify watch limit is reached) are polled like in ``StatPathsWatcher``.
+    """
+
+    # IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    # | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+    MASK = 0x4 | 0x40 | 0x80 | 0x100 | 0x200 | 0x400 | 0x800 | 0x1000000
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+
+    def __init__(self):
+        super().__init__()
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        fd = libc.inotify_init1(os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._fd = fd
+        self._wake_r, self._wake_w = os.pipe()
+        self._lock = threading.Lock()
+        self._wds: dict[int, str] = {}
+        self._watched: set[str] = set()
+        self._unwatched: set[str] = set()
+        self._dirty: set[str] = set()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="commands-cache-inotify", daemon=True
+        )
+        self._thread.start()
+
+    def watch(self, paths):
+        stat_paths = []
+        for path in paths:
+            if path in self._watched:
+                continue
+            wd = self._add_watch(self._fd, os.fsencode(path), self.MASK)
+            if wd < 0:
+                stat_paths.append(path)
+                self._unwatched.add(path)
+                continue
+            with self._lock:
+                self._wds[wd] = path
+                self._watched.add(path)
+            self._unwatched.discard(path)
+        super().watch(stat_paths)
+
+    def changed(self, paths):
+        new = [p for p in paths if p not in self._watched and p not in self._unwatched]
+        if new:
+            self.watch(new)
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        changed = dirty.intersection(paths)
+        if self._unwatched:
+            changed |= super().changed([p for p in paths if p in self._unwatched])
+        return changed
+
+    def _run(self):
+        while not self._closed:
+            try:
+                ready, _, _ = select.select([self._fd, self._wake_r], [], [])
+                if self._wake_r in ready:
+                    break
+                buf = os.read(self._fd, 65536)
+            except OSError:
+                break
+            self._handle_events(buf)
+        os.close(self._fd)
+        os.close(self._wake_r)
+
+    def _handle_events(self, buf: bytes):
+        with self._lock:
+            offset = 0
+            while offset + 16 <= len(buf):
+                wd, mask, _, length = struct.unpack_from("iIII", buf, offset)
+                offset += 16 + length
+                if mask & self.IN_Q_OVERFLOW:
+                    # events were lost, everything needs a rescan
+                    self._dirty.update(self._watched)
+                    continue
+                path = self._wds.get(wd)
+                if path is None:
+                    continue
+                self._dirty.add(path)
+                if mask & self.IN_IGNORED:
+                    # the directory is gone, it is watched again once it is back
+                    del self._wds[wd]
+                    self._watched.discard(path)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            os.write(self._wake_w, b"\0")
+            os.close(self._wake_w)
+
+
+def make_paths_watcher(kind: str) -> StatPathsWatcher | None:
+    """Creates a watcher for ``$COMMANDS_CACHE_WATCHER``.
+
+    ``auto`` and ``inotify`` use inotify where it is available and fall back
+    to polling otherwise. ``none`` (or any unknown value) disables watching.
+    """
+    kind = kind.lower()
+    if kind in ("auto", "inotify") and ON_LINUX:
+        try:
+            return InotifyPathsWatcher()
+        except (OSError, AttributeError):
+            pass
+    if kind in ("auto", "inotify", "stat"):
+        return StatPathsWatcher()
+    return None
+
+
+def _getmtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class CommandsCacheFile:
+    """On-disk store of the executables found in ``$PATH`` directories.
+
+    The file starts with a magic string and a format version and is followed
+    by one section per directory::
+
+        <path length:u32> <mtime:f64> <payload length:u32> <crc32:u32>
+        <path:utf-8> <payload: NUL separated command names>
+
+    Updates append new sections, the last section of a directory wins. The
+    file is rewritten without the outdated sections once they take more space
+    than the current ones. Loading memory-maps the file and decodes only the
+    sections of the requested directories. A section with a bad checksum or
+    a truncated tail is ignored rather than discarding the whole file.
+    """
+
+    MAGIC = b"XONSHCMDS"
+    VERSION = 1
+    HEADER = struct.Struct("<9sH")
+    SECTION = struct.Struct("<IdII")
+
+    def __init__(self, path: Path, legacy: Path | None = None):
+        self.path = path
+        # file of an older cache format, removed once this one is written
+        self.legacy = legacy
+        # size of the live and outdated sections in the file, used for compaction
+        self._live = 0
+        self._dead = 0
+
+    def _index(self, buf) -> dict[str, tuple[int, int, int]]:
+        """Maps directories to ``(offset, length, size)`` of their last section,
+        where ``offset`` and ``length`` point to the section's payload and
+        ``size`` is the size of the whole section."""
+        index: dict[str, tuple[int, int, int]] = {}
+        self._live = self._dead = 0
+        if len(buf) < self.HEADER.size or self.HEADER.unpack_from(buf) != (
+            self.MAGIC,
+            self.VERSION,
+        ):
+            return index
+        offset = self.HEADER.size
+        end = len(buf)
+        while offset + self.SECTION.size <= end:
+            plen, _, length, _ = self.SECTION.unpack_from(buf, offset)
+            start = offset + self.SECTION.size + plen
+            if start + length > end:
+                break  # truncated by an interrupted write
+            path = bytes(buf[offset + self.SECTION.size : start]).decode(
+                "utf-8", "surrogateescape"
+            )
+            size = start + length - offset
+            if path in index:
+                self._dead += index[path][2]
+                self._live -= index[path][2]
+            index[path] = (offset, length, size)
+            self._live += size
+            offset = start + length
+        return index
+
+    def _read_section(self, buf, offset) -> _Commands | None:
+        plen, mtime, length, crc = self.SECTION.unpack_from(buf, offset)
+        start = offset + self.SECTION.size + plen
+        payload = buf[start : start + length]
+        if zlib.crc32(payload) != crc:
+            return None
+        cmds = bytes(payload).decode("utf-8", "surrogateescape")
+        return _Commands(mtime, tuple(cmds.split("\0")) if cmds else ())
+
+    def _section(self, path: str, entry: _Commands) -> bytes:
+        bpath = path.encode("utf-8", "surrogateescape")
+        payload = "\0".join(entry.cmds).encode("utf-8", "surrogateescape")
+        head = self.SECTION.pack(
+            len(bpath), entry.mtime or 0.0, len(payload), zlib.crc32(payload)
+        )
+        return head + bpath + payload
+
+    def load(self, paths: tp.Iterable[str]) -> dict[str, _Commands]:
+        """Loads the cached commands of the given directories."""
+        result: dict[str, _Commands] = {}
+        try:
+            with open(self.path, "rb") as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as buf:
+                index = self._index(buf)
+                for path in paths:
+                    if path not in index:
+                        continue
+                    entry = self._read_section(buf, index[path][0])
+                    if entry is not None:
+                        result[path] = entry
+        except (OSError, ValueError, struct.error):
+            # missing, empty or unreadable file
+            pass
+        return result
+
+    def update(self, entries: dict[str, _Commands]):
+        """Stores the given directories, appending to the file if possible."""
+        sections = b"".join(self._section(p, e) for p, e in entries.items())
+        try:
+            if self._is_valid() and self._dead <= self._live:
+                with open(self.path, "ab") as f:
+                    f.write(sections)
+                # roughly, the appended sections replace as many outdated bytes
+                self._dead += len(sections)
+            else:
+                self._rewrite(set(entries), sections)
+        except OSError:
+            pass
+
+    def _is_valid(self):
+        try:
+            with open(self.path, "rb") as f:
+                return self.HEADER.unpack(f.read(self.HEADER.size)) == (
+                    self.MAGIC,
+                    self.VERSION,
+                )
+        except (OSError, struct.error):
+            return False
+
+    def _rewrite(self, paths: set[str], sections: bytes):
+        """Writes the file from scratch, keeping only the last section of
+        every directory that is not in ``paths``, followed by ``sections``."""
+        header = self.HEADER.pack(self.MAGIC, self.VERSION)
+        chunks = [header]
+        try:
+            with open(self.path, "rb") as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as buf:
+                for path, (offset, _, size) in self._index(buf).items():
+                    if path not in paths:
+                        chunks.append(bytes(buf[offset : offset + size]))
+        except (OSError, ValueError, struct.error):
+            pass
+        chunks.append(sections)
+        data = b"".join(chunks)
+        self._index(data)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, self.path)
+        if self.legacy is not None:
+            with contextlib.suppress(OSError):
+                self.legacy.unlink()
+            self.legacy = None
+
+
 class CommandsCache(cabc.Mapping):
     """A lazy cache representing the commands available on the file system.
     The keys are the command names and the values a tuple of (loc, has_alias)
@@ -132,7 +447,8 @@ class CommandsCache(cabc.Mapping):
     where you just need to locate executable command.
     """
 
-    CACHE_FILE = "path-commands-cache.pickle"
+    CACHE_FILE = "path-commands-cache.bin"
+    LEGACY_CACHE_FILE = "path-commands-cache.pickle"
 
     def __init__(self, env, aliases=None) -> None:
         # cache commands in path by mtime
@@ -153,6 +469,15 @@ class CommandsCache(cabc.Mapping):
         else:
             self.aliases = aliases
         self._cache_file = None
+        self._cache_store: CommandsCacheFile | None = None
+
+        # optional watcher of $PATH directories, see $COMMANDS_CACHE_WATCHER
+        self._watcher: StatPathsWatcher | None = None
+        self._watcher_kind: str | None = None
+        self._watched_paths: tuple[str, ...] | None = None
+        self._path_key: tuple[str, ...] | None = None
+        self._path_time = 0.0
+        self._paths: tuple[str, ...] = ()
 
     @property
     def cache_file(self):
@@ -164,6 +489,10 @@ class CommandsCache(cabc.Mapping):
                 self._cache_file = (
                     Path(env["XONSH_CACHE_DIR"]).joinpath(self.CACHE_FILE).resolve()
                 )
+                self._cache_store = CommandsCacheFile(
+                    self._cache_file,
+                    legacy=self._cache_file.with_name(self.LEGACY_CACHE_FILE),
+                )
             else:
                 # set a falsy value other than None
                 self._cache_file = ""
@@ -217,6 +546,40 @@ class CommandsCache(cabc.Mapping):
         self.update_cache()
         return self._cmds_cache
 
+    @property
+    def watcher(self) -> StatPathsWatcher | None:
+        """The watcher of the ``$PATH`` directories as configured by
+        ``$COMMANDS_CACHE_WATCHER`` or None if the directories are polled on
+        every lookup."""
+        env = self.env
+        kind = "none"
+        if env.get("ENABLE_COMMANDS_CACHE", True):
+            kind = env.get("COMMANDS_CACHE_WATCHER", None) or "none"
+        if kind != self._watcher_kind:
+            if self._watcher is not None:
+                self._watcher.close()
+            self._watcher = make_paths_watcher(kind)
+            self._watcher_kind = kind
+            self._watched_paths = None
+        return self._watcher
+
+    def _get_paths(self, watcher):
+        """Returns the ``$PATH`` directories. With a watcher the result is reused
+        while ``$PATH`` stays the same and re-checked once per watcher interval."""
+        if watcher is None:
+            return get_paths(self.env)
+        key = tuple(self.env.get("PATH") or ())
+        now = time.monotonic()
+        if (
+            key != self._path_key
+            or now - self._path_time >= watcher.interval
+            or self._watched_paths is None
+        ):
+            self._path_key = key
+            self._path_time = now
+            self._paths = get_paths(self.env)
+        return self._paths
+
     def resolve_symlink(self, path):
         visited = set()
         current_path = path
@@ -244,45 +607,87 @@ class CommandsCache(cabc.Mapping):
         Usage ``executables`` is preferred instead of commands_cache for cases
         where you just need to locate executable command.
         """
-        env = self.env
+        watcher = self.watcher
         # iterate backwards so that entries at the front of PATH overwrite
         # entries at the back.
-        paths = get_paths(env)
+        paths = self._get_paths(watcher)
+        if watcher is not None and paths == self._watched_paths:
+            return self._update_watched_cache(watcher, paths)
+        if watcher is not None:
+            # start watching before scanning to not miss any change in between
+            watcher.watch(paths)
+            self._watched_paths = paths
         if self._update_and_check_changes(paths):
-            all_cmds = CacheDict()
-            for cmd, path in self._iter_binaries(paths):
-                # None     -> not in aliases
-                all_cmds[cmd] = (path, None)
-
-            # aliases override cmds
-            for cmd in self.aliases:
-                # Get the possible names the alias could be overriding,
-                # and check if any are in all_cmds.
-                possibilities = self.get_possible_names(cmd)
-                override_key = next(
-                    (possible for possible in possibilities if possible in all_cmds),
-                    None,
-                )
-                if override_key:
-                    # (path, False) -> has same named alias
-                    all_cmds[override_key] = (all_cmds[override_key][0], False)
-                else:
-                    # True -> pure alias
-                    all_cmds[cmd] = (cmd, True)
-            self._cmds_cache = all_cmds
+            self._build_cmds_cache(paths)
         return self._cmds_cache
 
+    def _build_cmds_cache(self, paths):
+        all_cmds = CacheDict()
+        for cmd, path in self._iter_binaries(paths):
+            # None     -> not in aliases
+            all_cmds[cmd] = (path, None)
+
+        # aliases override cmds
+        for cmd in self.aliases:
+            self._add_alias(all_cmds, cmd)
+        self._cmds_cache = all_cmds
+
+    def _add_alias(self, all_cmds, cmd):
+        # Get the possible names the alias could be overriding,
+        # and check if any are in all_cmds.
+        possibilities = self.get_possible_names(cmd)
+        override_key = next(
+            (possible for possible in possibilities if possible in all_cmds),
+            None,
+        )
+        if override_key:
+            # (path, False) -> has same named alias
+            all_cmds[override_key] = (all_cmds[override_key][0], False)
+        else:
+            # True -> pure alias
+            all_cmds[cmd] = (cmd, True)
+
+    def _update_watched_cache(self, watcher, paths):
+        """Updates the cache from the directories reported by the watcher.
+        Only the commands found in the changed directories are resolved again.
+        """
+        is_aliases_change = self._update_aliases_cache()
+        changed = watcher.changed(paths)
+        if not (changed or is_aliases_change):
+            return self._cmds_cache
+        names = set()
+        for path in changed:
+            old = self._paths_cache.get(path)
+            new = _Commands(_getmtime(path), tuple(executables_in(path)))
+            self._paths_cache[path] = new
+            names.update(set(new.cmds).symmetric_difference(old.cmds if old else ()))
+        if changed and self.cache_file:
+            self._cache_store.update({p: self._paths_cache[p] for p in changed})
+        if is_aliases_change or ON_WINDOWS:
+            # aliases and case-insensitive names need the full resolution
+            self._build_cmds_cache(paths)
+            return self._cmds_cache
+        all_cmds = self._cmds_cache
+        for name in names:
+            location = next(
+                (p for p in reversed(paths) if name in self._paths_cache[p].cmds),
+                None,
+            )
+            if location is None:
+                all_cmds.pop(name, None)
+            else:
+                all_cmds[name] = (os.path.join(location, name), None)
+        for cmd in names.intersection(self.aliases):
+            self._add_alias(all_cmds, cmd)
+        return all_cmds
+
     def _update_paths_cache(self, paths: tp.Sequence[str]) -> bool:
         """load cached results or update cache"""
-        if (not self._paths_cache) and self.cache_file and self.cache_file.exists():
+        if (not self._paths_cache) and self.cache_file:
             # first time load the commands from cache-file if configured
-            try:
-                self._paths_cache = pickle.loads(self.cache_file.read_bytes()) or {}
-            except Exception:
-                # the file is corrupt
-                self.cache_file.unlink(missing_ok=True)
+            self._paths_cache = self._cache_store.load(paths)
 
-        updated = False
+        updated = []
         for path in paths:
             modified_time = os.path.getmtime(path)
             if (
@@ -290,14 +695,14 @@ class CommandsCache(cabc.Mapping):
                 or (path not in self._paths_cache)
                 or (self._paths_cache[path].mtime != modified_time)
             ):
-                updated = True
+                updated.append(path)
                 self._paths_cache[path] = _Commands(
                     modified_time, tuple(executables_in(path))
                 )
 
         if updated and self.cache_file:
-            self.cache_file.write_bytes(pickle.dumps(self._paths_cache))
-        return updated
+            self._cache_store.update({p: self._paths_cache[p] for p in updated})
+        return bool(updated)
 
     def _iter_binaries(self, paths):
         for path in paths:
@@ -11,7 +11,7 @@ from xonsh.parsers.completion_context import CommandContext
 @contextual_command_completer
 def complete_from_bash(context: CommandContext):
     """Completes based on results from BASH completion."""
-    env = XSH.env.detype()  # type: ignore
+    env = XSH.env.detyped_view()  # type: ignore
     paths = XSH.env.get("BASH_COMPLETIONS", ())  # type: ignore
     command = xp.bash_command()
     args = [arg.value for arg in context.args]
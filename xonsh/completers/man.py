@@ -24,7 +24,7 @@ def get_man_completions_path() -> Path:
 
 def _get_man_page(cmd: str):
     """without control characters"""
-    env = XSH.env.detype()
+    env = XSH.env.detyped_view()
     manpage = subprocess.Popen(
         ["man", cmd], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env
     )
@@ -239,8 +239,7 @@ def completion_from_cmd_output(line: str, append_space=False):
 def sub_proc_get_output(*args, **env_vars: str) -> "tuple[bytes, bool]":
     env = {}
 
-    # env.detype is mutable, so update the newly created variable
-    env.update(XSH.env.detype())
+    env.update(XSH.env.detyped_view())
 
     env.update(env_vars)  # prefer passed env variables
 
@@ -12,6 +12,7 @@ import subprocess
 import sys
 import textwrap
 import threading
+import types
 import typing as tp
 import warnings
 from collections import ChainMap
@@ -26,7 +27,14 @@ from xonsh.ansi_colors import (
     ansi_style_by_name,
 )
 from xonsh.built_ins import XSH
-from xonsh.codecache import run_script_with_cache
+from xonsh.codecache import (
+    load_rc_snapshot,
+    rc_snapshot_deps,
+    rc_snapshot_filename,
+    run_script_with_cache,
+    run_script_with_snapshot,
+    update_rc_snapshot,
+)
 from xonsh.dirstack import _get_cwd
 from xonsh.events import events
 from xonsh.lib.lazyasd import LazyBool, lazyobject
@@ -481,7 +489,7 @@ class LsColors(cabc.MutableMapping):
             cmd.append(filename)
         # get env
         if XSH.env:
-            denv = XSH.env.detype()
+            denv = XSH.env.detyped_view()
         else:
             denv = None
         # run dircolors
@@ -1152,6 +1160,16 @@ class SubprocessSetting(Xettings):
         doc_default="``$XONSH_INTERACTIVE``",
         type_str="bool",
     )
+    XONSH_ALIAS_CHANNELS = Var.with_default(
+        False,
+        "Whether adjacent callable aliases of a pipeline which run on threads, "
+        "like ``f | g``, pass their output to each other as text in-process, "
+        "instead of encoding it through an OS pipe. This is faster for the "
+        "aliases which read and write large chunks of text, and slower for "
+        "the ones which write line by line. Their ``stdin`` and ``stdout`` "
+        "have no file descriptor then. The aliases with a ``records`` "
+        "parameter always read from a channel.",
+    )
     XONSH_PROC_FREQUENCY = Var.with_default(
         1e-4,
         "The process frequency is the time that "
@@ -1247,10 +1265,30 @@ class CacheSetting(Xettings):
         " (``True``) or re-compiled each time (``False``).",
     )
 
+    XONSH_CACHE_RC_SNAPSHOT = Var.with_default(
+        False,
+        "Controls whether the compiled code of all run control files (from "
+        "``$XONSHRC`` and ``$XONSHRC_DIR``) is bundled into a single startup "
+        "snapshot. The snapshot is rebuilt when any of these files is added, "
+        "removed or modified, otherwise the startup reads one file instead of a "
+        "cache file per run control file.",
+    )
+
     XONSH_CACHE_EVERYTHING = Var.with_default(
         False,
         "Controls whether all code (including code entered at the interactive"
-        " prompt) will be cached.",
+        " prompt) will be cached. The code compiled from interactive input is "
+        "kept across sessions in a single cache file, see "
+        "``$XONSH_CODE_CACHE_SIZE``.",
+    )
+
+    XONSH_CODE_CACHE_SIZE = Var.with_default(
+        1024,
+        "Number of interactive inputs whose compiled code is kept in memory, so "
+        "that commands entered again are not parsed and compiled again. An entry "
+        "is only reused while the names it depended on are still defined (or "
+        "undefined), e.g. defining a variable ``ls`` invalidates ``ls -l``. "
+        "Set to 0 to disable.",
     )
 
     XONSH_CACHE_DIR = Var.with_default(
@@ -1275,6 +1313,27 @@ class CacheSetting(Xettings):
         "If enabled, the CommandsCache is saved between runs and can reduce the startup time.",
     )
 
+    COMMANDS_CACHE_WATCHER = Var.with_default(
+        "none",
+        "How the CommandsCache detects changes in the ``$PATH`` directories. "
+        "``none`` checks the modification time of every directory on each lookup. "
+        "``stat`` checks them at most once per second. ``inotify`` (or ``auto``) "
+        "is notified about changes by the kernel where inotify is available and "
+        "falls back to ``stat`` otherwise. With a watcher only the commands of the "
+        "changed directories are updated.",
+        type_str="str",
+    )
+
+    XONSH_CACHE_FOREIGN_SHELLS = Var.with_default(
+        False,
+        "If enabled, the environment and aliases loaded from foreign shells "
+        "(``source-bash``, ``source-zsh``, ``$FOREIGN_ALIASES``) are saved in "
+        "``$XONSH_CACHE_DIR`` and reused between runs instead of starting the "
+        "foreign shell again. An entry is invalidated when the shell binary, the "
+        "arguments, the environment, the shell's startup files or the sourced "
+        "files change. Files sourced indirectly by those are not tracked.",
+    )
+
 
 class ChangeDirSetting(Xettings):
     """``cd`` Behavior"""
@@ -1688,6 +1747,33 @@ class PromptHistorySetting(Xettings):
         "Store the ``stdout`` and ``stderr`` streams to the history. "
         "Requires that XONSH_CAPTURE_ALWAYS is True.",
     )
+    XONSH_STORE_STDOUT_MAX_SIZE = Var.with_default(
+        0,
+        "Maximum number of characters of a command's output stored to the "
+        "history when ``$XONSH_STORE_STDOUT`` is True. Longer outputs only "
+        "keep their end. Zero means no limit.",
+    )
+    XONSH_HISTORY_COMPRESSION = Var.with_default(
+        "zlib",
+        "Compression of the outputs stored to the history, either ``zlib``, "
+        "``lzma`` (smaller, slower) or an empty string to store them as is. "
+        "Outputs are decompressed when they are read.",
+    )
+    XONSH_HISTORY_COMPRESSION_THRESHOLD = Var.with_default(
+        1024,
+        "Outputs stored to the history are only compressed from this many "
+        "characters on.",
+    )
+    XONSH_HISTORY_LOAD_WORKERS = Var(
+        is_int,
+        to_int_or_none,
+        str,
+        None,
+        "Number of threads loading the JSON history files in parallel, for "
+        "``history transfer`` and for searching the outputs. By default it is "
+        "the same as defined by Python's concurrent.futures.ThreadPoolExecutor "
+        "class.",
+    )
     XONSH_HISTORY_SAVE_CWD = Var.with_default(
         True,
         "Save current working directory to the history.",
@@ -1703,6 +1789,13 @@ class PromptHistorySetting(Xettings):
         "Example: ``$XONSH_HISTORY_IGNORE_REGEX = '(^echo|^.*\\#\\#\\#\\s*|.*\\#\\#\\#\\s*$)'``"
         " - skip commands that start from ``echo`` or ``###``, or end from ``###``.",
     )
+    XONSH_HISTORY_SQLITE_WRITE_DELAY = Var.with_default(
+        1.0,
+        "Maximum number of seconds the sqlite history backend waits before "
+        "writing the commands to the database. The commands run meanwhile "
+        "are written in a single transaction. If zero or less, commands are "
+        "written as soon as they finish.",
+    )
     XONSH_HISTORY_SIGINT_FLUSH = Var.with_default(
         True,
         "Save history after getting SIGINT (Ctrl+C).",
@@ -1784,6 +1877,14 @@ class PTKSetting(PromptSetting):  # sub-classing -> sub-group
         "The main use-case is to fully disable clipboard integration in ``vi_mode``."
         "Only available under the prompt-toolkit shell.",
     )
+    XONSH_PTK_HISTORY_WINDOW = Var.with_default(
+        0,
+        "Number of history entries that prompt-toolkit loads at a time. "
+        "Older entries are loaded, one window after the other, when going "
+        "back past the oldest loaded entry. Note that history searches only "
+        "look at the loaded entries. ``0`` loads the whole history "
+        "(in the background).",
+    )
     XONSH_CTRL_BKSP_DELETION = Var.with_default(
         False,
         "Delete a word on CTRL-Backspace (like ALT-Backspace). "
@@ -2028,6 +2129,11 @@ def DEFAULT_VARS():
 #
 
 
+DETYPE_DEPENDENCIES = frozenset({"EXPAND_ENV_VARS", "HOME", "XONSH_COLOR_STYLE"})
+"""Variables which the detyped form of mutable values depends on, e.g. the
+paths are expanded when ``$EXPAND_ENV_VARS`` is set."""
+
+
 class Env(cabc.MutableMapping):
     """A xonsh environment, whose variables have limited typing
     (unlike BASH). Most variables are, by default, strings (like BASH).
@@ -2049,6 +2155,7 @@ class Env(cabc.MutableMapping):
         self._no_value = object()
         self._orig_env = None
         self._vars = {k: v for k, v in DEFAULT_VARS.items()}
+        self._invalidate_detyped()
 
         if len(args) == 0 and len(kwargs) == 0:
             args = (os_environ,)
@@ -2062,40 +2169,108 @@ class Env(cabc.MutableMapping):
             # this is here so the PATH is accessible to subprocs and so that
             # it can be modified in-place in the xonshrc file
             self._d["PATH"] = list(PATH_DEFAULT)
+            self._mark_dirty("PATH")
+
+    def _invalidate_detyped(self):
+        """Drops the detyped cache so that the next ``detype()`` rebuilds it."""
+        # detyped values, ``None`` when every variable has to be detyped again
         self._detyped = None
+        # keys that were set, deleted or handed out mutable since last detype
+        self._dirty = set()
+        # mutable values that are detyped: key -> version (or None)
+        self._live = {}
+        # mutable values expanding other variables, e.g. ``$HOME/bin`` in a path
+        self._volatile = set()
+        # whether the detyped values were handed out by ``detyped_view()``
+        self._detyped_shared = False
+
+    def _mark_dirty(self, key):
+        self._dirty.add(key)
+        if key in DETYPE_DEPENDENCIES:
+            self._dirty.update(self._live)
+        else:
+            self._dirty.update(self._volatile)
 
     def get_detyped(self, key: str):
-        detyped = self.detype()
-        return detyped.get(key)
+        return self._update_detyped().get(key)
 
     def detype(self):
         """
         Returns a dict of detyped variables.
         Note! If env variable wasn't explicitly set (e.g. the value has default value in ``Xettings``)
         it will be not in this list.
+
+        The dict is a copy, which the caller may modify or keep. See
+        ``detyped_view()`` to only read it.
         """
-        if self._detyped is not None:
-            return self._detyped
-        ctx = {}
-        for key, val in self._d.items():
-            if not isinstance(key, str):
-                key = str(key)
-            detyper = self.get_detyper(key)
-            if detyper is None:
-                # cannot be detyped
-                continue
-            deval = detyper(val)
-            if deval is None:
-                # cannot be detyped
-                continue
-            ctx[key] = deval
-        self._detyped = ctx
+        return dict(self._update_detyped())
+
+    def detyped_view(self):
+        """Returns a read-only view of the detyped variables, without copying
+        them. The view is a snapshot, later changes of the environment are
+        detyped into a copy.
+        """
+        ctx = self._update_detyped()
+        self._detyped_shared = True
+        return types.MappingProxyType(ctx)
+
+    def _update_detyped(self):
+        """Returns the detyped variables, without copying them.
+
+        Only the variables that changed since the previous call are detyped
+        again. Mutable values (paths, sets, ...) are also detyped again when
+        their version changed or when a variable their detyped form depends on
+        was modified (see ``DETYPE_DEPENDENCIES``).
+        """
+        if self._detyped is None:
+            ctx = self._detyped = {}
+            self._live = {}
+            self._volatile = set()
+            self._detyped_shared = False
+            keys = list(self._d)
+        else:
+            ctx = self._detyped
+            keys = self._dirty
+            for key, version in self._live.items():
+                if version is not None and version != getattr(
+                    self._d.get(key), "version", None
+                ):
+                    keys.add(key)
+        self._dirty = set()
+        if keys and self._detyped_shared:
+            ctx = self._detyped = dict(ctx)
+            self._detyped_shared = False
+        for key in keys:
+            self._detype_key(ctx, key)
         return ctx
 
+    def _detype_key(self, ctx, key):
+        val = self._d.get(key, self._no_value)
+        if not isinstance(key, str):
+            key = str(key)
+        ctx.pop(key, None)
+        self._live.pop(key, None)
+        self._volatile.discard(key)
+        if val is self._no_value:
+            return
+        detyper = self.get_detyper(key)
+        if detyper is None:
+            # cannot be detyped
+            return
+        deval = detyper(val)
+        if deval is None:
+            # cannot be detyped
+            return
+        ctx[key] = deval
+        if isinstance(
+            val, cabc.MutableSet | cabc.MutableSequence | cabc.MutableMapping
+        ):
+            self._live[key] = getattr(val, "version", None)
+            if self.get("EXPAND_ENV_VARS") and "$" in repr(val):
+                self._volatile.add(key)
+
     def detype_all(self):  # __getitem__
         """Returns a dict of all available detyped env variables."""
-        if self._detyped is not None:
-            return self._detyped
         ctx = {}
         for key in self.rawkeys():
             if not isinstance(key, str):
@@ -2107,7 +2282,6 @@ class Env(cabc.MutableMapping):
             if not isinstance(val, str):
                 continue
             ctx[key] = val
-        self._detyped = ctx
         return ctx
 
     def replace_env(self):
@@ -2117,7 +2291,7 @@ class Env(cabc.MutableMapping):
         if self._orig_env is None:
             self._orig_env = dict(os_environ)
         os_environ.clear()
-        os_environ.update(self.detype())
+        os_environ.update(self.detyped_view())
 
     def undo_replace_env(self):
         """Replaces the contents of os_environ with a detyped version
@@ -2283,6 +2457,7 @@ class Env(cabc.MutableMapping):
 
     def set_swapped_values(self, swapped_values):
         self._d.set_local_overrides(swapped_values)
+        self._invalidate_detyped()
 
     #
     # Mutable mapping interface
@@ -2297,13 +2472,15 @@ class Env(cabc.MutableMapping):
             val = self.get_default(key)
             if is_callable_default(val):
                 val = self._d[key] = val(self)
+                self._mark_dirty(key)
         else:
             e = "Unknown environment variable: ${}"
             raise KeyError(e.format(key))
         if isinstance(
             val, cabc.MutableSet | cabc.MutableSequence | cabc.MutableMapping
-        ):
-            self._detyped = None
+        ) and not hasattr(val, "version"):
+            # may be modified in-place, versioned values are tracked instead
+            self._dirty.add(key)
         return val
 
     def __setitem__(self, key, val):
@@ -2321,7 +2498,7 @@ class Env(cabc.MutableMapping):
             self._d.set_locally(key, val)
         else:
             self._d[key] = val
-        self._detyped = None
+        self._mark_dirty(key)
         if self.get("UPDATE_OS_ENVIRON"):
             if self._orig_env is None:
                 self.replace_env()
@@ -2345,7 +2522,7 @@ class Env(cabc.MutableMapping):
                 self._d.del_locally(key)
             else:
                 del self._d[key]
-            self._detyped = None
+            self._mark_dirty(key)
             if self.get("UPDATE_OS_ENVIRON") and key in os_environ:
                 del os_environ[key]
         elif key not in self._vars:
@@ -2605,23 +2782,30 @@ def xonshrc_context(
     ctx = {} if ctx is None else ctx
     orig_thread = env.get("THREAD_SUBPROCS")
     env["THREAD_SUBPROCS"] = None
+    rcpaths = []
     if rcfiles is not None:
-        for rcfile in rcfiles:
-            if os.path.isfile(rcfile):
-                status = xonsh_script_run_control(
-                    rcfile, ctx, env, execer=execer, login=login
-                )
-                if status:
-                    loaded.append(rcfile)
-
+        rcpaths.extend(rcfile for rcfile in rcfiles if os.path.isfile(rcfile))
     if rcdirs is not None:
         for rcdir in rcdirs:
-            for rcfile in sorted(dict(scan_dir_for_source_files(rcdir))):
-                status = xonsh_script_run_control(
-                    rcfile, ctx, env, execer=execer, login=login
-                )
-                if status:
-                    loaded.append(rcfile)
+            rcpaths.extend(sorted(dict(scan_dir_for_source_files(rcdir))))
+
+    snapshot = None
+    if execer is not None and env.get("XONSH_CACHE_RC_SNAPSHOT"):
+        snapshot_file = rc_snapshot_filename(rcfiles or (), rcdirs or ())
+        snapshot_deps = rc_snapshot_deps(rcpaths)
+        if snapshot_deps is not None:
+            snapshot = load_rc_snapshot(snapshot_file, snapshot_deps)
+            num_cached = len(snapshot)
+
+    for rcfile in rcpaths:
+        status = xonsh_script_run_control(
+            rcfile, ctx, env, execer=execer, login=login, snapshot=snapshot
+        )
+        if status:
+            loaded.append(rcfile)
+
+    if snapshot is not None and len(snapshot) != num_cached:
+        update_rc_snapshot(snapshot_file, snapshot_deps, snapshot)
     if env["THREAD_SUBPROCS"] is None:
         env["THREAD_SUBPROCS"] = orig_thread
     return loaded
@@ -2658,9 +2842,13 @@ class _RcPath(str):
     pass
 
 
-def xonsh_script_run_control(filename, ctx, env, execer=None, login=True):
+def xonsh_script_run_control(
+    filename, ctx, env, execer=None, login=True, snapshot=None
+):
     """Loads a xonsh file and applies it as a run control.
     Any exceptions are logged here, returns boolean indicating success.
+    If a startup ``snapshot`` dict is given, the compiled code is taken from
+    or added to it instead of the per-script cache.
     """
     if execer is None:
         return False
@@ -2669,7 +2857,10 @@ def xonsh_script_run_control(filename, ctx, env, execer=None, login=True):
     sys.path.append(rc_dir)
     with swap_values(ctx, updates):
         try:
-            exc_info = run_script_with_cache(filename, execer, ctx)
+            if snapshot is None:
+                exc_info = run_script_with_cache(filename, execer, ctx)
+            else:
+                exc_info = run_script_with_snapshot(filename, execer, snapshot, ctx)
         except SyntaxError:
             exc_info = sys.exc_info()
         if exc_info != (None, None, None):
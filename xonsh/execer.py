@@ -1,6 +1,8 @@
 """Implements the xonsh executer."""
 
+import ast
 import builtins
+import collections
 import collections.abc as cabc
 import inspect
 import sys
@@ -19,9 +21,18 @@ from xonsh.tools import (
 )
 
 
+#: Token types that continue a compound statement at the top level.
+_CONTINUATION_TOKENS = frozenset(["ELSE", "ELIF", "EXCEPT", "FINALLY"])
+
+
 class Execer:
     """Executes xonsh code in a context."""
 
+    #: Maximum number of inputs whose subprocess wrapping is remembered.
+    wrap_memo_size = 4096
+    #: Maximum total length of the inputs and wrappings remembered.
+    wrap_memo_chars = 4 * 1024 * 1024
+
     def __init__(
         self,
         filename="<xonsh-code>",
@@ -53,6 +64,8 @@ class Execer:
         self.scriptcache = scriptcache
         self.cacheall = cacheall
         self.ctxtransformer = CtxAwareTransformer(self.parser)
+        self._wrap_memo = collections.OrderedDict()
+        self._wrap_memo_chars = 0
 
     def parse(self, input, ctx, mode="exec", filename=None, transform=True):
         """Parses xonsh code in a context-aware fashion. For context-free
@@ -114,9 +127,12 @@ class Execer:
         filename=None,
         transform=True,
         compile_empty_tree=True,
+        cache=None,
     ):
         """Compiles xonsh code into a Python code object, which may then
-        be execed or evaled.
+        be execed or evaled. If a ``xonsh.codecache.CompiledCodeCache`` is
+        given as ``cache``, code compiled earlier from the same input in an
+        equivalent context is reused.
         """
         if filename is None:
             filename = self.filename
@@ -128,7 +144,18 @@ class Execer:
             glbs = frame.f_globals if glbs is None else glbs
             locs = frame.f_locals if locs is None else locs
         ctx = set(dir(builtins)) | set(glbs.keys()) | set(locs.keys())
-        tree = self.parse(input, ctx, mode=mode, filename=filename, transform=transform)
+        if cache is not None:
+            code = cache.get(input, mode, filename, ctx)
+            if code is not None:
+                return code
+            # the transformer updates the context as it goes
+            tree = self.parse(
+                input, set(ctx), mode=mode, filename=filename, transform=transform
+            )
+        else:
+            tree = self.parse(
+                input, ctx, mode=mode, filename=filename, transform=transform
+            )
         if tree is None:
             return (
                 compile("pass", filename, mode) if compile_empty_tree else None
@@ -146,7 +173,9 @@ class Execer:
                 )  # clamp so no invalid access due to invalid lineno can occur
                 e.text = lines[i]
             raise e
-
+        if cache is not None:
+            names = self.ctxtransformer.ctx_names if transform else ()
+            cache.put(input, mode, filename, names, ctx, code)
         return code
 
     def eval(
@@ -222,6 +251,132 @@ class Execer:
     def _parse_ctx_free(self, input, mode="exec", filename=None, logical_input=False):
         if filename is None:
             filename = self.filename
+        if logical_input:
+            return self._parse_wrapping(input, mode, filename, logical_input=True)
+        if mode == "exec" and (mode, input) not in self._wrap_memo:
+            try:
+                tree = self.parser.parse(
+                    input,
+                    filename=filename,
+                    mode=mode,
+                    debug_level=(self.debug_level >= 2),
+                )
+                return tree, input
+            except IndentationError:
+                raise
+            except SyntaxError:
+                chunks = self._split_statements(input)
+            if len(chunks) > 1:
+                # Each top-level statement is wrapped on its own, so that
+                # fixing up one line only reparses the statement it is in,
+                # rather than the whole input.
+                try:
+                    tree, wrapped = self._parse_statements(chunks, mode, filename)
+                except SyntaxError:
+                    # report the error against the whole input
+                    pass
+                else:
+                    self._remember_wrapping(mode, input, wrapped)
+                    return tree, wrapped
+        return self._parse_memoized(input, mode, filename)
+
+    def _remember_wrapping(self, mode, input, wrapped):
+        """Remembers that ``input`` parses once wrapped up as ``wrapped``."""
+        size = len(input) + len(wrapped)
+        if wrapped == input or size > self.wrap_memo_chars:
+            return
+        self._forget_wrapping((mode, input))
+        self._wrap_memo[mode, input] = wrapped
+        self._wrap_memo_chars += size
+        while (
+            len(self._wrap_memo) > self.wrap_memo_size
+            or self._wrap_memo_chars > self.wrap_memo_chars
+        ):
+            self._forget_wrapping(next(iter(self._wrap_memo)))
+
+    def _forget_wrapping(self, key):
+        wrapped = self._wrap_memo.pop(key, None)
+        if wrapped is not None:
+            self._wrap_memo_chars -= len(key[1]) + len(wrapped)
+
+    def _parse_memoized(self, input, mode, filename):
+        """Parses the input, reusing the subprocess wrapping found the last
+        time the same input was parsed, if any.
+        """
+        key = (mode, input)
+        wrapped = self._wrap_memo.get(key)
+        if wrapped is not None:
+            self._wrap_memo.move_to_end(key)
+            try:
+                tree = self.parser.parse(
+                    wrapped,
+                    filename=filename,
+                    mode=mode,
+                    debug_level=(self.debug_level >= 2),
+                )
+                return tree, wrapped
+            except SyntaxError:
+                self._forget_wrapping(key)
+        tree, wrapped = self._parse_wrapping(input, mode, filename)
+        self._remember_wrapping(mode, input, wrapped)
+        return tree, wrapped
+
+    def _split_statements(self, input):
+        """Splits the input into chunks of lines that each start with a
+        top-level statement. Returns the whole input as the only chunk if it
+        cannot be tokenized.
+        """
+        lexer = self.parser.lexer
+        starts = []
+        level = 0
+        at_start = True
+        decorated = False
+        try:
+            lexer.input(input)
+            for tok in lexer:
+                if tok.type == "INDENT":
+                    level += 1
+                elif tok.type == "DEDENT":
+                    level -= 1
+                elif tok.type == "NEWLINE":
+                    at_start = True
+                elif at_start:
+                    at_start = False
+                    if level == 0 and tok.type not in _CONTINUATION_TOKENS:
+                        if not decorated:
+                            starts.append(tok.lineno - 1)
+                        # decorators stay with the definition they decorate
+                        decorated = tok.type == "AT"
+        except Exception:
+            return [input]
+        lines = input.splitlines(keepends=True)
+        if starts:
+            starts[0] = 0
+        ends = starts[1:] + [len(lines)]
+        return ["".join(lines[i:j]) for i, j in zip(starts, ends)] or [input]
+
+    def _parse_statements(self, chunks, mode, filename):
+        """Parses each chunk of top-level statements on its own, and glues
+        the trees and the wrapped source back together.
+        """
+        body = []
+        wrapped = []
+        offset = 0
+        for chunk in chunks:
+            tree, chunk = self._parse_memoized(chunk, mode, filename)
+            if tree is not None:
+                if offset:
+                    _shift_lineno(tree, offset)
+                body.extend(tree.body)
+            wrapped.append(chunk)
+            offset += chunk.count("\n")
+        tree = ast.Module(body=body, type_ignores=[]) if body else None
+        return tree, "".join(wrapped)
+
+    def _parse_wrapping(self, input, mode, filename, logical_input=False):
+        """Parses the input, wrapping the lines that fail to parse as Python
+        in subprocess tokens.
+        """
 
         def _try_parse(input, greedy):
             last_error_line = last_error_col = -1
@@ -344,3 +499,19 @@ class Execer:
             return _try_parse(input, greedy=False)
         except SyntaxError:
             return _try_parse(input, greedy=True)
+
+
+def _shift_lineno(tree, n):
+    """Moves all nodes in the tree ``n`` lines down, like
+    ``ast.increment_lineno()``, but touching nodes that appear more than once
+    in the tree only once.
+    """
+    seen = set()
+    for node in ast.walk(tree):
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if getattr(node, "lineno", None) is not None:
+            node.lineno += n
+        if getattr(node, "end_lineno", None) is not None:
+            node.end_lineno += n
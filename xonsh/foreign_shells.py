@@ -1,15 +1,20 @@
 """Tools to help interface with foreign shells, such as Bash."""
 
 import collections.abc as cabc
+import contextlib
 import functools
+import hashlib
+import json
 import os
 import re
 import shlex
+import shutil
 import subprocess
 import sys
 import tempfile
 import warnings
 
+from xonsh import __version__ as XONSH_VERSION
 from xonsh.built_ins import XSH
 from xonsh.lib.lazyasd import lazyobject
 from xonsh.platform import ON_CYGWIN, ON_MSYS, ON_WINDOWS
@@ -100,6 +105,143 @@ def DEFAULT_SETERRPOSTCMD():
     return {"bash": "", "zsh": "", "cmd": "if errorlevel 1 exit 1"}
 
 
+@lazyobject
+def DEFAULT_STARTUP_FILES():
+    """Files that a shell reads by itself on startup, keyed by the shell name
+    and the mode (``always``, ``interactive`` or ``login``) that triggers them.
+    """
+    return {
+        "bash": {
+            "interactive": ("/etc/bash.bashrc", "~/.bashrc"),
+            "login": ("/etc/profile", "~/.bash_profile", "~/.bash_login", "~/.profile"),
+        },
+        "zsh": {
+            "always": ("/etc/zshenv", "~/.zshenv"),
+            "interactive": ("/etc/zshrc", "~/.zshrc"),
+            "login": ("/etc/zprofile", "~/.zprofile", "/etc/zlogin", "~/.zlogin"),
+        },
+    }
+
+
+@lazyobject
+def VOLATILE_ENV_VARS():
+    """Environment variables that are ignored when computing the key of the
+    foreign shell data cache. Their current values are passed through as-is.
+    """
+    return frozenset(["_", "SHLVL", "OLDPWD", "COLUMNS", "LINES"])
+
+
+FOREIGN_SHELL_CACHE_VERSION = 1
+
+
+def _file_signature(path, digest=True):
+    """Returns a JSON-friendly signature ``[path, mtime_ns, size, sha256]`` of
+    a file. A missing file gets a signature as well, so that creating it
+    invalidates the cache.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return [path, None, None, None]
+    sha = None
+    if digest:
+        try:
+            with open(path, "rb") as f:
+                sha = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            pass
+    return [path, st.st_mtime_ns, st.st_size, sha]
+
+
+def foreign_shell_dependencies(shell, interactive, login, files, currenv):
+    """Returns the signatures of the shell binary and of all the files that
+    contribute to the output of a foreign shell call: the startup files of
+    the shell and the explicitly sourced ``files``.
+    """
+    shkey = CANON_SHELL_NAMES.get(shell, shell)
+    startup = DEFAULT_STARTUP_FILES.get(shkey, {})
+    paths = list(startup.get("always", ()))
+    if interactive:
+        paths.extend(startup.get("interactive", ()))
+    if login:
+        paths.extend(startup.get("login", ()))
+    paths.extend(files)
+    binary = shutil.which(shell, path=currenv.get("PATH")) or shell
+    deps = [_file_signature(binary, digest=False)]
+    deps.extend(_file_signature(os.path.abspath(os.path.expanduser(p))) for p in paths)
+    return deps
+
+
+def foreign_shell_cache_file(cmd, currenv):
+    """Returns the path of the on-disk cache entry of a foreign shell call, or
+    None if the cache is disabled. The key is made from the command line and
+    the environment that the shell is started with.
+    """
+    env = XSH.env
+    if not (env and env.get("XONSH_CACHE_FOREIGN_SHELLS")):
+        return None
+    key = [
+        FOREIGN_SHELL_CACHE_VERSION,
+        XONSH_VERSION,
+        list(cmd),
+        sorted(
+            (k, v) for k, v in currenv.items() if k not in VOLATILE_ENV_VARS
+        ),
+    ]
+    digest = hashlib.sha256(json.dumps(key).encode()).hexdigest()
+    return os.path.join(env["XONSH_CACHE_DIR"], "foreign_shells", digest + ".json")
+
+
+def load_foreign_shell_cache(cache_file, deps, currenv):
+    """Loads a cache entry written by ``dump_foreign_shell_cache()``.
+
+    Returns a tuple of the shell's environment and output, or None if there is
+    no valid entry, e.g. when any of the dependencies has changed.
+    """
+    try:
+        with open(cache_file, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != FOREIGN_SHELL_CACHE_VERSION or data.get("deps") != deps:
+        return None
+    env = dict(currenv)
+    env.update(data["changed"])
+    for key in data["removed"]:
+        env.pop(key, None)
+    return env, data["output"]
+
+
+def dump_foreign_shell_cache(cache_file, deps, currenv, env, output):
+    """Stores the result of a foreign shell call. The environment is saved as
+    a difference against ``currenv`` so that it can be replayed over any
+    environment that maps to the same cache key.
+    """
+    data = {
+        "version": FOREIGN_SHELL_CACHE_VERSION,
+        "deps": deps,
+        "changed": {k: v for k, v in env.items() if currenv.get(k) != v},
+        "removed": [k for k in currenv if k not in env],
+        # the environment part is not needed to parse aliases and functions
+        "output": ENV_RE.sub("", output),
+    }
+    tmp = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, cache_file)
+    except (OSError, TypeError, ValueError):
+        if XSH.env.get("XONSH_DEBUG"):
+            print(
+                f"xonsh: could not write foreign shell cache {cache_file!r}",
+                file=sys.stderr,
+            )
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+
+
 @functools.lru_cache
 def foreign_shell_data(
     shell,
@@ -126,6 +268,9 @@ def foreign_shell_data(
     """Extracts data from a foreign (non-xonsh) shells. Currently this gets
     the environment, aliases, and functions but may be extended in the future.
 
+    When ``$XONSH_CACHE_FOREIGN_SHELLS`` is enabled, results are also cached
+    on disk in ``$XONSH_CACHE_DIR`` and reused by later xonsh sessions.
+
     Parameters
     ----------
     shell : str
@@ -228,35 +373,48 @@ def foreign_shell_data(
     if dryrun:
         return None, None
     cmd.append(runcmd)
-    if not use_tmpfile:
-        cmd.append(command)
-    else:
-        tmpfile = tempfile.NamedTemporaryFile(suffix=tmpfile_ext, delete=False)
-        tmpfile.write(command.encode("utf8"))
-        tmpfile.close()
-        cmd.append(tmpfile.name)
     if currenv is None and XSH.env:
         currenv = XSH.env.detype()
     elif currenv is not None:
         currenv = dict(currenv)
-    try:
-        s = subprocess.check_output(
-            cmd,
-            stderr=subprocess.PIPE,
-            env=currenv,
-            # start new session to avoid hangs
-            # (doesn't work on Cygwin though)
-            start_new_session=((not ON_CYGWIN) and (not ON_MSYS)),
-            text=True,
-        )
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        if not safe:
-            raise
-        return None, None
-    finally:
-        if use_tmpfile:
-            os.remove(tmpfile.name)
-    env = parse_env(s)
+    cache_file = deps = None
+    if currenv is not None:
+        cache_file = foreign_shell_cache_file(cmd + [command], currenv)
+    if cache_file is not None:
+        deps = foreign_shell_dependencies(shell, interactive, login, files, currenv)
+        cached = load_foreign_shell_cache(cache_file, deps, currenv)
+    else:
+        cached = None
+    if cached is not None:
+        env, s = cached
+    else:
+        if not use_tmpfile:
+            cmd.append(command)
+        else:
+            tmpfile = tempfile.NamedTemporaryFile(suffix=tmpfile_ext, delete=False)
+            tmpfile.write(command.encode("utf8"))
+            tmpfile.close()
+            cmd.append(tmpfile.name)
+        try:
+            s = subprocess.check_output(
+                cmd,
+                stderr=subprocess.PIPE,
+                env=currenv,
+                # start new session to avoid hangs
+                # (doesn't work on Cygwin though)
+                start_new_session=((not ON_CYGWIN) and (not ON_MSYS)),
+                text=True,
+            )
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            if not safe:
+                raise
+            return None, None
+        finally:
+            if use_tmpfile:
+                os.remove(tmpfile.name)
+        env = parse_env(s)
+        if cache_file is not None:
+            dump_foreign_shell_cache(cache_file, deps, currenv, env, s)
     aliases = parse_aliases(
         s,
         shell=shell,
@@ -428,7 +586,7 @@ class ForeignShellBaseAlias:
             input = "".join([f'{self.sourcer} "{f}"\n' for f in self.files]) + input
         cmd = [self.shell] + list(self.extra_args) + ["-ic", input]
         env = XSH.env
-        denv = env.detype()
+        denv = env.detyped_view()
         if streaming:
             subprocess.check_call(cmd, env=denv)
             out = None
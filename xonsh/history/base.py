@@ -1,10 +1,13 @@
 """Base class of Xonsh History backends."""
 
+import base64
 import functools
 import re
 import types
 import uuid
 
+import xonsh.history.search as xhs
+import xonsh.history.stats as xhstats
 from xonsh.built_ins import XSH
 from xonsh.tools import print_warning
 
@@ -28,6 +31,62 @@ class HistoryEntry(types.SimpleNamespace):
     """
 
 
+LZMA_MAGIC = b"\xfd7zXZ\x00"
+
+
+def compress_output(out):
+    """Prepares a command output to be stored to the history, according to
+    ``$XONSH_STORE_STDOUT_MAX_SIZE`` and ``$XONSH_HISTORY_COMPRESSION``.
+
+    Returns
+    -------
+    str or bytes
+        The output, or its compressed UTF-8 encoding if compression makes it
+        smaller.
+    """
+    env = XSH.env
+    max_size = env.get("XONSH_STORE_STDOUT_MAX_SIZE", 0)
+    if max_size and len(out) > max_size:
+        out = out[-max_size:]
+    method = env.get("XONSH_HISTORY_COMPRESSION", "zlib")
+    threshold = env.get("XONSH_HISTORY_COMPRESSION_THRESHOLD", 1024)
+    if not method or len(out) < threshold:
+        return out
+    data = out.encode("utf-8", errors="surrogateescape")
+    if method == "lzma":
+        import lzma
+
+        blob = lzma.compress(data)
+    elif method == "zlib":
+        import zlib
+
+        blob = zlib.compress(data)
+    else:
+        print_warning(f"Unknown history compression: {method!r}")
+        return out
+    return blob if len(blob) < len(data) else out
+
+
+def decompress_output(out):
+    """Reads back an output stored by ``compress_output()``, either as bytes or
+    as the ``{method: base64}`` mapping JSON files hold.
+    """
+    if isinstance(out, dict):
+        (out,) = out.values()
+        out = base64.b64decode(out)
+    if not isinstance(out, bytes):
+        return out
+    if out.startswith(LZMA_MAGIC):
+        import lzma
+
+        data = lzma.decompress(out)
+    else:
+        import zlib
+
+        data = zlib.decompress(out)
+    return data.decode("utf-8", errors="surrogateescape")
+
+
 class History:
     """Xonsh history backend base class.
 
@@ -144,6 +203,35 @@ class History:
         """Get all history items."""
         raise NotImplementedError
 
+    def search(self, query, outputs=False, limit=None, **filters):
+        """Search the history of all sessions.
+
+        Backends without a search index go through ``all_items()``.
+
+        Parameters
+        ----------
+        query : str
+            Words to look for, see ``xonsh.history.search``.
+        outputs : bool, optional
+            Whether to also search the stored outputs.
+        limit : int, optional
+            Maximum number of results.
+        filters : optional
+            ``cwd``, ``rtn``, ``start_time`` and ``end_time`` filters.
+
+        Returns
+        -------
+        list of dict
+            One item per matching input, best ranked first.
+        """
+        return xhs.search_items(
+            self.all_items(), query, outputs=outputs, limit=limit, **filters
+        )
+
+    def columns(self):
+        """All the history, as ``xonsh.history.stats.HistoryColumns``."""
+        return xhstats.HistoryColumns.from_items(self.all_items())
+
     def info(self):
         """A collection of information about the shell history.
 
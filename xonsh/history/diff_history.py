@@ -5,7 +5,8 @@ import difflib
 import itertools
 
 from xonsh.color_tools import COLORS
-from xonsh.lib.lazyjson import LazyJSON
+from xonsh.history.base import decompress_output
+from xonsh.lib.lazyjson import LazyJSON, LJNode
 
 # intern some strings
 REPLACE_S = "replace"
@@ -14,6 +15,10 @@ INSERT_S = "insert"
 EQUAL_S = "equal"
 
 
+def _load(value):
+    return value.load() if isinstance(value, LJNode) else value
+
+
 def bold_str_diff(a, b, sm=None):
     if sm is None:
         sm = difflib.SequenceMatcher()
@@ -188,13 +193,14 @@ class HistoryDiffer:
         if not self.verbose:
             return s + "\n"
         out = xlj["cmds"][0].get("out", "Note: no output stored")
+        out = decompress_output(_load(out))
         s += out.rstrip() + "\n\n"
         return s
 
     def _cmd_out_and_rtn_diff(self, i, j):
         s = ""
-        aout = self.a["cmds"][i].get("out", None)
-        bout = self.b["cmds"][j].get("out", None)
+        aout = decompress_output(_load(self.a["cmds"][i].get("out", None)))
+        bout = decompress_output(_load(self.b["cmds"][j].get("out", None)))
         if aout is None and bout is None:
             # s += 'Note: neither output stored\n'
             pass
@@ -1,12 +1,17 @@
 """Implements JSON version of xonsh history backend."""
 
+import base64
 import collections
 import collections.abc as cabc
+import concurrent.futures
+import heapq
+import itertools
 import os
 import re
 import sys
 import threading
 import time
+import zlib
 
 from xonsh.built_ins import XSH
 
@@ -19,10 +24,17 @@ except ImportError:
 
     JSONDecodeError = json.decoder.JSONDecodeError  # type: ignore
 
+import xonsh.history.search as xhs
+import xonsh.history.stats as xhstats
 import xonsh.lib.lazyjson as xlj
 import xonsh.tools as xt
 import xonsh.xoreutils.uptime as uptime
-from xonsh.history.base import History
+from xonsh.history.base import (
+    LZMA_MAGIC,
+    History,
+    compress_output,
+    decompress_output,
+)
 
 
 def _xhj_gc_commands_to_rmfiles(hsize, files):
@@ -94,6 +106,15 @@ def _xhj_gc_bytes_to_rmfiles(hsize, files):
     return bytes_removed, files_removed
 
 
+def _xhj_compress_output(out):
+    """Compresses an output into a JSON value, see ``compress_output()``."""
+    out = compress_output(out)
+    if isinstance(out, bytes):
+        method = "lzma" if out.startswith(LZMA_MAGIC) else "zlib"
+        return {method: base64.b64encode(out).decode("ascii")}
+    return out
+
+
 def _xhj_get_data_dir():
     dir = xt.expanduser_abs_path(
         os.path.join(XSH.env.get("XONSH_DATA_DIR"), "history_json")
@@ -150,51 +171,782 @@ def _xhj_get_history_files(sort=True, newest_first=False, modified_since=None):
     return files
 
 
-def _xhj_pull_items(pull_times, src_sessionid=None):
+def _xhj_pull_items(pull_times, pull_cursors, src_sessionid=None):
     """List all history items after a given start time.
     Optionally restrict to just items from a single session.
+
+    Only the records appended to the history index since the last pull are
+    read, starting from the cursor of the source session (or of the last full
+    pull). Returns the items along with the cursor for the next pull.
     """
     last_full_pull_time = pull_times[None]
+    cursor = pull_cursors.get(src_sessionid, pull_cursors.get(None))
+    records, cursor = JsonHistoryIndex().tail(cursor)
 
-    if src_sessionid:
-        filename = os.path.join(_xhj_get_data_dir(), f"xonsh-{src_sessionid}.json")
-        src_paths = [filename]
-    else:
-        src_paths = _xhj_get_history_files(
-            sort=True, modified_since=last_full_pull_time
-        )
-
-    # src_paths may include the current session's file, so skip it to avoid duplicates
+    # skip the current session's file to avoid duplicates
     custom_history_file = XSH.env.get("XONSH_HISTORY_FILE") or ""
     current_session_path = xt.expanduser_abs_path(custom_history_file)
-    items = []
-    for path in src_paths:
+    # files indexed again repeat their commands, keep them once
+    items = {}
+    for record in records:
+        path = record["file"]
         if path == current_session_path:
             continue
-        try:
-            lj = xlj.LazyJSON(open(path))
-        except (JSONDecodeError, ValueError):
+        sessionid = record.get("sessionid") or os.path.split(path)[-1][6:-5]
+        if src_sessionid and sessionid != src_sessionid:
             continue
+        since = pull_times.get(sessionid, last_full_pull_time)
+        for i, item in enumerate(record["cmds"], start=record["start"]):
+            if item["ts"][1] > since:
+                items[path, i] = item
 
-        sessionid = os.path.split(path)[-1][6:-5]
-        cmds = lj["cmds"]
-        if len(cmds) == 0:
-            continue
-        # the cutoff point is likely to be very near the end of the session, so iterate backward
-        for i in range(len(cmds) - 1, -1, -1):
-            item = cmds[i].load()
-            if item["ts"][1] > pull_times.get(sessionid, last_full_pull_time):
-                items.append(item)
+    return sorted(items.values(), key=lambda i: i["ts"][1]), cursor
+
+
+def _xhj_reverse_lines(filename, blocksize=1 << 16):
+    """Yields the lines of a file from the last to the first one, reading
+    the file backwards block by block.
+    """
+    try:
+        f = open(filename, "rb")
+    except OSError:
+        return
+    with f:
+        pos = f.seek(0, os.SEEK_END)
+        rest = b""
+        while pos > 0:
+            size = min(blocksize, pos)
+            pos -= size
+            f.seek(pos)
+            lines = (f.read(size) + rest).split(b"\n")
+            # the first piece may be the end of a line in the previous block
+            rest = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line.decode("utf-8", errors="replace")
+        if rest:
+            yield rest.decode("utf-8", errors="replace")
+
+
+def _xhj_append_line(filename, line):
+    """Appends a line to an index file. A single ``O_APPEND`` write keeps the
+    lines of concurrent sessions apart.
+    """
+    try:
+        fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+    except OSError:
+        if XSH.env.get("XONSH_DEBUG"):
+            xt.print_exception(f"Could not update history index {filename}")
+
+
+class JsonHistoryIndex:
+    """Append-only sidecar index of the commands stored in the JSON history
+    files, so that listing them does not require loading every session file.
+
+    Each line of the index records a batch of commands written to one history
+    file: the file path, its session id, the position of the first command in
+    the file's ``cmds`` list, the ``(mtime_ns, size)`` of the file right after
+    the write, and the ``inp``, ``ts``, ``rtn`` and ``cwd`` of each command.
+    Outputs are never indexed, they are only read from the history files.
+
+    A history file whose current stat does not match its last record (written
+    by an older xonsh, rewritten by ``history delete``, ...) is read in full
+    once and indexed again with a ``reset`` record.
+    """
+
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = os.path.join(_xhj_get_data_dir(), "history-index.jsonl")
+        self.filename = filename
+        self._held = itertools.count()
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_mtime_ns, st.st_size]
+
+    @staticmethod
+    def _entry(cmd):
+        entry = {"inp": cmd["inp"], "ts": cmd.get("ts"), "rtn": cmd.get("rtn")}
+        if "cwd" in cmd:
+            entry["cwd"] = cmd["cwd"]
+        return entry
+
+    def _record(
+        self,
+        path,
+        start,
+        cmds,
+        sessionid=None,
+        stat=None,
+        reset=False,
+        reindexed=False,
+    ):
+        record = {
+            "file": path,
+            "sessionid": sessionid,
+            "start": start,
+            "stat": self._stat(path) if stat is None else stat,
+            "cmds": [self._entry(cmd) for cmd in cmds],
+        }
+        if reset:
+            record["reset"] = True
+        if reindexed:
+            # appended after newer commands of other files
+            record["reindexed"] = True
+        return json.dumps(record) + "\n"
+
+    def append(
+        self,
+        path,
+        start,
+        cmds,
+        sessionid=None,
+        stat=None,
+        reset=False,
+        reindexed=False,
+    ):
+        """Records that ``cmds`` were written to the history file ``path``,
+        starting at position ``start`` of its ``cmds`` list.
+        """
+        line = self._record(path, start, cmds, sessionid, stat, reset, reindexed)
+        _xhj_append_line(self.filename, line)
+
+    def read(self):
+        """Reads the index.
+
+        Returns
+        -------
+        files : dict
+            Maps history file paths to ``(stat, cmds)``, ``stat`` is ``None``
+            when the records of the file are inconsistent.
+        nrecords : int
+            Number of records in the index.
+        """
+        files = {}
+        nrecords = 0
+        try:
+            f = open(self.filename, encoding="utf-8", newline="\n")
+        except OSError:
+            return files, nrecords
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    path, start = record["file"], record["start"]
+                    entries = record["cmds"]
+                except (JSONDecodeError, ValueError, KeyError, TypeError):
+                    # torn or foreign line
+                    continue
+                nrecords += 1
+                stat = record.get("stat")
+                known = files.get(path)
+                if record.get("reset") or known is None:
+                    files[path] = (stat if start == 0 else None, entries)
+                else:
+                    cmds = known[1]
+                    if known[0] is None or len(cmds) != start:
+                        stat = None
+                    cmds.extend(entries)
+                    files[path] = (stat, cmds)
+        return files, nrecords
+
+    def end(self):
+        """A cursor at the end of the index, see ``tail()``."""
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size
+
+    def tail(self, cursor=None):
+        """Reads the records appended to the index since ``cursor``.
+
+        Parameters
+        ----------
+        cursor : tuple, optional
+            ``(inode, offset)`` as returned by ``end()`` or a previous call.
+            The whole index is read without a cursor, or when the index was
+            compacted in the meantime.
+
+        Returns
+        -------
+        records : list of dict
+            The new records.
+        cursor : tuple
+            Where the next call should start reading.
+        """
+        records = []
+        try:
+            f = open(self.filename, "rb")
+        except OSError:
+            return records, cursor
+        with f:
+            st = os.fstat(f.fileno())
+            offset = 0
+            if cursor is not None and cursor[0] == st.st_ino:
+                if cursor[1] <= st.st_size:
+                    offset = cursor[1]
+            f.seek(offset)
+            data = f.read()
+        # a line still being written is read the next time
+        size = data.rfind(b"\n") + 1
+        for line in data[:size].splitlines():
+            try:
+                record = json.loads(line.decode("utf-8", errors="replace"))
+                if not {"file", "start", "cmds"} <= record.keys():
+                    continue
+            except (JSONDecodeError, ValueError, AttributeError):
+                # torn or foreign line
+                continue
+            records.append(record)
+        return records, (st.st_ino, offset + size)
+
+    def _reindex(self, path):
+        stat = self._stat(path)
+        try:
+            data = xlj.LazyJSON(path, reopen=False).load()
+            cmds = data["cmds"]
+        except (OSError, JSONDecodeError, ValueError, KeyError, TypeError):
+            # file is missing or corrupted somehow
+            if XSH.env.get("XONSH_DEBUG") > 0:
+                msg = "xonsh history file {0!r} is not valid JSON"
+                print(msg.format(path), file=sys.stderr)
+            return None
+        sessionid = data.get("sessionid")
+        self.append(
+            path, 0, cmds, sessionid=sessionid, stat=stat, reset=True, reindexed=True
+        )
+        return [self._entry(cmd) for cmd in cmds]
+
+    def commands(self, paths, compact=False):
+        """Yields ``(path, cmds)`` for each history file in ``paths``.
+
+        The commands come from the index when it is up to date with the file,
+        otherwise the file is loaded and indexed again. With ``compact``,
+        ``paths`` must be all the history files; once they are all read, the
+        index is rewritten if most of its records are superseded.
+        """
+        index, nrecords = self.read()
+        fresh = {}
+        for path in paths:
+            known = index.get(path)
+            stat = self._stat(path)
+            if known is not None and known[0] is not None and known[0] == stat:
+                cmds = known[1]
             else:
-                break
+                cmds = self._reindex(path)
+                if cmds is None:
+                    continue
+                nrecords += 1
+            fresh[path] = (stat, cmds)
+            yield path, cmds
+        if compact and nrecords > 2 * len(fresh) + 64:
+            self.compact(fresh)
+
+    def commands_newest_first(self, paths):
+        """Yields ``(path, cmds)`` batches of the history files in ``paths``,
+        newest commands first (also within each batch).
+
+        The index is read backwards, so the most recent commands are available
+        without reading the whole index nor any history file. Batches that are
+        out of place in the index (files indexed again after the fact) are
+        held back until older commands come up, and files that the index does
+        not fully cover are loaded at the end.
+        """
+        paths = set(paths)
+        # path -> position where the next (older) record must end,
+        # 0 once all the commands of the file were seen
+        expect = {}
+        # heap of the batches held back, by their newest start time
+        pending = []
+        for line in _xhj_reverse_lines(self.filename):
+            try:
+                record = json.loads(line)
+                path, start = record["file"], record["start"]
+                entries = record["cmds"]
+            except (JSONDecodeError, ValueError, KeyError, TypeError):
+                continue
+            if path not in paths:
+                continue
+            if path not in expect:
+                if record.get("stat") != self._stat(path):
+                    # the file changed behind the index's back
+                    expect[path] = 0
+                    self._hold(pending, path, self._reindex(path))
+                    continue
+            elif expect[path] != start + len(entries):
+                continue
+            expect[path] = start
+            if record.get("reindexed"):
+                self._hold(pending, path, entries)
+                continue
+            if not entries:
+                continue
+            newest = self._start_time(entries[-1])
+            while pending and -pending[0][0] > newest:
+                yield heapq.heappop(pending)[2:]
+            yield path, entries[::-1]
+        for path in paths:
+            if expect.get(path) == 0:
+                continue
+            cmds = self._reindex(path)
+            if cmds is not None:
+                self._hold(pending, path, cmds[: expect.get(path, len(cmds))])
+        while pending:
+            yield heapq.heappop(pending)[2:]
+
+    @staticmethod
+    def _start_time(cmd):
+        try:
+            return float(cmd["ts"][0])
+        except (KeyError, IndexError, TypeError, ValueError):
+            return 0.0
+
+    def _hold(self, pending, path, cmds):
+        if cmds:
+            key = -self._start_time(cmds[-1])
+            heapq.heappush(pending, (key, next(self._held), path, cmds[::-1]))
+
+    def compact(self, files):
+        """Rewrites the index with a single record per history file, ``files``
+        maps paths to ``(stat, cmds)`` as in ``read()``.
+        """
+        tmp = f"{self.filename}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+                for path, (stat, cmds) in files.items():
+                    sessionid = os.path.split(path)[-1][6:-5]
+                    f.write(self._record(path, 0, cmds, sessionid, stat, True))
+            os.chmod(tmp, 0o600)
+            os.replace(tmp, self.filename)
+        except OSError:
+            if XSH.env.get("XONSH_DEBUG"):
+                xt.print_exception(f"Could not compact history index {self.filename}")
+
+
+def _xhj_load_file(path):
+    """Loads all the commands stored in a history file, outputs included.
+    Returns an empty list if the file can not be read.
+    """
+    try:
+        with xlj.LazyJSON(path, reopen=False) as lj:
+            cmds = lj.load()["cmds"]
+    except (OSError, JSONDecodeError, ValueError, KeyError, TypeError):
+        return []
+    for cmd in cmds:
+        if "out" in cmd:
+            cmd["out"] = decompress_output(cmd["out"])
+    return cmds
+
+
+class JsonHistoryLoader:
+    """Loads the commands of many history files in a thread pool and yields
+    them merged by start time, outputs included.
+
+    The files are sorted by the start time of their session, as recorded by
+    the ``JsonHistoryManifest``, and the k-way merge only opens a session once
+    it reaches its start time. At most ``window`` files are decoded ahead of
+    the merge, so only the sessions that overlap the current position of the
+    merge are held in memory.
+
+    Threads are used rather than processes: the workers mostly wait on reads
+    and on the decompression of outputs, which both release the GIL, and a
+    shell can neither fork safely nor be spawned again.
+    """
 
-    items.sort(key=lambda i: i["ts"][1])
-    return items
+    def __init__(self, paths, workers=None, window=None):
+        if workers is None:
+            workers = XSH.env.get("XONSH_HISTORY_LOAD_WORKERS")
+        self.paths = paths
+        self.workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        self.window = window or 2 * self.workers
+
+    def sessions(self):
+        """The ``(start time, path)`` of the readable files, oldest first."""
+        manifest = JsonHistoryManifest()
+        sessions = []
+        for path in self.paths:
+            entry = manifest.entry(path)
+            if entry is not None:
+                sessions.append((entry["ts"][0] or 0.0, path))
+        manifest.save()
+        sessions.sort()
+        return sessions
+
+    def __iter__(self):
+        start_time = JsonHistoryIndex._start_time
+        sessions = collections.deque(self.sessions())
+        pool = concurrent.futures.ThreadPoolExecutor(
+            self.workers, thread_name_prefix="xonsh-history-load"
+        )
+        # (session start, future) of the files decoded ahead of the merge
+        loading = collections.deque()
+        # heap of (start time, tie breaker, command, rest of its file)
+        heap = []
+        order = itertools.count()
+        try:
+            while sessions or loading or heap:
+                while sessions and len(loading) < self.window:
+                    start, path = sessions.popleft()
+                    loading.append((start, pool.submit(_xhj_load_file, path)))
+                # open the sessions started before the next command
+                if loading and (not heap or loading[0][0] <= heap[0][0]):
+                    cmds = iter(loading.popleft()[1].result())
+                    for cmd in cmds:
+                        item = (start_time(cmd), next(order), cmd, cmds)
+                        heapq.heappush(heap, item)
+                        break
+                    continue
+                _, _, cmd, cmds = heap[0]
+                for nxt in cmds:
+                    item = (start_time(nxt), next(order), nxt, cmds)
+                    heapq.heapreplace(heap, item)
+                    break
+                else:
+                    heapq.heappop(heap)
+                yield cmd
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+class JsonHistorySearchIndex:
+    """Inverted index of the words of the inputs stored in the JSON history
+    files, kept in ``history-search.jsonl`` for ``history search``.
+
+    Each line of the index maps the words of a batch of commands of one
+    history file to their positions in the file, with the stat of the file
+    and a checksum of the inputs indexed so far. The inputs themselves are not
+    stored: only the history files whose stat changed since they were indexed
+    are read, and a search only loads the matching commands from their files.
+    Like the history index, it is only appended to: the commands appended to a
+    history file since it was last indexed are added with a new line, and a
+    file which was rewritten is indexed again with a ``reset`` line. The index
+    is rewritten once most of its lines are superseded.
+    """
+
+    version = 2
+    """Bumped when the tokenizer changes, older lines are indexed again."""
+
+    def __init__(self, filename=None, history_index=None):
+        if filename is None:
+            filename = os.path.join(_xhj_get_data_dir(), "history-search.jsonl")
+        self.filename = filename
+        self.history_index = history_index or JsonHistoryIndex()
+        # path -> {"stat": ..., "count": ..., "crc": ..., "words": set}
+        self.files = {}
+        # word -> {path -> [positions]}
+        self.words = {}
+        self.paths = []
+        self.nrecords = 0
+        self.load()
+
+    @staticmethod
+    def _crc(inputs, crc=0):
+        for inp in inputs:
+            crc = zlib.crc32(inp.encode("utf-8", errors="replace"), crc)
+        return crc
+
+    @staticmethod
+    def _inputs(path):
+        """Reads the inputs of a history file, ``None`` if it can not be read."""
+        try:
+            with xlj.LazyJSON(path, reopen=False) as lj:
+                return [cmd["inp"] for cmd in lj["cmds"]]
+        except (OSError, JSONDecodeError, ValueError, KeyError, TypeError):
+            return None
+
+    def _forget(self, path):
+        info = self.files.pop(path, None)
+        if info is None:
+            return
+        for word in info["words"]:
+            postings = self.words.get(word)
+            if postings is not None:
+                postings.pop(path, None)
+                if not postings:
+                    del self.words[word]
+
+    def _merge(self, record):
+        if record["version"] != self.version:
+            raise ValueError("outdated record")
+        path, start = record["file"], record["start"]
+        known = self.files.get(path)
+        if record.get("reset") or known is None:
+            self._forget(path)
+            known = self.files[path] = {"stat": None, "count": 0, "words": set()}
+            if start != 0:
+                # the start of the file is missing
+                return
+        elif known["stat"] is None or known["count"] != start:
+            known["stat"] = None
+            return
+        for word, positions in record["words"].items():
+            self.words.setdefault(word, {}).setdefault(path, []).extend(positions)
+            known["words"].add(word)
+        known["stat"], known["crc"] = record["stat"], record["crc"]
+        known["count"] = start + record["count"]
+
+    def load(self):
+        """Reads the index, unreadable lines are skipped."""
+        try:
+            f = open(self.filename, encoding="utf-8", newline="\n")
+        except OSError:
+            return
+        with f:
+            for line in f:
+                # skipped lines count too, so that compaction drops them
+                self.nrecords += 1
+                try:
+                    record = json.loads(line)
+                    self._merge(record)
+                except (JSONDecodeError, ValueError, KeyError, TypeError):
+                    # torn, outdated or foreign line
+                    continue
+
+    def _add(self, path, inputs, start, stat):
+        """Indexes the inputs of a history file from position ``start``."""
+        reset = start == 0
+        crc = 0 if reset else self.files[path]["crc"]
+        words = {}
+        for i in range(start, len(inputs)):
+            for word in set(xhs.tokenize(inputs[i])):
+                words.setdefault(word, []).append(i)
+        record = {
+            "version": self.version,
+            "file": path,
+            "start": start,
+            "count": len(inputs) - start,
+            "stat": stat,
+            "crc": self._crc(inputs[start:], crc),
+            "words": words,
+        }
+        if reset:
+            record["reset"] = True
+        _xhj_append_line(self.filename, json.dumps(record) + "\n")
+        self._merge(record)
+        self.nrecords += 1
+
+    def update(self, paths):
+        """Brings the index up to date with the history files in ``paths``.
+        Only the files whose stat changed since they were indexed are read.
+        """
+        self.paths = list(paths)
+        current = set(self.paths)
+        for path in [path for path in self.files if path not in current]:
+            self._forget(path)
+        for path in self.paths:
+            stat = JsonHistoryIndex._stat(path)
+            known = self.files.get(path)
+            if known is not None and known["stat"] == stat:
+                continue
+            inputs = self._inputs(path)
+            if inputs is None:
+                self._forget(path)
+                continue
+            if known is not None and known["stat"] is not None:
+                count = known["count"]
+                if count <= len(inputs) and self._crc(inputs[:count]) == known["crc"]:
+                    # commands were appended to the file, or none at all
+                    self._add(path, inputs, count, stat)
+                    continue
+            self._add(path, inputs, 0, stat)
+        if self.nrecords > 2 * len(self.files) + 64:
+            self.compact()
+
+    def compact(self):
+        """Rewrites the index with a single line per history file."""
+        words = {path: {} for path in self.files}
+        for word, postings in self.words.items():
+            for path, positions in postings.items():
+                words[path][word] = positions
+        tmp = f"{self.filename}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+                for path, info in self.files.items():
+                    if info["stat"] is None:
+                        continue
+                    record = {
+                        "version": self.version,
+                        "file": path,
+                        "start": 0,
+                        "count": info["count"],
+                        "stat": info["stat"],
+                        "crc": info["crc"],
+                        "words": words[path],
+                        "reset": True,
+                    }
+                    f.write(json.dumps(record) + "\n")
+            os.chmod(tmp, 0o600)
+            os.replace(tmp, self.filename)
+        except OSError:
+            if XSH.env.get("XONSH_DEBUG"):
+                xt.print_exception(
+                    f"Could not compact history search index {self.filename}"
+                )
+            return
+        self.nrecords = len(self.files)
+
+    def _postings(self, word, prefix=False):
+        if not prefix:
+            return self.words.get(word, {})
+        postings = {}
+        for other, found in self.words.items():
+            if other.startswith(word):
+                for path, positions in found.items():
+                    postings.setdefault(path, []).extend(positions)
+        return postings
+
+    @staticmethod
+    def _load_commands(path, positions):
+        """Loads the commands at the given positions of a history file."""
+        try:
+            with xlj.LazyJSON(path, reopen=False) as lj:
+                cmds = lj["cmds"]
+                return [
+                    JsonHistoryIndex._entry(cmds[i].load())
+                    for i in sorted(positions)
+                    if i < len(cmds)
+                ]
+        except (OSError, JSONDecodeError, ValueError, KeyError, TypeError):
+            return []
+
+    def lookup(self, terms):
+        """Yields the indexed commands containing all the words of the search
+        terms, whether or not phrases are in order.
+        """
+        candidates = None
+        for term in terms:
+            last = len(term.words) - 1
+            for i, word in enumerate(term.words):
+                postings = self._postings(word, prefix=term.prefix and i == last)
+                if candidates is None:
+                    candidates = {path: set(pos) for path, pos in postings.items()}
+                else:
+                    candidates = {
+                        path: positions.intersection(postings[path])
+                        for path, positions in candidates.items()
+                        if path in postings
+                    }
+                if not any(candidates.values()):
+                    return
+        if candidates is None:
+            # no words to look up, every command matches
+            for _, cmds in self.history_index.commands(self.paths, compact=True):
+                yield from cmds
+            return
+        for path, positions in candidates.items():
+            if positions:
+                yield from self._load_commands(path, positions)
+
+
+class JsonHistoryManifest:
+    """Stats of the JSON history files kept in ``history-gc.json``, so that
+    garbage collection only opens the files that changed since its last run.
+
+    Each history file is mapped to its ``(mtime_ns, size)`` stat, its start
+    and end times, its number of commands and whether it is locked.
+    """
+
+    version = 1
+
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = os.path.join(_xhj_get_data_dir(), "history-gc.json")
+        self.filename = filename
+        self.files = {}
+        self.changed = False
+        self.load()
+
+    def load(self):
+        """Reads the manifest, an unreadable manifest is built again."""
+        try:
+            with open(self.filename, encoding="utf-8") as f:
+                data = json.loads(f.read())
+            if data["version"] == self.version:
+                self.files = data["files"]
+        except (OSError, JSONDecodeError, ValueError, KeyError, TypeError):
+            self.files = {}
+
+    def save(self):
+        """Writes the manifest if it was updated."""
+        if not self.changed:
+            return
+        data = {"version": self.version, "files": self.files}
+        # gc threads of the same process may save at the same time
+        tmp = f"{self.filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+                f.write(json.dumps(data))
+            os.chmod(tmp, 0o600)
+            os.replace(tmp, self.filename)
+        except OSError:
+            if XSH.env.get("XONSH_DEBUG"):
+                xt.print_exception(f"Could not save history manifest {self.filename}")
+        self.changed = False
+
+    @staticmethod
+    def _scan(path, stat):
+        if stat[1] == 0:
+            # collect empty files (for gc)
+            mtime = stat[0] / 1e9
+            return {"stat": stat, "ts": [mtime, None], "ncmds": 0, "locked": False}
+        with xlj.LazyJSON(path, reopen=False) as lj:
+            ts = lj.get("ts", (0.0, None))
+            return {
+                "stat": stat,
+                "ts": [ts[0], ts[1]],
+                "ncmds": len(lj.sizes["cmds"]) - 1,
+                "locked": bool(lj.get("locked", False)),
+            }
+
+    def entry(self, path):
+        """The manifest entry of a history file, which is only read again if
+        it changed. ``None`` if the file can not be read.
+        """
+        stat = JsonHistoryIndex._stat(path)
+        if stat is None:
+            return None
+        entry = self.files.get(path)
+        if entry is not None and entry["stat"] == stat:
+            return entry
+        try:
+            entry = self._scan(path, stat)
+        except (OSError, ValueError, KeyError, TypeError):
+            entry = None
+        if entry is None:
+            self.forget(path)
+        else:
+            self.files[path] = entry
+            self.changed = True
+        return entry
+
+    def forget(self, path):
+        """Drops a history file from the manifest."""
+        if self.files.pop(path, None) is not None:
+            self.changed = True
+
+    def prune(self, paths):
+        """Drops the files that are not in ``paths`` anymore."""
+        paths = set(paths)
+        for path in [path for path in self.files if path not in paths]:
+            self.forget(path)
 
 
 class JsonHistoryGC(threading.Thread):
     """Shell history garbage collection."""
 
+    batchsize = 256
+    """Number of files removed before the manifest is saved and other
+    threads get a chance to run."""
+
     def __init__(self, wait_for_shell=True, size=None, force=False, *args, **kwargs):
         """Thread responsible for garbage collecting old history.
 
@@ -211,6 +963,7 @@ class JsonHistoryGC(threading.Thread):
             "s": _xhj_gc_seconds_to_rmfiles,
             "b": _xhj_gc_bytes_to_rmfiles,
         }
+        self.manifest = None
         self.start()
 
     def run(self):
@@ -234,8 +987,7 @@ class JsonHistoryGC(threading.Thread):
             hist.hist_units = units
 
         if self.force_gc or size_over < hsize:
-            i = 0
-            for _, _, f, _ in rm_files:
+            for i, (_, _, f, _) in enumerate(rm_files):
                 try:
                     os.remove(f)
                     if xonsh_debug:
@@ -243,10 +995,13 @@ class JsonHistoryGC(threading.Thread):
                             f"... Deleted {i:7d} of {len(rm_files):7d} history files.\r",
                             end="",
                         )
-                    pass
                 except OSError:
                     pass
-                i += 1
+                self.manifest.forget(f)
+                if (i + 1) % self.batchsize == 0:
+                    self.manifest.save()
+                    time.sleep(0.001)  # let the shell run between batches
+            self.manifest.save()
         else:
             print(
                 f"Warning: History garbage collection would discard more history ({size_over} {units}) than it would keep ({hsize}).\n"
@@ -257,8 +1012,11 @@ class JsonHistoryGC(threading.Thread):
         """Find and return the history files. Optionally locked files may be
         excluded.
 
+        Only the files that changed since the last run are opened, the others
+        are described by the ``JsonHistoryManifest``.
+
         This is sorted by the last closed time. Returns a list of
-        (file_size, timestamp, number of cmds, file name) tuples.
+        (timestamp, number of cmds, file name, file_size) tuples.
         """
         env = XSH.env
         if env is None:
@@ -267,57 +1025,70 @@ class JsonHistoryGC(threading.Thread):
         xonsh_debug = env.get("XONSH_DEBUG", 0)
         boot = uptime.boottime()
         fs = _xhj_get_history_files(sort=False)
+        self.manifest = manifest = JsonHistoryManifest()
+        manifest.prune(fs)
         files = []
         time_start = time.time()
         for f in fs:
-            try:
-                cur_file_size = os.path.getsize(f)
-                if cur_file_size == 0:
-                    # collect empty files (for gc)
-                    files.append((os.path.getmtime(f), 0, f, cur_file_size))
+            entry = manifest.entry(f)
+            if entry is None:
+                continue
+            ts = entry["ts"]
+            if entry["locked"] and ts[0] < boot:
+                # computer was rebooted between when this history was created
+                # and now and so this history should be unlocked.
+                try:
+                    self._unlock(f)
+                except (OSError, ValueError):
                     continue
-                lj = xlj.LazyJSON(f, reopen=False)
-                if lj.get("locked", False) and lj["ts"][0] < boot:
-                    # computer was rebooted between when this history was created
-                    # and now and so this history should be unlocked.
-                    hist = lj.load()
-                    lj.close()
-                    hist["locked"] = False
-                    with open(f, "w", newline="\n") as fp:
-                        xlj.ljdump(hist, fp, sort_keys=True)
-                    lj = xlj.LazyJSON(f, reopen=False)
-                if only_unlocked and lj.get("locked", False):
+                entry = manifest.entry(f)
+                if entry is None:
                     continue
-                # info: file size, closing timestamp, number of commands, filename
-                ts = lj.get("ts", (0.0, None))
-                files.append(
-                    (ts[1] or ts[0], len(lj.sizes["cmds"]) - 1, f, cur_file_size)
-                )
-                lj.close()
-                if xonsh_debug:
-                    time_lag = time.time() - time_start
-                    print(
-                        f"[history.{json.__name__}] Enumerated {len(files):,d} history files for {time_lag:0.4f}s.\r",
-                        end="",
-                        file=sys.stderr,
-                    )
-            except (OSError, ValueError):
+            if only_unlocked and entry["locked"]:
                 continue
+            # info: closing timestamp, number of commands, filename, file size
+            files.append((ts[1] or ts[0], entry["ncmds"], f, entry["stat"][1]))
+            if xonsh_debug:
+                time_lag = time.time() - time_start
+                print(
+                    f"[history.{json.__name__}] Enumerated {len(files):,d} history files for {time_lag:0.4f}s.\r",
+                    end="",
+                    file=sys.stderr,
+                )
+        manifest.save()
         files.sort()  # this sorts by elements of the tuple,
         # the first of which just happens to be file mod time.
         # so sort by oldest first.
         return files
 
+    @staticmethod
+    def _unlock(f):
+        with xlj.LazyJSON(f, reopen=False) as lj:
+            hist = lj.load()
+        hist["locked"] = False
+        with open(f, "w", newline="\n") as fp:
+            xlj.ljdump(hist, fp, sort_keys=True, append_key="cmds")
+
 
 class JsonHistoryFlusher(threading.Thread):
     """Flush shell history to disk periodically."""
 
     def __init__(
-        self, filename, buffer, queue, cond, at_exit=False, skip=None, *args, **kwargs
+        self,
+        filename,
+        buffer,
+        queue,
+        cond,
+        at_exit=False,
+        skip=None,
+        sessionid=None,
+        *args,
+        **kwargs,
     ):
         """Thread for flushing history."""
         super().__init__(*args, **kwargs)
         self.filename = filename
+        self.sessionid = sessionid
         self.buffer = buffer
         self.queue = queue
         queue.append(self)
@@ -359,6 +1130,39 @@ class JsonHistoryFlusher(threading.Thread):
 
             cmds.append(cmd)
             last_inp = cmd["inp"]
+        store_stdout = XSH.env.get("XONSH_STORE_STDOUT", False)
+        for i, cmd in enumerate(cmds):
+            if "out" not in cmd:
+                continue
+            # the buffer keeps the raw command
+            cmd = cmds[i] = dict(cmd)
+            if store_stdout:
+                cmd["out"] = _xhj_compress_output(cmd["out"])
+            else:
+                del cmd["out"]
+        load_hist_len = None
+        if not self.at_exit:
+            # only write the new commands and the index
+            try:
+                load_hist_len = xlj.ljappend(
+                    self.filename, "cmds", cmds, sort_keys=True
+                )
+            except (OSError, ValueError, KeyError, TypeError, IndexError):
+                load_hist_len = None
+        if load_hist_len is None:
+            load_hist_len = self.rewrite(cmds)
+        JsonHistoryIndex().append(
+            self.filename,
+            load_hist_len,
+            cmds,
+            sessionid=self.sessionid,
+        )
+
+    def rewrite(self, cmds):
+        """Rewrites the whole history file with the new commands, in a format
+        that later dumps can append to. Returns the previous number of
+        commands.
+        """
         with open(self.filename, newline="\n") as f:
             hist = xlj.LazyJSON(f).load()
         load_hist_len = len(hist["cmds"])
@@ -368,10 +1172,9 @@ class JsonHistoryFlusher(threading.Thread):
             if "ts" in hist:
                 hist["ts"][1] = time.time()  # apply end time
             hist["locked"] = False
-        if not XSH.env.get("XONSH_STORE_STDOUT", False):
-            [cmd.pop("out") for cmd in hist["cmds"][load_hist_len:] if "out" in cmd]
         with open(self.filename, "w", newline="\n") as f:
-            xlj.ljdump(hist, f, sort_keys=True)
+            xlj.ljdump(hist, f, sort_keys=True, append_key="cmds")
+        return load_hist_len
 
 
 class JsonCommandField(cabc.Sequence):
@@ -426,6 +1229,8 @@ class JsonCommandField(cabc.Sequence):
                 if isinstance(rtn, xlj.LJNode):
                     rtn = rtn.load()
             queue.popleft()
+        if self.field == "out":
+            rtn = decompress_output(rtn)
         return rtn
 
     def i_am_at_the_front(self):
@@ -479,7 +1284,10 @@ class JsonHistory(History):
             meta["cmds"] = []
             meta["sessionid"] = str(self.sessionid)
             with open(self.filename, "w", newline="\n") as f:
-                xlj.ljdump(meta, f, sort_keys=True)
+                xlj.ljdump(meta, f, sort_keys=True, append_key="cmds")
+            JsonHistoryIndex().append(
+                self.filename, 0, [], sessionid=meta["sessionid"], reset=True
+            )
 
             try:
                 sudo_uid = os.environ.get("SUDO_UID")
@@ -501,6 +1309,8 @@ class JsonHistory(History):
         self.gc = JsonHistoryGC() if gc else None
         # pull times are tracked per-source-session; None means all sesssions
         self.last_pull_times = {None: time.time()}
+        # and so are the positions in the history index pulls read up to
+        self.last_pull_cursors = {None: JsonHistoryIndex().end()}
         # command fields that are known
         self.tss = JsonCommandField("ts", self)
         self.inps = JsonCommandField("inp", self)
@@ -587,6 +1397,7 @@ class JsonHistory(History):
             self._cond,
             at_exit=at_exit,
             skip=skip,
+            sessionid=str(self.sessionid),
         )
         self.buffer = []
         return hf
@@ -600,35 +1411,66 @@ class JsonHistory(History):
         for item, tss in items:
             yield {"inp": item.rstrip(), "ts": tss[0]}
 
-    def all_items(self, newest_first=False, **kwargs):
+    def all_items(self, newest_first=False, full=False, **kwargs):
         """
         Returns all history as found in XONSH_DATA_DIR.
 
+        With ``newest_first``, items are streamed from the end of the history
+        index, so the most recent commands come without loading the history.
+        With ``full``, the complete commands, outputs included, are loaded
+        from the history files by a ``JsonHistoryLoader``, oldest first.
+
         yield format: {'inp': cmd, 'rtn': 0, ...}
         """
-        while self.gc and self.gc.is_alive():
-            time.sleep(0.011)  # gc sleeps for 0.01 secs, sleep a beat longer
-        for f in _xhj_get_history_files(newest_first=newest_first):
-            try:
-                json_file = xlj.LazyJSON(f, reopen=False)
-            except ValueError:
-                # Invalid json file
-                continue
-            try:
-                commands = json_file.load()["cmds"]
-            except (JSONDecodeError, ValueError):
-                # file is corrupted somehow
-                if XSH.env.get("XONSH_DEBUG") > 0:
-                    msg = "xonsh history file {0!r} is not valid JSON"
-                    print(msg.format(f), file=sys.stderr)
-                continue
-            if newest_first:
-                commands = reversed(commands)
-            for c in commands:
-                yield {"inp": c["inp"].rstrip(), "ts": c["ts"][0]}
+        if full:
+            yield from JsonHistoryLoader(_xhj_get_history_files(sort=False))
+            yield from self.buffer
+            return
+        # no need to wait for the gc, files it removes are just skipped
+        if newest_first:
+            files = _xhj_get_history_files(sort=False)
+            for _, commands in JsonHistoryIndex().commands_newest_first(files):
+                for c in commands:
+                    yield {"inp": c["inp"].rstrip(), "ts": c["ts"][0]}
+            yield from self.items()
+            return
+        files = _xhj_get_history_files()
+        commands = JsonHistoryIndex().commands(files, compact=True)
+        batches = [cmds for _, cmds in commands]
+        for c in heapq.merge(*batches, key=JsonHistoryIndex._start_time):
+            yield {"inp": c["inp"].rstrip(), "ts": c["ts"][0]}
         # all items should also include session items
         yield from self.items()
 
+    def search(self, query, outputs=False, limit=None, **filters):
+        """Search the history of all sessions through the inverted index of
+        the inputs. Outputs are not indexed, searching them loads every
+        history file.
+        """
+        terms = xhs.parse_query(query)
+        files = _xhj_get_history_files(sort=False)
+        if outputs:
+            items = JsonHistoryLoader(files)
+        else:
+            index = JsonHistorySearchIndex()
+            index.update(files)
+            items = index.lookup(terms)
+        items = itertools.chain(items, self.buffer)
+        return xhs.rank(
+            xhs.filter_items(items, terms, outputs, **filters), limit=limit
+        )
+
+    def columns(self):
+        """All the history as columns, read from the history index."""
+        columns = xhstats.HistoryColumns()
+        files = _xhj_get_history_files()
+        for _, commands in JsonHistoryIndex().commands(files, compact=True):
+            for c in commands:
+                columns.append_item(c)
+        for c in self.buffer:
+            columns.append_item(c)
+        return columns
+
     def info(self):
         data = collections.OrderedDict()
         data["backend"] = "json"
@@ -649,7 +1491,10 @@ class JsonHistory(History):
 
         cnt = 0
         prev = None
-        for item in _xhj_pull_items(self.last_pull_times, src_sessionid):
+        items, cursor = _xhj_pull_items(
+            self.last_pull_times, self.last_pull_cursors, src_sessionid
+        )
+        for item in items:
             line = item["inp"].rstrip()
             if show_commands:
                 print(line)
@@ -661,7 +1506,9 @@ class JsonHistory(History):
         # we can dump the session-specific pull times if this is a full pull
         if src_sessionid is None:
             self.last_pull_times = {}
+            self.last_pull_cursors = {}
         self.last_pull_times[src_sessionid] = time.time()
+        self.last_pull_cursors[src_sessionid] = cursor
 
         return cnt
 
@@ -717,7 +1564,7 @@ class JsonHistory(History):
 
                 file_content["cmds"] = commands
                 with open(f, "w") as fp:
-                    xlj.ljdump(file_content, fp)
+                    xlj.ljdump(file_content, fp, append_key="cmds")
             except (JSONDecodeError, ValueError):
                 # file is corrupted somehow
                 if XSH.env.get("XONSH_DEBUG") > 0:
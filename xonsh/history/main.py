@@ -2,7 +2,9 @@
 
 import argparse as ap
 import datetime
+import itertools
 import json
+import math
 import os
 import sys
 import threading
@@ -10,6 +12,7 @@ import typing as tp
 
 import xonsh.cli_utils as xcli
 import xonsh.history.diff_history as xdh
+import xonsh.history.stats as xhstats
 import xonsh.tools as xt
 from xonsh.built_ins import XSH
 from xonsh.history.base import History
@@ -153,6 +156,13 @@ def _xh_filter_ts(commands, start_time, end_time):
             yield cmd
 
 
+def _xh_numerate(commands):
+    """Yield the commands along with their index."""
+    for i, cmd in enumerate(commands):
+        cmd["ind"] = i
+        yield cmd
+
+
 def _xh_get_history(
     session="session",
     *,
@@ -178,12 +188,10 @@ def _xh_get_history(
     Returns
     -------
     generator
-       A filtered list of commands
+       A filtered stream of commands, only held in memory as a whole to
+       take negative slices or to be reversed
     """
-    cmds = []
-    for i, item in enumerate(_XH_HISTORY_SESSIONS[session](location=location)):
-        item["ind"] = i
-        cmds.append(item)
+    cmds = _xh_numerate(_XH_HISTORY_SESSIONS[session](location=location))
     if slices:
         # transform/check all slices
         slices = [xt.ensure_slice(s) for s in slices]
@@ -273,17 +281,23 @@ class HistoryAlias(xcli.ArgParserAlias):
         if _unparsed:
             slices.extend(_unparsed)
         try:
-            commands = _xh_get_history(
-                session,
-                slices=slices,
-                start_time=start_time,
-                end_time=end_time,
-                datetime_format=datetime_format,
-                location=location,
+            commands = iter(
+                _xh_get_history(
+                    session,
+                    slices=slices,
+                    start_time=start_time,
+                    end_time=end_time,
+                    datetime_format=datetime_format,
+                    location=location,
+                )
             )
+            # the history is read lazily, errors opening it come with the
+            # first command
+            first = list(itertools.islice(commands, 1))
         except Exception as err:
             self.parser.error(err)
             return
+        commands = itertools.chain(first, commands)
 
         if reverse:
             commands = reversed(list(commands))
@@ -311,6 +325,67 @@ class HistoryAlias(xcli.ArgParserAlias):
             for c in commands:
                 print(c["inp"], file=_stdout, end=end)
 
+    @staticmethod
+    def search(
+        query: xcli.Annotated[list[str], xcli.Arg(nargs="+")],
+        outputs=False,
+        cwd: str | None = None,
+        rtn: xcli.Annotated[int | None, xcli.Arg(type=int)] = None,
+        datetime_format: str | None = None,
+        start_time: str | None = None,
+        end_time: str | None = None,
+        limit: xcli.Annotated[int | None, xcli.Arg(type=int)] = None,
+        timestamp=False,
+        count=False,
+        null_byte=False,
+        _stdout=None,
+    ):
+        """Search the history of all sessions, most frequent and recent commands first
+
+        Parameters
+        ----------
+        query:
+            words that must all appear in the command, ``word*`` matches any
+            word starting with ``word`` and ``"two words"`` a phrase
+        outputs: -o, --outputs
+            also search the stored outputs of the commands
+        cwd: -d, --cwd
+            show only commands run in this directory
+        rtn: -r, --rtn
+            show only commands that returned this code
+        datetime_format : -f
+            the datetime format to be used for filtering and printing
+        start_time: --start-time, +T
+            show only commands after timestamp
+        end_time: -T, --end-time
+            show only commands before timestamp
+        limit: -n, --limit
+            show at most this many commands
+        timestamp: -t, --ts, --time-stamp
+            show when the commands were last run
+        count: -c, --count
+            show how many times the commands were run
+        null_byte: -0, --nb, --null-byte
+            separate commands by the null character for piping history to external filters
+        """
+        filters = {"cwd": cwd, "rtn": rtn}
+        if start_time is not None:
+            filters["start_time"] = xt.ensure_timestamp(start_time, datetime_format)
+        if end_time is not None:
+            filters["end_time"] = xt.ensure_timestamp(end_time, datetime_format)
+        results = XSH.history.search(
+            " ".join(query), outputs=outputs, limit=limit, **filters
+        )
+        end = "\0" if null_byte else "\n"
+        for c in results:
+            line = c["inp"]
+            if count:
+                line = "{:>5} {}".format(c["count"], line)
+            if timestamp:
+                dt = datetime.datetime.fromtimestamp(c["ts"])
+                line = f"({xt.format_datetime(dt)}) {line}"
+            print(line, file=_stdout, end=end)
+
     @staticmethod
     def id_cmd(_stdout):
         """Display the current session id"""
@@ -423,6 +498,54 @@ class HistoryAlias(xcli.ArgParserAlias):
             lines = [f"{k}: {v}" for k, v in data.items()]
             print("\n".join(lines), file=_stdout)
 
+    @staticmethod
+    def stats(
+        top: xcli.Annotated[int, xcli.Arg(type=int)] = 10,
+        to_json=False,
+        _stdout=None,
+    ):
+        """Display statistics over the history of all sessions
+
+        Parameters
+        ----------
+        top: -n, --top
+            number of commands and directories to list
+        to_json: -j, --json
+            print in JSON format
+        """
+        data = xhstats.history_stats(XSH.history.columns(), top=top)
+        if to_json:
+            # unknown rates and durations are NaN, which is not valid JSON
+            for c in data["most used commands"]:
+                for key in ("failure_rate", "mean", "p95"):
+                    if math.isnan(c[key]):
+                        c[key] = None
+            print(json.dumps(data, allow_nan=False), file=_stdout)
+            return
+        lines = [f"{k}: {data[k]}" for k in ("commands", "distinct commands")]
+        lines.append(f"directories: {data['directories']}")
+        lines.append("")
+        lines.append("most used commands:")
+        lines.append("  count  failed     mean      p95  command")
+        for c in data["most used commands"]:
+            lines.append(
+                "{:>7} {:>6.1%} {:>7.2f}s {:>7.2f}s  {}".format(
+                    c["count"], c["failure_rate"], c["mean"], c["p95"], c["command"]
+                )
+            )
+        lines.append("")
+        lines.append("busiest directories:")
+        for cwd, count in data["busiest directories"]:
+            lines.append(f"{count:>7}  {cwd}")
+        lines.append("")
+        lines.append("commands by hour:")
+        hours = data["commands by hour"]
+        most = max(hours) or 1
+        for hour, count in enumerate(hours):
+            bar = "#" * round(40 * count / most)
+            lines.append(f"  {hour:02d}h {count:>7}  {bar}")
+        print("\n".join(lines), file=_stdout)
+
     @staticmethod
     def gc(
         size: xcli.Annotated[tuple[int, str], xcli.Arg(nargs=2)] = None,
@@ -501,7 +624,12 @@ class HistoryAlias(xcli.ArgParserAlias):
         src = construct_history(backend=source, filename=source_file, gc=False)
         dest = construct_history(backend=target, filename=target_file, gc=False)
 
-        for entry in src.all_items():
+        if isinstance(src, JsonHistory):
+            # complete commands, decoded in parallel and merged by time
+            items = src.all_items(full=True)
+        else:
+            items = src.all_items()
+        for entry in items:
             dest.append(entry)
 
         dest.flush()
@@ -511,9 +639,11 @@ class HistoryAlias(xcli.ArgParserAlias):
     def build(self):
         parser = self.create_parser(prog="history")
         parser.add_command(self.show, prefix_chars="-+")
+        parser.add_command(self.search, prefix_chars="-+")
         parser.add_command(self.id_cmd, prog="id")
         parser.add_command(self.file)
         parser.add_command(self.info)
+        parser.add_command(self.stats)
         parser.add_command(self.pull)
         parser.add_command(self.flush)
         parser.add_command(self.off)
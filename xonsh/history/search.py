@@ -0,0 +1,191 @@
+"""Full-text search of the xonsh history.
+
+A query is made of words that must all appear in a command, case
+insensitively and as whole words. A word ending with ``*`` matches every
+word starting with it, and words within double quotes must appear one after
+the other (e.g. ``"git commit" amend*``). Words are made of letters and
+digits, case and diacritics aside, the same way as the ``unicode61`` tokenizer
+of SQLite FTS5, so that ``foo_bar`` is the phrase ``"foo bar"``.
+
+Matching commands are grouped by input and ranked by frecency: how often
+they were run, weighted by how recently they were last run.
+"""
+
+import re
+import time
+import typing as tp
+import unicodedata
+
+from xonsh.lib.lazyasd import lazyobject
+
+
+@lazyobject
+def TOKEN_RE():
+    return re.compile(r"[^\W_]+")
+
+
+@lazyobject
+def QUERY_TERM_RE():
+    return re.compile(r'"([^"]*)"?(\*?)|(\S+)')
+
+
+class SearchTerm(tp.NamedTuple):
+    """A search query term, either a word or a phrase."""
+
+    words: tuple[str, ...]
+    prefix: bool = False
+    """The last word may only be the start of a word."""
+
+
+def tokenize(text):
+    """Splits a text into lowercase words without diacritics."""
+    text = text.lower()
+    if not text.isascii():
+        text = unicodedata.normalize("NFD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return TOKEN_RE.findall(text)
+
+
+def parse_query(query):
+    """Parses a search query into a list of ``SearchTerm``."""
+    terms = []
+    for m in QUERY_TERM_RE.finditer(query):
+        phrase, star, word = m.groups()
+        if word is not None:
+            star = "*" if word.endswith("*") else ""
+            phrase = word
+        words = tuple(tokenize(phrase))
+        if words:
+            terms.append(SearchTerm(words, bool(star)))
+    return terms
+
+
+def term_matches(term, tokens):
+    """Whether a term appears in a list of tokens."""
+    *head, last = term.words
+    n = len(term.words)
+    for i in range(len(tokens) - n + 1):
+        word = tokens[i + n - 1]
+        if word == last or (term.prefix and word.startswith(last)):
+            if tokens[i : i + n - 1] == head:
+                return True
+    return False
+
+
+def matches(terms, text):
+    """Whether all the terms appear in a text."""
+    tokens = tokenize(text)
+    return all(term_matches(term, tokens) for term in terms)
+
+
+def item_start_time(item):
+    """Start time of a history item, whose ``ts`` may be a float or a
+    ``(start, end)`` pair.
+    """
+    ts = item.get("ts")
+    if isinstance(ts, list | tuple):
+        ts = ts[0] if ts else None
+    return ts or 0.0
+
+
+def accepts(item, cwd=None, rtn=None, start_time=None, end_time=None):
+    """Whether a history item passes the search filters.
+
+    Parameters
+    ----------
+    item : dict
+        A history item.
+    cwd : str, optional
+        Directory the command was run in.
+    rtn : int, optional
+        Return code of the command.
+    start_time, end_time : float, optional
+        Only commands started within this time range.
+    """
+    if cwd is not None and item.get("cwd") != cwd:
+        return False
+    if rtn is not None and item.get("rtn") != rtn:
+        return False
+    if start_time is not None or end_time is not None:
+        ts = item_start_time(item)
+        if start_time is not None and ts < start_time:
+            return False
+        if end_time is not None and ts >= end_time:
+            return False
+    return True
+
+
+def frecency(count, last_run, now=None):
+    """Scores a command run ``count`` times, the last time at ``last_run``,
+    the same way as zoxide ranks directories.
+    """
+    if now is None:
+        now = time.time()
+    age = now - last_run
+    if age < 3600:
+        return count * 4
+    elif age < 86400:
+        return count * 2
+    elif age < 604800:
+        return count / 2
+    return count / 4
+
+
+def rank(items, limit=None, now=None):
+    """Groups history items by input and sorts them by frecency.
+
+    Returns
+    -------
+    list of dict
+        The most recent item of each input, with ``ts`` being its start time
+        and ``count`` the number of times the input was run.
+    """
+    groups = {}
+    for item in items:
+        inp = item["inp"].rstrip()
+        count = item.get("frequency") or 1
+        ts = item_start_time(item)
+        group = groups.get(inp)
+        if group is None:
+            groups[inp] = dict(item, inp=inp, ts=ts, count=count)
+            continue
+        count += group["count"]
+        if ts > group["ts"]:
+            group.update(item, inp=inp, ts=ts)
+        group["count"] = count
+    results = sorted(
+        groups.values(),
+        key=lambda g: (frecency(g["count"], g["ts"], now), g["ts"]),
+        reverse=True,
+    )
+    return results if limit is None else results[:limit]
+
+
+def filter_items(items, terms, outputs=False, **filters):
+    """Yields the history items matching parsed search terms.
+
+    Parameters
+    ----------
+    items : iterable of dict
+        History items.
+    terms : list of SearchTerm
+        The parsed search query.
+    outputs : bool, optional
+        Whether to also search the stored outputs.
+    filters :
+        Passed on to ``accepts()``.
+    """
+    for item in items:
+        if not accepts(item, **filters):
+            continue
+        text = item["inp"]
+        if outputs and item.get("out"):
+            text += "\n" + item["out"]
+        if matches(terms, text):
+            yield item
+
+
+def search_items(items, query, outputs=False, limit=None, **filters):
+    """Searches history items one after the other, see ``filter_items()``."""
+    terms = parse_query(query)
+    return rank(filter_items(items, terms, outputs, **filters), limit=limit)
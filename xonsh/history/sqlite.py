@@ -1,6 +1,7 @@
 """Implements the xonsh history backend via sqlite3."""
 
 import collections
+import contextlib
 import json
 import os
 import re
@@ -9,13 +10,18 @@ import sys
 import threading
 import time
 
+import xonsh.history.search as xhs
+import xonsh.history.stats as xhstats
 import xonsh.tools as xt
 from xonsh.built_ins import XSH
-from xonsh.history.base import History
+from xonsh.history.base import History, compress_output, decompress_output
 
 XH_SQLITE_CACHE = threading.local()
 XH_SQLITE_TABLE_NAME = "xonsh_history"
 XH_SQLITE_CREATED_SQL_TBL = "CREATED_SQL_TABLE"
+XH_SQLITE_FTS_TABLE_NAME = "xonsh_history_fts"
+# compressed outputs (blobs) are not in the full-text index
+XH_SQLITE_FTS_OUT = "CASE WHEN typeof({0}.out) = 'text' THEN {0}.out END"
 
 
 def _xh_sqlite_get_file_name():
@@ -27,10 +33,32 @@ def _xh_sqlite_get_file_name():
     return xt.expanduser_abs_path(file_name)
 
 
-def _xh_sqlite_get_conn(filename=None):
+def _xh_sqlite_get_conn(filename=None, **kwargs):
     if filename is None:
         filename = _xh_sqlite_get_file_name()
-    return sqlite3.connect(str(filename))
+    conn = sqlite3.connect(str(filename), **kwargs)
+    try:
+        # readers don't block the writer (and the other way around), which
+        # matters when many sessions share the same database
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    except sqlite3.DatabaseError:
+        pass
+    return conn
+
+
+@contextlib.contextmanager
+def _xh_sqlite_cursor(filename=None, conn=None):
+    """Yields a cursor within a transaction, either on the given long-lived
+    connection or on a connection that is closed afterwards.
+    """
+    if conn is not None:
+        with conn:
+            yield conn.cursor()
+        return
+    with contextlib.closing(_xh_sqlite_get_conn(filename=filename)) as conn:
+        with conn:
+            yield conn.cursor()
 
 
 def _xh_sqlite_create_history_table(cursor):
@@ -82,11 +110,68 @@ def _xh_sqlite_create_history_table(cursor):
 CREATE INDEX IF NOT EXISTS  idx_inp_history
 ON {XH_SQLITE_TABLE_NAME}(inp);"""
         )
+        # indexes for listing (and pulling) the history of a session or all
+        cursor.execute(
+            f"""\
+CREATE INDEX IF NOT EXISTS idx_sessionid_tsb_history
+ON {XH_SQLITE_TABLE_NAME}(sessionid, tsb);"""
+        )
+        cursor.execute(
+            f"""\
+CREATE INDEX IF NOT EXISTS idx_tsb_history
+ON {XH_SQLITE_TABLE_NAME}(tsb);"""
+        )
+
+        _xh_sqlite_create_fts_table(cursor)
 
         # mark that this function ran for this session
         setattr(XH_SQLITE_CACHE, XH_SQLITE_CREATED_SQL_TBL, True)
 
 
+def _xh_sqlite_has_fts_table(cursor):
+    sql = "SELECT count(*) FROM sqlite_master WHERE type='table' AND name=?"
+    cursor.execute(sql, (XH_SQLITE_FTS_TABLE_NAME,))
+    return cursor.fetchone()[0] > 0
+
+
+def _xh_sqlite_create_fts_table(cursor):
+    """Create the full-text index of the inputs and outputs, kept up to date
+    by triggers. Nothing happens if sqlite is built without FTS5.
+    """
+    if _xh_sqlite_has_fts_table(cursor):
+        return
+    try:
+        cursor.execute(
+            f"""\
+CREATE VIRTUAL TABLE {XH_SQLITE_FTS_TABLE_NAME}
+USING fts5(inp, out, content='{XH_SQLITE_TABLE_NAME}', content_rowid='rowid');"""
+        )
+    except sqlite3.OperationalError:
+        return
+    cursor.execute(
+        f"""\
+CREATE TRIGGER IF NOT EXISTS {XH_SQLITE_FTS_TABLE_NAME}_insert
+AFTER INSERT ON {XH_SQLITE_TABLE_NAME} BEGIN
+    INSERT INTO {XH_SQLITE_FTS_TABLE_NAME}(rowid, inp, out)
+    VALUES (new.rowid, new.inp, {XH_SQLITE_FTS_OUT.format("new")});
+END;"""
+    )
+    cursor.execute(
+        f"""\
+CREATE TRIGGER IF NOT EXISTS {XH_SQLITE_FTS_TABLE_NAME}_delete
+AFTER DELETE ON {XH_SQLITE_TABLE_NAME} BEGIN
+    INSERT INTO {XH_SQLITE_FTS_TABLE_NAME}({XH_SQLITE_FTS_TABLE_NAME}, rowid, inp, out)
+    VALUES ('delete', old.rowid, old.inp, {XH_SQLITE_FTS_OUT.format("old")});
+END;"""
+    )
+    # index the history written before
+    cursor.execute(
+        f"""\
+INSERT INTO {XH_SQLITE_FTS_TABLE_NAME}(rowid, inp, out)
+SELECT rowid, inp, {XH_SQLITE_FTS_OUT.format(XH_SQLITE_TABLE_NAME)} FROM {XH_SQLITE_TABLE_NAME};"""
+    )
+
+
 def _xh_sqlite_get_frequency(cursor, input):
     # type: (sqlite3.Cursor, str) -> int
     sql = f"SELECT sum(frequency) FROM {XH_SQLITE_TABLE_NAME} WHERE inp=?"
@@ -101,38 +186,52 @@ def _xh_sqlite_erase_dups(cursor, input):
     return freq
 
 
-def _sql_insert(cursor, values):
-    # type: (sqlite3.Cursor, dict) -> None
-    """handy function to run insert query"""
-    sql = "INSERT INTO {} ({}) VALUES ({});"
-    fields = ", ".join(values)
-    marks = ", ".join(["?"] * len(values))
-    cursor.execute(
-        sql.format(XH_SQLITE_TABLE_NAME, fields, marks), tuple(values.values())
-    )
-
-
-def _xh_sqlite_insert_command(cursor, cmd, sessionid, store_stdout, remove_duplicates):
+XH_SQLITE_INSERT_COLUMNS = (
+    "inp",
+    "rtn",
+    "tsb",
+    "tse",
+    "sessionid",
+    "out",
+    "info",
+    "frequency",
+    "cwd",
+)
+# a single statement text, so that sqlite3 keeps it prepared
+XH_SQLITE_INSERT_SQL = "INSERT INTO {} ({}) VALUES ({});".format(
+    XH_SQLITE_TABLE_NAME,
+    ", ".join(XH_SQLITE_INSERT_COLUMNS),
+    ", ".join(["?"] * len(XH_SQLITE_INSERT_COLUMNS)),
+)
+
+
+def _xh_sqlite_command_row(cmd, sessionid, store_stdout):
     tss = cmd.get("ts", [None, None])
-    values = collections.OrderedDict(
-        [
-            ("inp", cmd["inp"].rstrip()),
-            ("rtn", cmd["rtn"]),
-            ("tsb", tss[0]),
-            ("tse", tss[1]),
-            ("sessionid", sessionid),
-        ]
-    )
-    if "cwd" in cmd:
-        values["cwd"] = cmd["cwd"]
-    if store_stdout and "out" in cmd:
-        values["out"] = cmd["out"]
-    if "info" in cmd:
-        info = json.dumps(cmd["info"])
-        values["info"] = info
-    if remove_duplicates:
-        values["frequency"] = _xh_sqlite_erase_dups(cursor, values["inp"]) + 1
-    _sql_insert(cursor, values)
+    return [
+        cmd["inp"].rstrip(),
+        cmd["rtn"],
+        tss[0],
+        tss[1],
+        sessionid,
+        compress_output(cmd["out"]) if store_stdout and cmd.get("out") else None,
+        json.dumps(cmd["info"]) if "info" in cmd else None,
+        1,
+        cmd.get("cwd"),
+    ]
+
+
+def _xh_sqlite_insert_commands(cursor, cmds, sessionid):
+    """Inserts ``(cmd, store_stdout, remove_duplicates)`` items."""
+    rows = []
+    for cmd, store_stdout, remove_duplicates in cmds:
+        row = _xh_sqlite_command_row(cmd, sessionid, store_stdout)
+        if remove_duplicates:
+            # earlier rows of the batch may hold the same input
+            cursor.executemany(XH_SQLITE_INSERT_SQL, rows)
+            rows = []
+            row[7] = _xh_sqlite_erase_dups(cursor, row[0]) + 1
+        rows.append(row)
+    cursor.executemany(XH_SQLITE_INSERT_SQL, rows)
 
 
 def _xh_sqlite_get_count(cursor, sessionid=None):
@@ -175,48 +274,69 @@ def _xh_sqlite_delete_records(cursor, size_to_keep):
 
 
 def xh_sqlite_append_history(
-    cmd, sessionid, store_stdout, filename=None, remove_duplicates=False
+    cmd, sessionid, store_stdout, filename=None, remove_duplicates=False, conn=None
 ):
-    with _xh_sqlite_get_conn(filename=filename) as conn:
-        c = conn.cursor()
+    xh_sqlite_append_commands(
+        [(cmd, store_stdout, remove_duplicates)], sessionid, filename, conn=conn
+    )
+
+
+def xh_sqlite_append_commands(cmds, sessionid, filename=None, conn=None):
+    """Appends ``(cmd, store_stdout, remove_duplicates)`` items in a single
+    transaction.
+    """
+    with _xh_sqlite_cursor(filename=filename, conn=conn) as c:
         _xh_sqlite_create_history_table(c)
-        _xh_sqlite_insert_command(c, cmd, sessionid, store_stdout, remove_duplicates)
-        conn.commit()
+        _xh_sqlite_insert_commands(c, cmds, sessionid)
 
 
-def xh_sqlite_get_count(sessionid=None, filename=None):
-    with _xh_sqlite_get_conn(filename=filename) as conn:
-        c = conn.cursor()
+def xh_sqlite_get_count(sessionid=None, filename=None, conn=None):
+    with _xh_sqlite_cursor(filename=filename, conn=conn) as c:
+        _xh_sqlite_create_history_table(c)
         return _xh_sqlite_get_count(c, sessionid=sessionid)
 
 
-def xh_sqlite_items(sessionid=None, filename=None, newest_first=False):
-    with _xh_sqlite_get_conn(filename=filename) as conn:
-        c = conn.cursor()
+def xh_sqlite_items(sessionid=None, filename=None, newest_first=False, conn=None):
+    with _xh_sqlite_cursor(filename=filename, conn=conn) as c:
         _xh_sqlite_create_history_table(c)
         return _xh_sqlite_get_records(c, sessionid=sessionid, newest_first=newest_first)
 
 
-def xh_sqlite_delete_items(size_to_keep, filename=None):
-    with _xh_sqlite_get_conn(filename=filename) as conn:
-        c = conn.cursor()
+def xh_sqlite_columns(filename=None, conn=None):
+    """Returns all the history as ``xonsh.history.stats.HistoryColumns``.
+    Rows merged by ``erasedups`` count once.
+    """
+    columns = xhstats.HistoryColumns()
+    sql = f"SELECT inp, rtn, tsb, tse, cwd FROM {XH_SQLITE_TABLE_NAME}"
+    with _xh_sqlite_cursor(filename=filename, conn=conn) as c:
+        _xh_sqlite_create_history_table(c)
+        for row in c.execute(sql):
+            columns.append(*row)
+    return columns
+
+
+def xh_sqlite_delete_items(size_to_keep, filename=None, conn=None):
+    with _xh_sqlite_cursor(filename=filename, conn=conn) as c:
         _xh_sqlite_create_history_table(c)
         return _xh_sqlite_delete_records(c, size_to_keep)
 
 
-def xh_sqlite_pull_all(filename, last_pull_times, current_sessionid):
+def xh_sqlite_pull_all(filename, last_pull_times, current_sessionid, conn=None):
     sql = f"SELECT inp, tsb, sessionid FROM {XH_SQLITE_TABLE_NAME} WHERE tsb > ? AND sessionid != ? ORDER BY tsb"
     oldest_pull_time = min(last_pull_times.values())
     last_full_pull_time = last_pull_times[None]
-    with _xh_sqlite_get_conn(filename=filename) as conn:
-        c = conn.cursor()
+    with _xh_sqlite_cursor(filename=filename, conn=conn) as c:
+        _xh_sqlite_create_history_table(c)
         c.execute(sql, (oldest_pull_time, current_sessionid))
-        for inp, tsb, sessionid in c:
-            if tsb > last_pull_times.get(sessionid, last_full_pull_time):
-                yield inp
+        rows = c.fetchall()
+    for inp, tsb, sessionid in rows:
+        if tsb > last_pull_times.get(sessionid, last_full_pull_time):
+            yield inp
 
 
-def xh_sqlite_pull_session(filename, last_pull_times, current_sessionid, src_sessionid):
+def xh_sqlite_pull_session(
+    filename, last_pull_times, current_sessionid, src_sessionid, conn=None
+):
     # ensure we don't duplicate history entries if some crazy person passes the current session
     if src_sessionid == current_sessionid:
         return []
@@ -224,34 +344,37 @@ def xh_sqlite_pull_session(filename, last_pull_times, current_sessionid, src_ses
     last_full_pull_time = last_pull_times[None]
     start_time = last_pull_times.get(src_sessionid, last_full_pull_time)
     sql = f"SELECT inp FROM {XH_SQLITE_TABLE_NAME} WHERE tsb > ? AND sessionid = ? ORDER BY tsb"
-    with _xh_sqlite_get_conn(filename=filename) as conn:
-        c = conn.cursor()
+    with _xh_sqlite_cursor(filename=filename, conn=conn) as c:
+        _xh_sqlite_create_history_table(c)
         c.execute(sql, (start_time, src_sessionid))
-        yield from (r[0] for r in c)
+        rows = c.fetchall()
+    yield from (r[0] for r in rows)
 
 
-def xh_sqlite_pull(filename, last_pull_times, current_sessionid, src_sessionid):
+def xh_sqlite_pull(
+    filename, last_pull_times, current_sessionid, src_sessionid, conn=None
+):
     if src_sessionid is None:
-        yield from xh_sqlite_pull_all(filename, last_pull_times, current_sessionid)
+        yield from xh_sqlite_pull_all(
+            filename, last_pull_times, current_sessionid, conn=conn
+        )
     else:
         yield from xh_sqlite_pull_session(
-            filename, last_pull_times, current_sessionid, src_sessionid
+            filename, last_pull_times, current_sessionid, src_sessionid, conn=conn
         )
 
 
-def xh_sqlite_wipe_session(sessionid=None, filename=None):
+def xh_sqlite_wipe_session(sessionid=None, filename=None, conn=None):
     """Wipe the current session's entries from the database."""
     sql = f"DELETE FROM {XH_SQLITE_TABLE_NAME} WHERE sessionid = ?"
-    with _xh_sqlite_get_conn(filename=filename) as conn:
-        c = conn.cursor()
+    with _xh_sqlite_cursor(filename=filename, conn=conn) as c:
         _xh_sqlite_create_history_table(c)
         c.execute(sql, (str(sessionid),))
 
 
-def xh_sqlite_delete_input_matching(pattern, filename=None):
+def xh_sqlite_delete_input_matching(pattern, filename=None, conn=None):
     """Deletes entries from the database where the input matches a pattern."""
-    with _xh_sqlite_get_conn(filename=filename) as conn:
-        c = conn.cursor()
+    with _xh_sqlite_cursor(filename=filename, conn=conn) as c:
         _xh_sqlite_create_history_table(c)
         deleted = 0
         for inp, *_ in _xh_sqlite_get_records(c):
@@ -262,6 +385,86 @@ def xh_sqlite_delete_input_matching(pattern, filename=None):
         return deleted
 
 
+def _xh_sqlite_fts_query(terms, outputs=False):
+    """Translates search terms into a FTS5 query."""
+    phrases = []
+    for term in terms:
+        phrase = '"{}"'.format(" ".join(term.words))
+        phrases.append(phrase + "*" if term.prefix else phrase)
+    columns = "{inp out}" if outputs else "inp"
+    return "{} : ({})".format(columns, " AND ".join(phrases))
+
+
+def xh_sqlite_search(
+    query,
+    outputs=False,
+    cwd=None,
+    rtn=None,
+    start_time=None,
+    end_time=None,
+    filename=None,
+    conn=None,
+):
+    """Returns the history items matching a search query, see
+    ``xonsh.history.search``. Without FTS5, every item is looked at, and so
+    are the compressed outputs, which are not in the full-text index.
+    """
+    terms = xhs.parse_query(query)
+    columns = "h.rowid, h.inp, h.tsb, h.rtn, h.frequency, h.cwd, h.sessionid"
+    if outputs:
+        columns += ", h.out"
+    sql = f"SELECT {columns} FROM {XH_SQLITE_TABLE_NAME} AS h "
+    filters = []
+    params = []
+    for cond, value in (
+        ("h.cwd = ?", cwd),
+        ("h.rtn = ?", rtn),
+        ("h.tsb >= ?", start_time),
+        ("h.tsb < ?", end_time),
+    ):
+        if value is not None:
+            filters.append(cond)
+            params.append(value)
+    with _xh_sqlite_cursor(filename=filename, conn=conn) as c:
+        _xh_sqlite_create_history_table(c)
+        use_fts = terms and _xh_sqlite_has_fts_table(c)
+        if use_fts:
+            fts = XH_SQLITE_FTS_TABLE_NAME
+            where = " AND ".join([f"{fts} MATCH ?"] + filters)
+            query = _xh_sqlite_fts_query(terms, outputs)
+            c.execute(
+                f"{sql}JOIN {fts} ON {fts}.rowid = h.rowid WHERE {where}",
+                (query, *params),
+            )
+            rows = c.fetchall()
+        else:
+            rows = []
+        if not use_fts or outputs:
+            if use_fts:
+                filters.append("typeof(h.out) = 'blob'")
+            if filters:
+                sql += "WHERE " + " AND ".join(filters)
+            c.execute(sql, tuple(params))
+            scanned = c.fetchall()
+        else:
+            scanned = []
+    keys = ("inp", "ts", "rtn", "frequency", "cwd", "sessionid", "out")
+    items = {}
+    for indexed, batch in ((True, rows), (False, scanned)):
+        for row in batch:
+            if row[0] in items:
+                continue
+            item = dict(zip(keys, row[1:], strict=False))
+            if outputs:
+                item["out"] = decompress_output(item["out"])
+            if not indexed:
+                text = item["inp"] + "\n" + (item.get("out") or "")
+                if not xhs.matches(terms, text):
+                    continue
+            items[row[0]] = item
+    return list(items.values())
+
+
 class SqliteHistoryGC(threading.Thread):
     """Shell history garbage collection."""
 
@@ -296,14 +499,53 @@ class SqliteHistoryGC(threading.Thread):
         xh_sqlite_delete_items(hsize, filename=self.filename)
 
 
+class SqliteHistoryWriter(threading.Thread):
+    """Writes the commands queued by a sqlite history in batches."""
+
+    def __init__(self, hist, delay, *args, **kwargs):
+        """Thread writing the commands at most ``delay`` seconds after they
+        were queued, or as soon as ``hist.buffersize`` commands are queued.
+        """
+        super().__init__(*args, **kwargs)
+        self.daemon = True
+        self.hist = hist
+        self.delay = delay
+        self.start()
+
+    def run(self):
+        hist = self.hist
+        while True:
+            with hist._cond:
+                hist._cond.wait_for(lambda: hist.buffer)
+                hist._cond.wait_for(
+                    lambda: len(hist.buffer) >= hist.buffersize, timeout=self.delay
+                )
+            hist.flush()
+
+
 class SqliteHistory(History):
-    """Xonsh history backend implemented with sqlite3."""
+    """Xonsh history backend implemented with sqlite3.
+
+    The session keeps a single connection to the database and appended
+    commands are written in batches by a ``SqliteHistoryWriter``, at most
+    ``$XONSH_HISTORY_SQLITE_WRITE_DELAY`` seconds later.
+    """
 
-    def __init__(self, gc=True, filename=None, save_cwd=None, **kwargs):
+    def __init__(
+        self, gc=True, filename=None, save_cwd=None, buffersize=100, **kwargs
+    ):
         super().__init__(**kwargs)
         if filename is None:
             filename = _xh_sqlite_get_file_name()
         self.filename = filename
+        self.buffer = []
+        self.buffersize = buffersize
+        # guards the buffer
+        self._cond = threading.Condition()
+        # guards the connection, which is shared with the writer thread
+        self._lock = threading.RLock()
+        self._conn = None
+        self._writer = None
         self.last_pull_times = {None: time.time()}
         self.gc = SqliteHistoryGC() if gc else None
         self._last_hist_inp = None
@@ -319,9 +561,7 @@ class SqliteHistory(History):
         )
 
         if not os.path.exists(self.filename):
-            with _xh_sqlite_get_conn(filename=self.filename) as conn:
-                if conn:
-                    pass
+            self._connection()
             try:
                 os.chmod(self.filename, 0o600)
             except Exception:  # pylint: disable=broad-except
@@ -330,6 +570,37 @@ class SqliteHistory(History):
         # during init rerun create command
         setattr(XH_SQLITE_CACHE, XH_SQLITE_CREATED_SQL_TBL, False)
 
+    def _connection(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = _xh_sqlite_get_conn(
+                    filename=self.filename, check_same_thread=False
+                )
+            return self._conn
+
+    @contextlib.contextmanager
+    def _db(self):
+        """Yields the session's connection, once the queued commands are
+        written.
+        """
+        self.flush()
+        with self._lock:
+            yield self._connection()
+
+    def flush(self, at_exit=False, **_):
+        """Writes the queued commands to the database."""
+        with self._lock:
+            with self._cond:
+                cmds, self.buffer = self.buffer, []
+            if not cmds:
+                return
+            try:
+                xh_sqlite_append_commands(
+                    cmds, str(self.sessionid), conn=self._connection()
+                )
+            except sqlite3.OperationalError as err:
+                print(f"SQLite History Backend Error: {err}")
+
     def append(self, cmd):
         if (not self.remember_history) or self.is_ignored(cmd):
             return
@@ -359,37 +630,53 @@ class SqliteHistory(History):
         except KeyError:
             pass
         self._last_hist_inp = inp
-        try:
-            xh_sqlite_append_history(
-                cmd,
-                str(self.sessionid),
-                store_stdout=envs.get("XONSH_STORE_STDOUT", False),
-                filename=self.filename,
-                remove_duplicates=("erasedups" in opts),
-            )
-        except sqlite3.OperationalError as err:
-            print(f"SQLite History Backend Error: {err}")
+        item = (
+            cmd,
+            envs.get("XONSH_STORE_STDOUT", False),
+            "erasedups" in opts,
+        )
+        delay = envs.get("XONSH_HISTORY_SQLITE_WRITE_DELAY", 1.0)
+        with self._cond:
+            self.buffer.append(item)
+            self._cond.notify()
+        if delay <= 0:
+            self.flush()
+        elif self._writer is None:
+            self._writer = SqliteHistoryWriter(self, delay)
 
     def all_items(self, newest_first=False, session_id=None):
         """Display all history items."""
-        for inp, ts, rtn, freq, cwd in xh_sqlite_items(
-            filename=self.filename, newest_first=newest_first, sessionid=session_id
-        ):
+        with self._db() as conn:
+            items = xh_sqlite_items(
+                newest_first=newest_first, sessionid=session_id, conn=conn
+            )
+        for inp, ts, rtn, freq, cwd in items:
             yield {"inp": inp, "ts": ts, "rtn": rtn, "frequency": freq, "cwd": cwd}
 
     def items(self, newest_first=False):
         """Display history items of current session."""
         yield from self.all_items(newest_first, session_id=str(self.sessionid))
 
+    def search(self, query, outputs=False, limit=None, **filters):
+        """Search the history of all sessions through the FTS5 index."""
+        with self._db() as conn:
+            items = xh_sqlite_search(query, outputs=outputs, conn=conn, **filters)
+        return xhs.rank(items, limit=limit)
+
+    def columns(self):
+        with self._db() as conn:
+            return xh_sqlite_columns(conn=conn)
+
     def info(self):
         data = collections.OrderedDict()
         data["backend"] = "sqlite"
         data["sessionid"] = str(self.sessionid)
         data["filename"] = self.filename
-        data["session items"] = xh_sqlite_get_count(
-            sessionid=self.sessionid, filename=self.filename
-        )
-        data["all items"] = xh_sqlite_get_count(filename=self.filename)
+        with self._db() as conn:
+            data["session items"] = xh_sqlite_get_count(
+                sessionid=self.sessionid, conn=conn
+            )
+            data["all items"] = xh_sqlite_get_count(conn=conn)
         envs = XSH.env
         data["gc options"] = envs.get("XONSH_HISTORY_SIZE")
         return data
@@ -401,9 +688,17 @@ class SqliteHistory(History):
 
         cnt = 0
         prev = None
-        for cmd in xh_sqlite_pull(
-            self.filename, self.last_pull_times, str(self.sessionid), src_sessionid
-        ):
+        with self._db() as conn:
+            cmds = list(
+                xh_sqlite_pull(
+                    self.filename,
+                    self.last_pull_times,
+                    str(self.sessionid),
+                    src_sessionid,
+                    conn=conn,
+                )
+            )
+        for cmd in cmds:
             if show_commands:
                 print(cmd)
             if cmd != prev:
@@ -433,10 +728,12 @@ class SqliteHistory(History):
         self.tss = []
         self.cwds = []
 
-        xh_sqlite_wipe_session(sessionid=self.sessionid, filename=self.filename)
+        with self._db() as conn:
+            xh_sqlite_wipe_session(sessionid=self.sessionid, conn=conn)
 
     def delete(self, pattern):
         """Deletes all entries in the database where the input matches a pattern."""
-        return xh_sqlite_delete_input_matching(
-            pattern=re.compile(pattern), filename=self.filename
-        )
+        with self._db() as conn:
+            return xh_sqlite_delete_input_matching(
+                pattern=re.compile(pattern), conn=conn
+            )
@@ -0,0 +1,178 @@
+"""Statistics over the xonsh history of all sessions.
+
+The history is loaded into ``HistoryColumns``, a few compact ``array``
+columns with one row per command, and aggregated mostly with C-level
+iteration (``collections.Counter``, ``itertools.compress``, ``map``)
+instead of Python loops over the commands.
+"""
+
+import collections
+import itertools
+import math
+import operator
+import time
+from array import array
+
+OK, FAILED, NO_RTN = range(3)
+"""Statuses of the commands which succeeded, failed, or whose return code
+is unknown."""
+
+
+def command_name(inp):
+    """The command run by an input, i.e. its first word."""
+    words = inp.split(None, 1)
+    return words[0] if words else ""
+
+
+class HistoryColumns:
+    """History commands stored as columns.
+
+    The return codes and durations are grouped by command name while
+    loading, so that aggregating them does not need another pass over
+    all the commands.
+
+    Attributes
+    ----------
+    names : list of str
+        Distinct command names, indexed by ``cmd``.
+    dirs : list of str
+        Distinct working directories, indexed by ``cwd``.
+    cmd, cwd : array of unsigned ints
+        Command name and working directory of each command.
+    start : array of floats
+        Start time of each command, 0 if unknown.
+    status : list of bytearray
+        Status of the runs of each command name: ``OK``, ``FAILED`` or
+        ``NO_RTN`` if the return code is unknown.
+    durations : list of array of floats
+        Known durations of the runs of each command name.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.dirs = []
+        self._name_ids = {}
+        self._dir_ids = {}
+        self.cmd = array("I")
+        self.cwd = array("I")
+        self.start = array("d")
+        self.status = []
+        self.durations = []
+
+    def __len__(self):
+        return len(self.cmd)
+
+    def _id(self, ids, values, value):
+        i = ids.get(value)
+        if i is None:
+            i = ids[value] = len(values)
+            values.append(value)
+        return i
+
+    def append(self, inp, rtn=None, start=None, end=None, cwd=None):
+        """Adds a command."""
+        name = command_name(inp)
+        cid = self._name_ids.get(name)
+        if cid is None:
+            cid = self._id(self._name_ids, self.names, name)
+            self.status.append(bytearray())
+            self.durations.append(array("d"))
+        self.cmd.append(cid)
+        self.cwd.append(self._id(self._dir_ids, self.dirs, cwd or ""))
+        self.start.append(start or 0.0)
+        self.status[cid].append(NO_RTN if rtn is None else OK if rtn == 0 else FAILED)
+        if start is not None and end is not None:
+            self.durations[cid].append(end - start)
+
+    def append_item(self, item):
+        """Adds a history item, whose ``ts`` may be a float or a
+        ``(start, end)`` pair.
+        """
+        ts = item.get("ts")
+        if isinstance(ts, list | tuple):
+            start, end = (tuple(ts) + (None, None))[:2]
+        else:
+            start, end = ts, None
+        self.append(item["inp"], item.get("rtn"), start, end, item.get("cwd"))
+
+    @classmethod
+    def from_items(cls, items):
+        """Builds the columns of history items."""
+        columns = cls()
+        for item in items:
+            columns.append_item(item)
+        return columns
+
+
+def percentile(values, q):
+    """The ``q`` percentile of sorted values, by linear interpolation."""
+    if not values:
+        return math.nan
+    pos = (len(values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def command_stats(columns, top=10):
+    """Statistics of the most used commands.
+
+    Returns
+    -------
+    list of dict
+        ``command``, ``count``, ``failures`` (among the runs with a known
+        return code), ``failure_rate``, ``mean`` and ``p95`` durations.
+    """
+    counts = collections.Counter(dict(enumerate(map(len, columns.status))))
+    stats = []
+    for cid, count in counts.most_common(top):
+        status = columns.status[cid]
+        ran = count - status.count(NO_RTN)
+        failures = status.count(FAILED)
+        times = sorted(columns.durations[cid])
+        stats.append(
+            {
+                "command": columns.names[cid],
+                "count": count,
+                "failures": failures,
+                "failure_rate": failures / ran if ran else math.nan,
+                "mean": sum(times) / len(times) if times else math.nan,
+                "p95": percentile(times, 0.95),
+            }
+        )
+    return stats
+
+
+def directory_stats(columns, top=10):
+    """The busiest working directories, as ``(directory, count)`` pairs."""
+    counts = collections.Counter(columns.cwd)
+    return [
+        (columns.dirs[did], count)
+        for did, count in counts.most_common(top)
+        if columns.dirs[did]
+    ]
+
+
+def hour_stats(columns, utcoffset=None):
+    """Number of commands started at each hour of the day (local time, at
+    the current UTC offset).
+    """
+    if utcoffset is None:
+        utcoffset = time.localtime().tm_gmtoff
+    starts = itertools.compress(columns.start, columns.start)
+    local = map(operator.add, starts, itertools.repeat(utcoffset))
+    hours = map(operator.floordiv, local, itertools.repeat(3600))
+    hours = collections.Counter(map(operator.mod, hours, itertools.repeat(24)))
+    return [hours[hour] for hour in range(24)]
+
+
+def history_stats(columns, top=10):
+    """All the statistics of ``history stats``."""
+    return {
+        "commands": len(columns),
+        "distinct commands": len(columns.names),
+        "directories": len([d for d in columns.dirs if d]),
+        "most used commands": command_stats(columns, top=top),
+        "busiest directories": directory_stats(columns, top=top),
+        "commands by hour": hour_stats(columns),
+    }
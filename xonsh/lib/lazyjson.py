@@ -11,7 +11,7 @@ except ImportError:
     import json  # type: ignore
 
 
-def _to_json_with_size(obj, offset=0, sort_keys=False):
+def _to_json_with_size(obj, offset=0, sort_keys=False, last_key=None):
     if isinstance(obj, str):
         s = json.dumps(obj)
         o = offset
@@ -21,7 +21,10 @@ def _to_json_with_size(obj, offset=0, sort_keys=False):
         j = offset + 1
         o = {}
         size = {}
-        items = sorted(obj.items()) if sort_keys else obj.items()
+        items = sorted(obj.items()) if sort_keys else list(obj.items())
+        if last_key in obj:
+            # so that the value is at the end of the data, see ``ljappend()``
+            items.sort(key=lambda item: item[0] == last_key)
         for key, val in items:
             s_k, o_k, n_k, size_k = _to_json_with_size(
                 key, offset=j, sort_keys=sort_keys
@@ -65,11 +68,13 @@ def _to_json_with_size(obj, offset=0, sort_keys=False):
     return s, o, n, size
 
 
-def index(obj, sort_keys=False):
+def index(obj, sort_keys=False, append_key=None):
     """Creates an index for a JSON file."""
     idx = {}
-    json_obj = _to_json_with_size(obj, sort_keys=sort_keys)
+    json_obj = _to_json_with_size(obj, sort_keys=sort_keys, last_key=append_key)
     s, idx["offsets"], _, idx["sizes"] = json_obj
+    if append_key is not None:
+        idx["append"] = append_key
     return s, idx
 
 
@@ -80,10 +85,32 @@ JSON_FORMAT = """{{"locs": [{iloc:>10}, {ilen:>10}, {dloc:>10}, {dlen:>10}],
 """
 
 
-def dumps(obj, sort_keys=False):
-    """Dumps an object to JSON with an index."""
-    data, idx = index(obj, sort_keys=sort_keys)
+LOCS_FORMAT = "[{:>10}, {:>10}, {:>10}, {:>10}]"
+
+# the index comes after the data, so that the data can grow
+APPENDABLE_HEADER = '{{"locs": {locs},\n "data": '
+APPENDABLE_TRAILER = ',\n "index": {index}\n}}\n'
+APPENDABLE_DLOC = 68
+APPENDABLE_ILOC_SHIFT = 12
+
+
+def dumps(obj, sort_keys=False, append_key=None):
+    """Dumps an object to JSON with an index.
+
+    With ``append_key``, ``obj`` must be a mapping whose ``append_key`` value
+    is a list, and ``ljappend()`` can then add items to that list.
+    """
+    data, idx = index(obj, sort_keys=sort_keys, append_key=append_key)
     jdx = json.dumps(idx, sort_keys=sort_keys)
+    if append_key is not None:
+        dlen = len(data)
+        iloc = APPENDABLE_DLOC + dlen + APPENDABLE_ILOC_SHIFT
+        locs = LOCS_FORMAT.format(iloc, len(jdx), APPENDABLE_DLOC, dlen)
+        return (
+            APPENDABLE_HEADER.format(locs=locs)
+            + data
+            + APPENDABLE_TRAILER.format(index=jdx)
+        )
     iloc = 69
     ilen = len(jdx)
     dloc = iloc + ilen + 11
@@ -94,12 +121,59 @@ def dumps(obj, sort_keys=False):
     return s
 
 
-def ljdump(obj, fp, sort_keys=False):
+def ljdump(obj, fp, sort_keys=False, append_key=None):
     """Dumps an object to JSON file."""
-    s = dumps(obj, sort_keys=sort_keys)
+    s = dumps(obj, sort_keys=sort_keys, append_key=append_key)
     fp.write(s)
 
 
+def ljappend(filename, key, items, sort_keys=False):
+    """Appends items to the ``key`` list of a file written by ``ljdump()`` with
+    ``append_key=key``, writing only the new items and the updated index.
+
+    Returns
+    -------
+    int or None
+        The length of the list before the items were added, or None if the
+        file was not written to be appended to; it is left untouched then.
+    """
+    with open(filename, "r+b") as f:
+        f.seek(9)
+        iloc, ilen, dloc, dlen = json.loads(f.read(48).decode())
+        f.seek(iloc)
+        idx = json.loads(f.read(ilen).decode())
+        if idx.get("append") != key or dloc != APPENDABLE_DLOC:
+            return None
+        offsets, sizes = idx["offsets"][key], idx["sizes"][key]
+        start = len(offsets) - 1
+        # the list ends the data with "]\n}\n"
+        loc = offsets[-1]
+        end = pos = loc + sizes[-1] - 2
+        parts = []
+        for item in items:
+            if len(offsets) > 1:
+                parts.append(", ")
+                end += 2
+            s, o, n, size = _to_json_with_size(item, offset=end, sort_keys=sort_keys)
+            offsets.insert(-1, o)
+            sizes.insert(-1, size)
+            parts.append(s)
+            end += n
+        parts.append("]\n}\n")
+        sizes[-1] = end + 2 - loc
+        dlen = idx["sizes"]["__total__"] = end + 4
+        jdx = json.dumps(idx, sort_keys=sort_keys)
+        parts.append(APPENDABLE_TRAILER.format(index=jdx))
+        f.seek(dloc + pos)
+        f.write("".join(parts).encode())
+        f.truncate()
+        iloc = dloc + dlen + APPENDABLE_ILOC_SHIFT
+        locs = LOCS_FORMAT.format(iloc, len(jdx), dloc, dlen)
+        f.seek(9)
+        f.write(locs.encode())
+    return start
+
+
 class LJNode(cabc.Mapping, cabc.Sequence):
     """A proxy node for JSON nodes. Acts as both sequence and mapping."""
 
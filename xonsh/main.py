@@ -23,7 +23,7 @@ from xonsh.lib.pretty import pretty
 from xonsh.platform import HAS_PYGMENTS, ON_WINDOWS
 from xonsh.procs.jobs import ignore_sigtstp
 from xonsh.shell import Shell
-from xonsh.timings import setup_timings
+from xonsh.timings import setup_startup_profiler, setup_timings
 from xonsh.tools import (
     display_error_message,
     print_color,
@@ -243,6 +243,23 @@ def parser():
         action="store_true",
         default=None,
     )
+    p.add_argument(
+        "--profile-startup",
+        help="Writes a JSON report with the wall and CPU time of every startup "
+        "phase and the modules each phase imported to stderr, once the first "
+        "prompt is shown or on exit. "
+        "Use 'xonfig startup-diff' to compare two reports.",
+        dest="profile_startup",
+        action="store_true",
+        default=None,
+    )
+    p.add_argument(
+        "--profile-startup-file",
+        help="Same as --profile-startup but writes the report to FILE.",
+        dest="profile_startup_file",
+        metavar="FILE",
+        default=None,
+    )
     p.add_argument(
         "file",
         metavar="script-file",
@@ -333,7 +350,6 @@ def _load_rc_files(shell_kwargs: dict, args, env, execer, ctx):
 
 
 def _autoload_xontribs(env):
-    events.on_timingprobe.fire(name="pre_xontribs_autoload")
     disabled = env.get("XONTRIBS_AUTOLOAD_DISABLED", False)
     if disabled is True:
         return
@@ -342,7 +358,6 @@ def _autoload_xontribs(env):
         blocked_xontribs, verbose=bool(env.get("XONSH_DEBUG", False))
     )
     events.on_xontribs_loaded.fire()
-    events.on_timingprobe.fire(name="post_xontribs_autoload")
 
 
 def start_services(shell_kwargs, args, pre_env=None):
@@ -351,6 +366,7 @@ def start_services(shell_kwargs, args, pre_env=None):
     """
     if pre_env is None:
         pre_env = {}
+    events.on_timingprobe.fire(name="pre_start_services")
     # create execer, which loads builtins
     ctx = shell_kwargs.get("ctx", {})
     debug = to_bool_or_int(os.getenv("XONSH_DEBUG", "0"))
@@ -374,10 +390,15 @@ def start_services(shell_kwargs, args, pre_env=None):
 
     _load_rc_files(shell_kwargs, args, env, execer, ctx)
     if not shell_kwargs.get("norc"):
+        events.on_timingprobe.fire(name="pre_xontribs_autoload")
         _autoload_xontribs(env)
+        events.on_timingprobe.fire(name="post_xontribs_autoload")
     # create shell
+    events.on_timingprobe.fire(name="pre_shell_init")
     XSH.shell = Shell(execer=execer, **shell_kwargs)
+    events.on_timingprobe.fire(name="post_shell_init")
     ctx["__name__"] = "__main__"
+    events.on_timingprobe.fire(name="post_start_services")
     return env
 
 
@@ -386,6 +407,8 @@ def premain(argv=None):
     if argv is None:
         argv = sys.argv[1:]
     setup_timings(argv)
+    profiler = setup_startup_profiler(argv)
+    events.on_timingprobe.fire(name="pre_premain")
     setproctitle = get_setproctitle()
     if setproctitle is not None:
         setproctitle(" ".join(["xonsh"] + argv))
@@ -393,6 +416,8 @@ def premain(argv=None):
     if args.help:
         parser.print_help()
         parser.exit()
+    if profiler is not None:
+        profiler.output = args.profile_startup_file or "-"
     shell_kwargs = {
         "shell_type": args.shell_type,
         "completer": False,
@@ -450,6 +475,7 @@ def premain(argv=None):
                 sys.exit(1)
 
     start_services(shell_kwargs, args, pre_env=pre_env)
+    events.on_timingprobe.fire(name="post_premain")
     return args
 
 
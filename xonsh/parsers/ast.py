@@ -378,6 +378,7 @@ class CtxAwareTransformer(NodeTransformer):
         self.parser = parser
         self.input = None
         self.contexts = []
+        self.ctx_names = set()
         self.lines = None
         self.mode = None
         self._nwith = 0
@@ -403,12 +404,14 @@ class CtxAwareTransformer(NodeTransformer):
         Returns
         -------
         node : ast.AST
-            The transformed node.
+            The transformed node. The names of the root context that the
+            transformation depended on are left in ``ctx_names``.
         """
         self.filename = self.filename if filename is None else filename
         self.debug_level = debug_level
         self.lines = inp.splitlines()
         self.contexts = [ctx, set()]
+        self.ctx_names = set()
         self.mode = mode
         self._nwith = 0
         node = self.visit(node)
@@ -427,6 +430,8 @@ class CtxAwareTransformer(NodeTransformer):
     def ctxremove(self, value):
         """Removes a value the most recent context."""
         for ctx in reversed(self.contexts):
+            if ctx is self.contexts[0]:
+                self.ctx_names.add(value)
             if value in ctx:
                 ctx.remove(value)
                 break
@@ -499,6 +504,8 @@ class CtxAwareTransformer(NodeTransformer):
             return True
         inscope = False
         for ctx in reversed(self.contexts):
+            if ctx is self.contexts[0]:
+                self.ctx_names.update(names)
             names -= ctx
             if not names:
                 inscope = True
@@ -218,6 +218,26 @@ def raise_parse_error(
     raise err
 
 
+def yacc_table_files(yacc_table, outputdir, variant=None):
+    """Returns the marshaled parser table files to load the parser from, in
+    order of preference. The first one is the table shipped along with xonsh,
+    the second one lives in the user's cache directory, and is used when the
+    shipped table is missing or stale and cannot be rewritten (e.g. because
+    xonsh is installed in a read-only location).
+    """
+    name = yacc_table.rpartition(".")[2]
+    if variant:
+        name += "_" + variant
+    name += ".marshal"
+    cachedir = os.getenv("XONSH_CACHE_DIR") or os.path.join(
+        os.getenv("XDG_CACHE_HOME") or os.path.join("~", ".cache"), "xonsh"
+    )
+    return [
+        os.path.join(outputdir, name),
+        os.path.join(os.path.expanduser(cachedir), "parser_tables", name),
+    ]
+
+
 class YaccLoader(Thread):
     """Thread to load (but not shave) the yacc parser."""
 
@@ -247,7 +267,8 @@ class BaseParser:
         yacc_optimize : bool, optional
             Set to false when unstable and true when parser is stable.
         yacc_table : str, optional
-            Parser module used when optimized.
+            Name of the parser tables. These are loaded from a marshal file
+            per grammar variant, e.g. ``parser_table_v313.marshal``.
         yacc_debug : debug, optional
             Dumps extra debug info.
         outputdir : str or None, optional
@@ -460,6 +481,9 @@ class BaseParser:
         if outputdir is None:
             outputdir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
         yacc_kwargs["outputdir"] = outputdir
+        yacc_kwargs["marshalfile"] = yacc_table_files(
+            yacc_table, outputdir, variant=type(self).__module__.rpartition(".")[2]
+        )
         if yacc_debug:
             # create parser on main thread
             self.parser = yacc.yacc(**yacc_kwargs)
@@ -17,7 +17,7 @@ from typing import (
 )
 
 from xonsh.lib.lazyasd import lazyobject
-from xonsh.parsers.base import Location, raise_parse_error
+from xonsh.parsers.base import Location, raise_parse_error, yacc_table_files
 from xonsh.parsers.lexer import Lexer
 from xonsh.parsers.ply import yacc
 from xonsh.tools import check_for_partial_string, get_line_continuation
@@ -370,6 +370,7 @@ class CompletionContextParser:
         if outputdir is None:
             outputdir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
         yacc_kwargs["outputdir"] = outputdir
+        yacc_kwargs["marshalfile"] = yacc_table_files(yacc_table, outputdir)
 
         # create parser on main thread, it's small and should be fast
         self.parser = yacc.yacc(**yacc_kwargs)
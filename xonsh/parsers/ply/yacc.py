@@ -63,13 +63,16 @@
 
 import re
 import types
+from array import array
 import sys
 import os.path
 import inspect
+import marshal
 import warnings
 
 __version__    = '3.11'
 __tabversion__ = '3.10'
+__tabformat__  = 'compact-1'    # Layout of the marshaled tables
 
 #-----------------------------------------------------------------------------
 #                     === User configurable parameters ===
@@ -280,6 +283,148 @@ class YaccProduction:
     def error(self):
         raise SyntaxError
 
+# -----------------------------------------------------------------------------
+#                        == ActionTable / GotoTable ==
+#
+# Compact, array-backed representations of the LR tables.  Symbols are
+# identified by integer ids, terminals first, then nonterminals.
+#
+# The action table is looked up for every token, so it is stored as one dense
+# row of machine integers per state, indexed by terminal id.  Entries without
+# an action hold the NO_ACTION sentinel.  Each row has one extra column that
+# is always empty, which is where tokens not in the grammar are looked up.
+#
+# The goto table is much sparser, and only looked up after a reduction, so it
+# is compressed with row displacement: the entry for (state, nonterminal) lives
+# at index base[state] + id in the value array, if the check array holds the
+# state at that same index.  The arrays are padded so that any symbol id can
+# be looked up without bounds checks.
+#
+# Both take a fraction of the memory of the dicts of dicts, and are loaded
+# from the marshaled tables with little processing: only the action table is
+# split into its rows.
+# -----------------------------------------------------------------------------
+
+NO_ACTION = -0x8000
+
+class ActionTable(object):
+    def __init__(self, typecode, nterminals, data):
+        self.typecode = typecode
+        self.nterminals = nterminals
+        # one array per state, the flat data is not kept
+        width = nterminals + 1
+        self.rows = [data[i:i + width] for i in range(0, len(data), width)]
+
+    @classmethod
+    def from_dict(cls, table, symbol_ids, nterminals):
+        nstates = max(table) + 1 if table else 0
+        width = nterminals + 1
+        values = [v for row in table.values() for v in row.values()]
+        typecode = 'h' if all(NO_ACTION < v < 0x8000 for v in values) else 'i'
+        data = array(typecode, [NO_ACTION]) * (nstates * width)
+        for state, row in table.items():
+            for name, v in row.items():
+                data[state * width + symbol_ids[name]] = v
+        return cls(typecode, nterminals, data)
+
+    def to_dict(self, symbols):
+        """Returns the table as a dict of dicts, keyed by state and symbol name."""
+        return {state: {symbols[c]: v for c, v in enumerate(row) if v != NO_ACTION}
+                for state, row in enumerate(self.rows)}
+
+    def defaulted_states(self):
+        """Returns the states whose only action is a reduction."""
+        defaulted = {}
+        for state, row in enumerate(self.rows):
+            if row.count(NO_ACTION) == self.nterminals:
+                t = max(row)
+                if t < 0:
+                    defaulted[state] = t
+        return defaulted
+
+    def dump(self):
+        return (self.typecode, self.nterminals,
+                b''.join(row.tobytes() for row in self.rows))
+
+    @classmethod
+    def load(cls, dumped):
+        typecode, nterminals, raw = dumped
+        data = array(typecode)
+        data.frombytes(raw)
+        return cls(typecode, nterminals, data)
+
+
+class GotoTable(object):
+    def __init__(self, base, check, value):
+        self.base = base
+        self.check = check
+        self.value = value
+
+    @classmethod
+    def from_dict(cls, table, symbol_ids):
+        nsymbols = len(symbol_ids)
+        nstates = max(table) + 1 if table else 0
+        rows = []
+        for state, row in table.items():
+            cols = sorted((symbol_ids[name], v) for name, v in row.items())
+            if cols:
+                rows.append((state, cols))
+        # place the densest rows first, they are the hardest to fit
+        rows.sort(key=lambda r: (-len(r[1]), r[0]))
+
+        base = array('i', [0]) * nstates
+        used = bytearray()
+        first_free = 0
+        for state, cols in rows:
+            offsets = [c for c, _ in cols]
+            d = max(first_free - offsets[0], 0)
+            while True:
+                for c in offsets:
+                    i = d + c
+                    if i < len(used) and used[i]:
+                        break
+                else:
+                    break
+                d += 1
+            end = d + offsets[-1] + 1
+            if end > len(used):
+                used.extend(bytes(end - len(used)))
+            for c in offsets:
+                used[d + c] = 1
+            base[state] = d
+            while first_free < len(used) and used[first_free]:
+                first_free += 1
+
+        size = (max(base) if nstates else 0) + nsymbols + 1
+        check = array('i', [-1]) * size
+        value = array('i', [0]) * size
+        for state, cols in rows:
+            d = base[state]
+            for c, v in cols:
+                check[d + c] = state
+                value[d + c] = v
+        return cls(base, check, value)
+
+    def to_dict(self, symbols):
+        """Returns the table as a dict of dicts, keyed by state and symbol name."""
+        table = {}
+        for state, d in enumerate(self.base):
+            table[state] = {symbols[c]: self.value[d + c] for c in range(len(symbols))
+                            if self.check[d + c] == state}
+        return table
+
+    def dump(self):
+        return (self.base.tobytes(), self.check.tobytes(), self.value.tobytes())
+
+    @classmethod
+    def load(cls, dumped):
+        arrays = []
+        for raw in dumped:
+            a = array('i')
+            a.frombytes(raw)
+            arrays.append(a)
+        return cls(*arrays)
+
 # -----------------------------------------------------------------------------
 #                               == LRParser ==
 #
@@ -288,9 +433,19 @@ class YaccProduction:
 
 class LRParser:
     def __init__(self, lrtab, errorf):
+        lrtab.compact()
         self.productions = lrtab.lr_productions
+        self.symbols = lrtab.lr_symbols
+        self.symbol_ids = {name: i for i, name in enumerate(self.symbols)}
+        self.unknown_symbol_id = lrtab.lr_action.nterminals
         self.action = lrtab.lr_action
         self.goto = lrtab.lr_goto
+        # The goto table is small but looked up for every reduction, so it is
+        # used through lists, which index faster than arrays. Equal ints are
+        # shared to keep these lists compact.
+        ints = {}
+        self.goto_base = [ints.setdefault(v, v) for v in self.goto.base]
+        self.goto_value = [ints.setdefault(v, v) for v in self.goto.value]
         self.errorfunc = errorf
         self.set_defaulted_states()
         self.errorok = True
@@ -315,11 +470,7 @@ class LRParser:
     #
     # See:  http://www.gnu.org/software/bison/manual/html_node/Default-Reductions.html#Default-Reductions
     def set_defaulted_states(self):
-        self.defaulted_states = {}
-        for state, actions in self.action.items():
-            rules = list(actions.values())
-            if len(rules) == 1 and rules[0] < 0:
-                self.defaulted_states[state] = rules[0]
+        self.defaulted_states = self.action.defaulted_states()
 
     def disable_defaulted_states(self):
         self.defaulted_states = {}
@@ -357,6 +508,10 @@ class LRParser:
         goto    = self.goto                      # Local reference to goto table (to avoid lookup on self.)
         prod    = self.productions               # Local reference to production list (to avoid lookup on self.)
         defaulted_states = self.defaulted_states # Local reference to defaulted states
+        symbol_ids = self.symbol_ids             # Local reference to symbol ids used to index the tables
+        unknown_id = self.unknown_symbol_id      # Symbol id of tokens not in the grammar
+        action_rows = actions.rows               # Local reference to the rows of the action table
+        goto_base, goto_value = self.goto_base, self.goto_value
         pslice  = YaccProduction(None)           # Production object passed to grammar rules
         errorcount = 0                           # Used during error recovery
 
@@ -425,7 +580,7 @@ class LRParser:
 
                 # Check the action table
                 ltype = lookahead.type
-                t = actions[state].get(ltype)
+                t = action_rows[state][symbol_ids.get(ltype, unknown_id)]
             else:
                 t = defaulted_states[state]
                 #--! DEBUG
@@ -437,7 +592,7 @@ class LRParser:
                         ('%s . %s' % (' '.join([xx.type for xx in symstack][1:]), str(lookahead))).lstrip())
             #--! DEBUG
 
-            if t is not None:
+            if t != NO_ACTION:
                 if t > 0:
                     # shift a symbol on the stack
                     statestack.append(t)
@@ -470,10 +625,10 @@ class LRParser:
                     if plen:
                         debug.info('Action : Reduce rule [%s] with %s and goto state %d', p.str,
                                    '['+','.join([format_stack_entry(_v.value) for _v in symstack[-plen:]])+']',
-                                   goto[statestack[-1-plen]][pname])
+                                   goto_value[goto_base[statestack[-1-plen]] + symbol_ids[pname]])
                     else:
                         debug.info('Action : Reduce rule [%s] with %s and goto state %d', p.str, [],
-                                   goto[statestack[-1]][pname])
+                                   goto_value[goto_base[statestack[-1]] + symbol_ids[pname]])
 
                     #--! DEBUG
 
@@ -508,7 +663,7 @@ class LRParser:
                             debug.info('Result : %s', format_result(pslice[0]))
                             #--! DEBUG
                             symstack.append(sym)
-                            state = goto[statestack[-1]][pname]
+                            state = goto_value[goto_base[statestack[-1]] + symbol_ids[pname]]
                             statestack.append(state)
                         except SyntaxError:
                             # If an error was set. Enter error recovery state
@@ -550,7 +705,7 @@ class LRParser:
                             debug.info('Result : %s', format_result(pslice[0]))
                             #--! DEBUG
                             symstack.append(sym)
-                            state = goto[statestack[-1]][pname]
+                            state = goto_value[goto_base[statestack[-1]] + symbol_ids[pname]]
                             statestack.append(state)
                         except SyntaxError:
                             # If an error was set. Enter error recovery state
@@ -575,7 +730,7 @@ class LRParser:
                     #--! DEBUG
                     return result
 
-            if t is None:
+            if t == NO_ACTION:
 
                 #--! DEBUG
                 debug.error('Error  : %s',
@@ -704,6 +859,10 @@ class LRParser:
         goto    = self.goto                      # Local reference to goto table (to avoid lookup on self.)
         prod    = self.productions               # Local reference to production list (to avoid lookup on self.)
         defaulted_states = self.defaulted_states # Local reference to defaulted states
+        symbol_ids = self.symbol_ids             # Local reference to symbol ids used to index the tables
+        unknown_id = self.unknown_symbol_id      # Symbol id of tokens not in the grammar
+        action_rows = actions.rows               # Local reference to the rows of the action table
+        goto_base, goto_value = self.goto_base, self.goto_value
         pslice  = YaccProduction(None)           # Production object passed to grammar rules
         errorcount = 0                           # Used during error recovery
 
@@ -765,12 +924,12 @@ class LRParser:
 
                 # Check the action table
                 ltype = lookahead.type
-                t = actions[state].get(ltype)
+                t = action_rows[state][symbol_ids.get(ltype, unknown_id)]
             else:
                 t = defaulted_states[state]
 
 
-            if t is not None:
+            if t != NO_ACTION:
                 if t > 0:
                     # shift a symbol on the stack
                     statestack.append(t)
@@ -825,7 +984,7 @@ class LRParser:
                             p.callable(pslice)
                             del statestack[-plen:]
                             symstack.append(sym)
-                            state = goto[statestack[-1]][pname]
+                            state = goto_value[goto_base[statestack[-1]] + symbol_ids[pname]]
                             statestack.append(state)
                         except SyntaxError:
                             # If an error was set. Enter error recovery state
@@ -864,7 +1023,7 @@ class LRParser:
                             self.state = state
                             p.callable(pslice)
                             symstack.append(sym)
-                            state = goto[statestack[-1]][pname]
+                            state = goto_value[goto_base[statestack[-1]] + symbol_ids[pname]]
                             statestack.append(state)
                         except SyntaxError:
                             # If an error was set. Enter error recovery state
@@ -885,7 +1044,7 @@ class LRParser:
                     result = getattr(n, 'value', None)
                     return result
 
-            if t is None:
+            if t == NO_ACTION:
 
 
                 # We have some kind of parsing error here.  To handle
@@ -1010,6 +1169,10 @@ class LRParser:
         goto    = self.goto                      # Local reference to goto table (to avoid lookup on self.)
         prod    = self.productions               # Local reference to production list (to avoid lookup on self.)
         defaulted_states = self.defaulted_states # Local reference to defaulted states
+        symbol_ids = self.symbol_ids             # Local reference to symbol ids used to index the tables
+        unknown_id = self.unknown_symbol_id      # Symbol id of tokens not in the grammar
+        action_rows = actions.rows               # Local reference to the rows of the action table
+        goto_base, goto_value = self.goto_base, self.goto_value
         pslice  = YaccProduction(None)           # Production object passed to grammar rules
         errorcount = 0                           # Used during error recovery
 
@@ -1071,12 +1234,12 @@ class LRParser:
 
                 # Check the action table
                 ltype = lookahead.type
-                t = actions[state].get(ltype)
+                t = action_rows[state][symbol_ids.get(ltype, unknown_id)]
             else:
                 t = defaulted_states[state]
 
 
-            if t is not None:
+            if t != NO_ACTION:
                 if t > 0:
                     # shift a symbol on the stack
                     statestack.append(t)
@@ -1122,7 +1285,7 @@ class LRParser:
                             p.callable(pslice)
                             del statestack[-plen:]
                             symstack.append(sym)
-                            state = goto[statestack[-1]][pname]
+                            state = goto_value[goto_base[statestack[-1]] + symbol_ids[pname]]
                             statestack.append(state)
                         except SyntaxError:
                             # If an error was set. Enter error recovery state
@@ -1156,7 +1319,7 @@ class LRParser:
                             self.state = state
                             p.callable(pslice)
                             symstack.append(sym)
-                            state = goto[statestack[-1]][pname]
+                            state = goto_value[goto_base[statestack[-1]] + symbol_ids[pname]]
                             statestack.append(state)
                         except SyntaxError:
                             # If an error was set. Enter error recovery state
@@ -1177,7 +1340,7 @@ class LRParser:
                     result = getattr(n, 'value', None)
                     return result
 
-            if t is None:
+            if t == NO_ACTION:
 
 
                 # We have some kind of parsing error here.  To handle
@@ -1976,9 +2139,26 @@ class LRTable(object):
     def __init__(self):
         self.lr_action = None
         self.lr_goto = None
+        self.lr_symbols = None
         self.lr_productions = None
         self.lr_method = None
 
+    # Convert the action and goto tables from dicts of dicts to their
+    # compact, array-backed representations
+    def compact(self):
+        if isinstance(self.lr_action, ActionTable):
+            return
+        terminals = set()
+        for row in self.lr_action.values():
+            terminals.update(row)
+        nonterminals = set()
+        for row in self.lr_goto.values():
+            nonterminals.update(row)
+        self.lr_symbols = sorted(terminals) + sorted(nonterminals - terminals)
+        symbol_ids = {name: i for i, name in enumerate(self.lr_symbols)}
+        self.lr_action = ActionTable.from_dict(self.lr_action, symbol_ids, len(terminals))
+        self.lr_goto = GotoTable.from_dict(self.lr_goto, symbol_ids)
+
     def read_table(self, module):
         if isinstance(module, types.ModuleType):
             parsetab = module
@@ -2026,6 +2206,29 @@ class LRTable(object):
         in_f.close()
         return signature
 
+    def read_marshal(self, filename):
+        if not os.path.exists(filename):
+            raise ImportError
+
+        with open(filename, 'rb') as in_f:
+            # loading from bytes is several times faster than from the file
+            raw = in_f.read()
+        try:
+            data = marshal.loads(raw)
+        except (EOFError, ValueError, TypeError):
+            raise ImportError
+        if not isinstance(data, tuple) or data[:2] != (__tabversion__, __tabformat__):
+            raise VersionError('yacc table file version is out of date')
+        _, _, self.lr_method, signature, symbols, action, goto, productions = data
+        self.lr_symbols = list(symbols)
+        self.lr_action = ActionTable.load(action)
+        self.lr_goto = GotoTable.load(goto)
+
+        self.lr_productions = []
+        for p in productions:
+            self.lr_productions.append(MiniProduction(*p))
+        return signature
+
     # Bind all production function names to callable objects in pdict
     def bind_callables(self, pdict):
         for p in self.lr_productions:
@@ -2849,6 +3052,38 @@ del _lr_goto_items
     # This function pickles the LR parsing tables to a supplied file object
     # -----------------------------------------------------------------------------
 
+    # -----------------------------------------------------------------------------
+    # marshal_table()
+    #
+    # This function writes the LR parsing tables to a file in the marshal format,
+    # which loads much faster than both the table module and the pickle.
+    # -----------------------------------------------------------------------------
+
+    def marshal_table(self, filename, signature=''):
+        self.compact()
+        outp = []
+        for p in self.lr_productions:
+            if p.func:
+                outp.append((p.str, p.name, p.len, p.func, os.path.basename(p.file), p.line))
+            else:
+                outp.append((str(p), p.name, p.len, None, None, None))
+        data = (__tabversion__, __tabformat__, self.lr_method, signature, tuple(self.lr_symbols),
+                self.lr_action.dump(), self.lr_goto.dump(), outp)
+        dirname = os.path.dirname(filename)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        # write to a temporary file first, so that concurrent readers never
+        # see a partially written table
+        tmpname = '%s.%d.tmp' % (filename, os.getpid())
+        try:
+            with open(tmpname, 'wb') as outf:
+                marshal.dump(data, outf)
+            os.replace(tmpname, filename)
+        except OSError:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            raise
+
     def pickle_table(self, filename, signature=''):
         try:
             import cPickle as pickle
@@ -3217,7 +3452,7 @@ class ParserReflect(object):
 
 def yacc(method='LALR', debug=yaccdebug, module=None, tabmodule=tab_module, start=None,
          check_recursion=True, optimize=False, write_tables=True, debugfile=debug_file,
-         outputdir=None, debuglog=None, errorlog=None, picklefile=None):
+         outputdir=None, debuglog=None, errorlog=None, picklefile=None, marshalfile=None):
 
     if tabmodule is None:
         tabmodule = tab_module
@@ -3229,6 +3464,13 @@ def yacc(method='LALR', debug=yaccdebug, module=None, tabmodule=tab_module, star
     if picklefile:
         write_tables = 0
 
+    # Marshal tables may be looked for in a list of files. Generated tables
+    # are written to the first one of them that can be written.
+    if isinstance(marshalfile, str):
+        marshalfile = [marshalfile]
+    if marshalfile:
+        write_tables = 0
+
     if errorlog is None:
         errorlog = PlyLogger(sys.stderr)
 
@@ -3287,9 +3529,28 @@ def yacc(method='LALR', debug=yaccdebug, module=None, tabmodule=tab_module, star
     signature = pinfo.signature()
 
     # Read the tables
+    for filename in marshalfile or ():
+        try:
+            lr = LRTable()
+            read_signature = lr.read_marshal(filename)
+            # checking the signature is cheap, so it is done even when optimizing
+            if read_signature == signature:
+                lr.bind_callables(pinfo.pdict)
+                parser = LRParser(lr, pinfo.error_func)
+                parse = parser.parse
+                return parser
+        except VersionError as e:
+            errorlog.warning(str(e))
+        except ImportError:
+            pass
+        except Exception as e:
+            errorlog.warning('There was a problem loading the table file: %r', e)
+
     try:
         lr = LRTable()
-        if picklefile:
+        if marshalfile:
+            raise ImportError
+        elif picklefile:
             read_signature = lr.read_pickle(picklefile)
         else:
             read_signature = lr.read_table(tabmodule)
@@ -3496,6 +3757,14 @@ def yacc(method='LALR', debug=yaccdebug, module=None, tabmodule=tab_module, star
         except IOError as e:
             errorlog.warning("Couldn't create %r. %s" % (picklefile, e))
 
+    # Write a marshaled version of the tables
+    for filename in marshalfile or ():
+        try:
+            lr.marshal_table(filename, signature)
+            break
+        except OSError as e:
+            errorlog.warning("Couldn't create %r. %s" % (filename, e))
+
     # Build the parser
     lr.bind_callables(pinfo.pdict)
     parser = LRParser(lr, pinfo.error_func)
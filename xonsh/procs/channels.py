@@ -0,0 +1,396 @@
+"""In-process channels between the callable aliases of a pipeline, and the
+record streams of the aliases.
+"""
+
+import codecs
+import collections
+import collections.abc as cabc
+import errno
+import io
+import json
+import threading
+import time
+
+from xonsh.built_ins import XSH
+
+
+def format_record(record):
+    """The text line of a record, for the commands which read text: strings
+    are lines already, mappings are written as JSON and the fields of other
+    sequences are separated by tabs.
+    """
+    cls = record.__class__
+    if cls is str:
+        s = record
+    elif cls is int or cls is float:
+        return f"{record}\n"
+    elif isinstance(record, str):
+        s = record
+    elif isinstance(record, cabc.Mapping):
+        s = json.dumps(record, default=str)
+    elif isinstance(record, cabc.Sequence) and not isinstance(record, bytes):
+        s = "\t".join(map(str, record))
+    else:
+        s = str(record)
+    return s if s.endswith("\n") else s + "\n"
+
+
+def write_records(records, stdout):
+    """Writes the records returned by an alias to its stdout, as they are into
+    a channel, or as text lines as they come otherwise.
+    """
+    if isinstance(stdout, ChannelWriter):
+        stdout.write_records(records)
+    else:
+        write = stdout.write
+        for record in records:
+            write(format_record(record))
+    return 0
+
+
+def read_records(stdin):
+    """Iterates over the records written to the stdin of an alias, which are
+    its lines without their newline when it is not a channel.
+    """
+    if stdin is None:
+        return iter(())
+    if isinstance(stdin, ChannelReader):
+        return stdin.records()
+    return (line[:-1] if line.endswith("\n") else line for line in stdin)
+
+
+def _chunk_text(chunk):
+    """The text of a chunk of a channel, which may be a batch of records."""
+    if isinstance(chunk, list):
+        return "".join(map(format_record, chunk))
+    return chunk
+
+
+class Channel:
+    """A bounded queue of text chunks, which connects the stdout of a callable
+    alias to the stdin of the next one when both run on threads, in place of
+    an OS pipe. The text is passed as is, without being encoded to bytes and
+    decoded back. Records are passed as they are too, in batches (lists),
+    and only formatted as text if they are read as text.
+
+    Writing blocks while ``maxsize`` chunks are waiting to be read, reading
+    blocks until a chunk is written or the channel is closed.
+    """
+
+    def __init__(self, maxsize=64, chunksize=1 << 13):
+        """
+        Parameters
+        ----------
+        maxsize : int, optional
+            Maximum number of chunks waiting to be read.
+        chunksize : int, optional
+            Number of characters buffered by the writer before they are
+            put into the channel.
+        """
+        self.maxsize = maxsize
+        self.chunksize = chunksize
+        self.chunks = collections.deque()
+        self.cond = threading.Condition()
+        self.eof = False
+        self.broken = False
+        env = XSH.env
+        enc = env.get("XONSH_ENCODING")
+        err = env.get("XONSH_ENCODING_ERRORS")
+        self.reader = ChannelReader(self, enc, err)
+        self.writer = ChannelWriter(self, enc, err)
+
+    def put(self, chunk):
+        """Puts a chunk of text into the channel, raises ``BrokenPipeError``
+        if the reader is closed.
+        """
+        with self.cond:
+            while len(self.chunks) >= self.maxsize and not self.broken:
+                self.cond.wait()
+            if self.broken:
+                raise BrokenPipeError(errno.EPIPE, "the channel reader is closed")
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+
+    def get(self):
+        """Gets the next chunk of text, or an empty string once the writer
+        is closed and all the chunks were read.
+        """
+        with self.cond:
+            while not self.chunks and not self.eof:
+                self.cond.wait()
+            if not self.chunks:
+                return ""
+            chunk = self.chunks.popleft()
+            self.cond.notify_all()
+            return chunk
+
+    def close_writer(self):
+        with self.cond:
+            self.eof = True
+            self.cond.notify_all()
+
+    def close_reader(self):
+        with self.cond:
+            self.broken = True
+            self.chunks.clear()
+            self.cond.notify_all()
+
+    def close(self):
+        """Closes both ends at once, without flushing the writer."""
+        self.close_reader()
+        self.close_writer()
+
+
+class ChannelWriter(io.TextIOBase):
+    """The text stream writing into a channel."""
+
+    def __init__(self, channel, encoding, errors):
+        self.channel = channel
+        self._encoding = encoding
+        self._errors = errors
+        self._pending = []
+        self._size = 0
+        self._chunksize = channel.chunksize
+        self._buffer = None
+
+    @property
+    def encoding(self):
+        return self._encoding
+
+    @property
+    def errors(self):
+        return self._errors
+
+    @property
+    def buffer(self):
+        """A binary stream writing into the channel, for the aliases which
+        write bytes.
+        """
+        if self._buffer is None:
+            self._buffer = _ChannelBinaryWriter(self)
+        return self._buffer
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        if s.__class__ is not str:
+            if self.closed:
+                raise ValueError("I/O operation on closed channel")
+            if not isinstance(s, str):
+                msg = f"write() argument must be str, not {type(s).__name__}"
+                raise TypeError(msg)
+        n = len(s)
+        self._pending.append(s)
+        self._size += n
+        if self._size >= self._chunksize:
+            self.flush()
+        return n
+
+    def flush(self):
+        if self.closed:
+            if self._pending:
+                self._pending.clear()
+                raise ValueError("I/O operation on closed channel")
+            return
+        if self._buffer is not None:
+            self._buffer.flush_decoder()
+        if self._pending:
+            chunk = "".join(self._pending)
+            self._pending.clear()
+            self._size = 0
+            if chunk:
+                # an empty chunk would be read as the end of the channel
+                self.channel.put(chunk)
+
+    def write_records(self, records, batchsize=256, latency=0.01):
+        """Puts records into the channel as they are, in batches of up to
+        ``batchsize`` records. A batch is put earlier if the reader waits for
+        it and the last batch was put more than ``latency`` seconds ago.
+        """
+        self.flush()
+        if self.closed:
+            raise ValueError("I/O operation on closed channel")
+        channel = self.channel
+        batch = []
+        last = time.monotonic()
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batchsize or (
+                not channel.chunks and time.monotonic() - last > latency
+            ):
+                channel.put(batch)
+                batch = []
+                last = time.monotonic()
+        if batch:
+            channel.put(batch)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._buffer is not None:
+                self._buffer.flush_decoder(final=True)
+            self.flush()
+        except BrokenPipeError:
+            pass
+        finally:
+            super().close()
+            self.channel.close_writer()
+
+
+class _ChannelBinaryWriter(io.RawIOBase):
+    """Decodes the bytes written by an alias to put them into the channel."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.decoder = codecs.getincrementaldecoder(writer.encoding)(writer.errors)
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.writer.write(self.decoder.decode(bytes(b)))
+        return len(b)
+
+    def flush_decoder(self, final=False):
+        s = self.decoder.decode(b"", final=final)
+        if s:
+            self.writer._pending.append(s)
+            self.writer._size += len(s)
+
+    def flush(self):
+        self.writer.flush()
+
+
+class ChannelReader(io.TextIOBase):
+    """The text stream reading from a channel, with universal newlines.
+
+    The chunks are split into lines as they are read, so that iterating over
+    the lines does not go through ``readline()``.
+    """
+
+    def __init__(self, channel, encoding, errors):
+        self.channel = channel
+        self._encoding = encoding
+        self._errors = errors
+        self._decoder = io.IncrementalNewlineDecoder(None, translate=True)
+        self._lines = collections.deque()
+        self._tail = ""  # the start of the line being written
+        self._eof = False
+
+    @property
+    def encoding(self):
+        return self._encoding
+
+    @property
+    def errors(self):
+        return self._errors
+
+    def readable(self):
+        return True
+
+    def _check_closed(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed channel")
+
+    def _fill(self):
+        """Reads the next chunk into the lines, returns False once the end
+        of the channel was reached.
+        """
+        if self._eof:
+            return False
+        self._add(self.channel.get())
+        return True
+
+    def _add(self, chunk):
+        """Splits a chunk into lines, after the ones already read."""
+        self._eof = not chunk
+        s = self._tail + self._decoder.decode(_chunk_text(chunk), final=self._eof)
+        lines = io.StringIO(s, newline="\n").readlines()
+        if lines and not self._eof and not lines[-1].endswith("\n"):
+            self._tail = lines.pop()
+        else:
+            self._tail = ""
+        self._lines.extend(lines)
+
+    def records(self):
+        """Iterates over the records written into the channel, which are the
+        lines without their newline for the text written into it.
+        """
+        self._check_closed()
+        lines = self._lines
+        while True:
+            while lines:
+                line = lines.popleft()
+                yield line[:-1] if line.endswith("\n") else line
+            if self._eof:
+                return
+            chunk = self.channel.get()
+            if isinstance(chunk, list) and not self._tail:
+                yield from chunk
+            else:
+                self._add(chunk)
+
+    def __iter__(self):
+        self._check_closed()
+        return self._iterlines()
+
+    def _iterlines(self):
+        lines = self._lines
+        while lines or self._fill():
+            while lines:
+                yield lines.popleft()
+
+    def read(self, size=-1):
+        self._check_closed()
+        if size is None or size < 0:
+            parts = [*self._lines, self._tail]
+            self._lines.clear()
+            self._tail = ""
+            while not self._eof:
+                chunk = self.channel.get()
+                self._eof = not chunk
+                s = self._decoder.decode(_chunk_text(chunk), final=self._eof)
+                parts.append(s)
+            return "".join(parts)
+        parts = []
+        while size > 0:
+            if self._lines:
+                s = self._lines.popleft()
+                if len(s) > size:
+                    self._lines.appendleft(s[size:])
+            elif len(self._tail) >= size or not self._fill():
+                s = self._tail
+                self._tail = s[size:]
+                if not s:
+                    break
+            else:
+                continue
+            parts.append(s[:size])
+            size -= len(parts[-1])
+        return "".join(parts)
+
+    def readline(self, size=-1):
+        self._check_closed()
+        while not self._lines and self._fill():
+            pass
+        if not self._lines:
+            return ""
+        line = self._lines.popleft()
+        if size is not None and 0 <= size < len(line):
+            self._lines.appendleft(line[size:])
+            line = line[:size]
+        return line
+
+    def readlines(self, hint=-1):
+        self._check_closed()
+        if hint is None or hint <= 0:
+            return list(self._iterlines())
+        return super().readlines(hint)
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        self.channel.close_reader()
@@ -250,8 +250,12 @@ else:
     def _hup(job):
         _send_signal(job, signal.SIGHUP)
 
+    def _ignore_signal(n, f):
+        pass
+
     def ignore_sigtstp():
-        signal.signal(signal.SIGTSTP, signal.SIG_IGN)
+        # a no-op handler rather than SIG_IGN, which the commands would inherit
+        signal.signal(signal.SIGTSTP, _ignore_signal)
 
     _shell_pgrp = os.getpgrp()  # type:ignore
 
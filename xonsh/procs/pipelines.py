@@ -1,5 +1,6 @@
 """Command pipeline tools."""
 
+import functools
 import io
 import os
 import re
@@ -14,7 +15,13 @@ import xonsh.platform as xp
 import xonsh.procs.jobs as xj
 import xonsh.tools as xt
 from xonsh.built_ins import XSH
-from xonsh.procs.readers import ConsoleParallelReader, NonBlockingFDReader, safe_fdclose
+from xonsh.procs.proxies import ProcProxyThread
+from xonsh.procs.readers import (
+    ConsoleParallelReader,
+    NonBlockingFDReader,
+    QueueReader,
+    safe_fdclose,
+)
 
 
 @xl.lazyobject
@@ -71,6 +78,39 @@ def safe_readlines(handle, hint=-1):
     return lines
 
 
+def safe_readchunks(handle, hint=-1):
+    """Attempts to read the available output as a single chunk of bytes,
+    without splitting it into lines nor throwing an error. This is blocking
+    for negative hints (i.e. read all the remaining output), like
+    ``safe_readlines()``.
+    """
+    if handle is None:
+        return []
+    try:
+        if hint == -1 and isinstance(handle, QueueReader):
+            chunk = b"".join(handle.iterqueue())
+        else:
+            chunk = handle.read()
+    except OSError:
+        chunk = b""
+    return [bytes(chunk)] if chunk else []
+
+
+def _split_lines(text):
+    """Splits text into lines at newlines only, keeping them."""
+    return io.StringIO(text, newline="\n").readlines()
+
+
+def _fix_line_endings(b):
+    """Replaces the CRLF line endings with newlines, and a final CR. Other
+    carriage returns, e.g. of progress bars, are kept.
+    """
+    b = b.replace(b"\r\n", b"\n")
+    if b.endswith(b"\r"):
+        b = b[:-1] + b"\n"
+    return b
+
+
 def safe_readable(handle):
     """Attempts to find if the handle is readable without throwing an error."""
     try:
@@ -140,7 +180,8 @@ class CommandPipeline:
         errors : str
             A string of the standard error.
         lines : list of str
-            The output lines
+            The output lines, split from the captured output on first
+            access when it was captured as a whole.
         starttime : floats or None
             Pipeline start timestamp.
         """
@@ -238,10 +279,26 @@ class CommandPipeline:
         else:
             yield from self.tee_stdout()
 
-    def iterraw(self):
+    @property
+    def lines(self):
+        """The output lines."""
+        if self._pending_output is not None:
+            self._lines.extend(_split_lines(self._pending_output))
+            self._pending_output = None
+        return self._lines
+
+    @lines.setter
+    def lines(self, value):
+        self._lines = value
+        self._pending_output = None
+
+    def iterraw(self, chunks=False):
         """Iterates through the last stdout, and returns the lines
-        exactly as found.
+        exactly as found. If ``chunks`` is true, the output is returned
+        in chunks as large as available instead, which are not split
+        into lines.
         """
+        readout = safe_readchunks if chunks else safe_readlines
         # get appropriate handles
         spec = self.spec
         proc = self.proc
@@ -278,13 +335,17 @@ class CommandPipeline:
                     self.end(tee_output=False)
                 elif self.captured == "hiddenobject" and stdout:
                     b = stdout.read()
-                    lines = b.splitlines(keepends=True)
-                    yield from lines
+                    if chunks:
+                        yield b
+                    else:
+                        yield from b.splitlines(keepends=True)
                     self.end(tee_output=False)
                 elif self.captured == "stdout" and stdout is not None:
                     b = stdout.read()
                     s = self._decode_uninew(b, universal_newlines=True)
-                    self.lines = s.splitlines(keepends=True)
+                    # split into lines only if the lines are needed
+                    self.lines = []
+                    self._pending_output = s or None
             return
         # get the correct stderr
         stderr = proc.stderr
@@ -297,6 +358,7 @@ class CommandPipeline:
         if stderr is not None and not isinstance(stderr, self.nonblocking):
             stderr = NonBlockingFDReader(stderr.fileno(), timeout=timeout)
         # read from process while it is running
+        wait_for_output = getattr(proc, "wait_for_output", None)
         check_prev_done = len(self.procs) == 1
         prev_end_time = None
         i = j = cnt = 1
@@ -319,7 +381,7 @@ class CommandPipeline:
                 proc.prevs_are_closed = True
                 break
 
-            stdout_lines = safe_readlines(stdout, 1024)
+            stdout_lines = readout(stdout, 1024)
             i = len(stdout_lines)
             if i != 0:
                 yield from stdout_lines
@@ -348,13 +410,17 @@ class CommandPipeline:
                 cnt = min(cnt + 1, 1000)
             else:
                 cnt = 1
-            time.sleep(timeout * cnt)
+            if wait_for_output is None:
+                time.sleep(timeout * cnt)
+            else:
+                # woken up as soon as there is output or the process ended
+                wait_for_output(timeout * cnt)
         # read from process now that it is over
-        yield from safe_readlines(stdout)
+        yield from readout(stdout)
         self.stream_stderr(safe_readlines(stderr))
         proc.wait()
         self._endtime()
-        yield from safe_readlines(stdout)
+        yield from readout(stdout)
         self.stream_stderr(safe_readlines(stderr))
         if self.captured == "object":
             self.end(tee_output=False)
@@ -412,6 +478,30 @@ class CommandPipeline:
         # using join is more efficient than concatenating in a loop
         self._raw_output = b"".join(raw_out_lines)
 
+    def _capture_stdout(self):
+        """Captures the whole process stdout to the output variable, when
+        it is not streamed. The output is read in large chunks, which are
+        munged and decoded at once, and split into lines only if the lines
+        are needed.
+        """
+        env = XSH.env
+        b = b"".join(self.iterraw(chunks=True))
+        self._raw_output = b
+        if not b:
+            return
+        # do some munging of the output before we save it
+        b = _fix_line_endings(b)
+        if any(c in b for c in (b"\001", b"\x1b", b"\x9b")):
+            # the pattern has no literal prefix, which makes it slow to search
+            # through long outputs where it can not match
+            b = RE_HIDE_ESCAPE.sub(b"", b)
+        s = b.decode(
+            encoding=env.get("XONSH_ENCODING"), errors=env.get("XONSH_ENCODING_ERRORS")
+        )
+        if self._pending_output is not None:
+            s = self._pending_output + s
+        self._pending_output = s
+
     def stream_stderr(self, lines):
         """Streams lines to sys.stderr and the errors attribute."""
         if not lines:
@@ -438,7 +528,7 @@ class CommandPipeline:
         # save the raw bytes
         self._raw_error = b
         # do some munging of the line before we save it to the attr
-        b = b.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        b = _fix_line_endings(b)
         b = RE_HIDE_ESCAPE.sub(b"", b)
         env = XSH.env
         s = b.decode(
@@ -485,15 +575,17 @@ class CommandPipeline:
         """Waits for the command to complete and then runs any closing and
         cleanup procedures that need to be run.
         """
-        if tee_output:
+        if tee_output and self.captured == "object" and not self._lines:
+            self._capture_stdout()
+        elif tee_output:
             for _ in self.tee_stdout():
                 pass
         self._endtime()
         # since we are driven by getting output, input may not be available
         # until the command has completed.
         self._set_input()
-        self._close_prev_procs()
         self._close_proc()
+        self._close_prev_procs()
         self._check_signal()
         self._apply_to_history()
         self.ended = True
@@ -549,7 +641,7 @@ class CommandPipeline:
         """
         any_running = False
         for s, p in zip(self.specs[:-1], self.procs[:-1], strict=False):
-            if p.poll() is None:
+            if p.poll() is None or (isinstance(p, ProcProxyThread) and p.is_alive()):
                 any_running = True
                 continue
             self._safe_close(s.stdin)
@@ -565,14 +657,22 @@ class CommandPipeline:
     def _close_prev_procs(self):
         """Closes all but the last proc's stdout."""
         for s, p in zip(self.specs[:-1], self.procs[:-1], strict=False):
-            self._safe_close(s.stdin)
-            self._safe_close(s.stdout)
-            self._safe_close(s.stderr)
-            if p is None:
-                continue
-            self._safe_close(p.stdin)
-            self._safe_close(p.stdout)
-            self._safe_close(p.stderr)
+            if isinstance(p, ProcProxyThread) and p is not threading.current_thread():
+                # function aliases may still write to the fds of this process,
+                # which can not be closed (and reused) until they are done
+                p.call_when_done(functools.partial(self._close_prev_proc, s, p))
+            else:
+                self._close_prev_proc(s, p)
+
+    def _close_prev_proc(self, s, p):
+        self._safe_close(s.stdin)
+        self._safe_close(s.stdout)
+        self._safe_close(s.stderr)
+        if p is None:
+            return
+        self._safe_close(p.stdin)
+        self._safe_close(p.stdout)
+        self._safe_close(p.stderr)
 
     def _close_proc(self):
         """Closes last proc's stdout."""
@@ -690,15 +790,23 @@ class CommandPipeline:
         elif callable(fmt):
             return fmt(lines)
 
+    def _formatted_output(self):
+        text = self._pending_output
+        fmt = self.output_format
+        if text is not None and not self._lines and fmt == "stream_lines":
+            # no need to split the output into lines
+            return text[:-1] if text.find("\n") == len(text) - 1 else text
+        return self.get_formatted_lines(self.lines)
+
     @property
     def output(self):
         """Non-blocking, lazy access to output"""
         if self.ended:
             if self._output is None:
-                self._output = self.get_formatted_lines(self.lines)
+                self._output = self._formatted_output()
             return self._output
         else:
-            return self.get_formatted_lines(self.lines)
+            return self._formatted_output()
 
     @property
     def out(self):
@@ -3,6 +3,7 @@
 import array
 import io
 import os
+import selectors
 import signal
 import subprocess
 import sys
@@ -25,6 +26,11 @@ from xonsh.procs.readers import (
 # See http://rtfm.etla.org/xterm/ctlseq.html for more.
 MODE_NUMS = ("1049", "47", "1047")
 
+# Sizes of the reads of the captured output, which grow while it comes faster
+# than it is read.
+MIN_READ_SIZE = 1 << 16
+MAX_READ_SIZE = 1 << 20
+
 
 @xl.lazyobject
 def START_ALTERNATE_MODE():
@@ -126,6 +132,8 @@ class PopenThread(threading.Thread):
             self.stderr = io.BytesIO()
         self.suspended = False
         self.prevs_are_closed = False
+        # set whenever output was captured, and once the process is over
+        self._output_ready = threading.Event()
         # This is so the thread will use the same swapped values as the origin one.
         self.original_swapped_values = XSH.env.get_swapped_values()
         self.start()
@@ -149,16 +157,121 @@ class PopenThread(threading.Thread):
             origin = BufferedFDParallelReader(origfd, buffer=stdin)
         else:
             origin = None
-        # get non-blocking stdout
         stdout = self.stdout.buffer if self.universal_newlines else self.stdout
-        capout = spec.captured_stdout
+        stderr = self.stderr.buffer if self.universal_newlines else self.stderr
+        try:
+            if xp.ON_POSIX:
+                self._pump(spec.captured_stdout, stdout, spec.captured_stderr, stderr)
+            else:
+                self._poll_readers(
+                    spec.captured_stdout, stdout, spec.captured_stderr, stderr
+                )
+        finally:
+            self._output_ready.set()
+        # kill the process if it is still alive. Happens when piping.
+        if not self.suspended and proc.poll() is None:
+            proc.terminate()
+
+    def _check_suspended(self):
+        """Looks for the process being stopped, returns whether it was
+        suspended.
+        """
+        proc = self.proc
+        info = proc_untraced_waitpid(proc, hang=False)
+        if getattr(proc, "suspended", False):
+            self.suspended = True
+            if XSH.env.get("XONSH_DEBUG", False):
+                procname = f"{getattr(proc, 'args', '')} {proc.pid}".strip()
+                print(
+                    f"Process {procname} suspended with signal {info['signal_name']}.",
+                    file=sys.stderr,
+                )
+        return self.suspended
+
+    def _pidfd(self):
+        """A file descriptor readable once the process exits, if the platform
+        has them.
+        """
+        try:
+            return os.pidfd_open(self.pid)
+        except (AttributeError, OSError):
+            return None
+
+    def _pump(self, capout, stdout, caperr, stderr):
+        """Copies the captured output of the process as soon as it comes.
+
+        The captured stdout and stderr are multiplexed by a single selector,
+        which also watches a pidfd of the process where available, so that
+        its exit is seen right away. Otherwise, the exit (and the suspension
+        of the process) is checked every ``1000 * $XONSH_PROC_FREQUENCY``
+        seconds without output.
+        """
+        proc = self.proc
+        sel = selectors.DefaultSelector()
+        for cap, membuf, stdbuf in (
+            (capout, stdout, sys.__stdout__),
+            (caperr, stderr, sys.__stderr__),
+        ):
+            if cap is not None:
+                sel.register(cap.fileno(), selectors.EVENT_READ, (membuf, stdbuf))
+        self._read_sizes = {}
+        pidfd = self._pidfd()
+        if pidfd is not None:
+            sel.register(pidfd, selectors.EVENT_READ)
+        try:
+            while proc.poll() is None:
+                if self._check_suspended():
+                    return
+                self._pump_events(sel, self.timeout * 1000)
+            if self.suspended:
+                return
+            if pidfd is not None:
+                sel.unregister(pidfd)
+            # close files to send EOF to the captured ends.
+            safe_fdclose(self.orig_stdout)
+            safe_fdclose(self.orig_stderr)
+            # read in the remaining data in a blocking fashion.
+            while sel.get_map():
+                self._pump_events(sel)
+        finally:
+            sel.close()
+            if pidfd is not None:
+                os.close(pidfd)
+
+    def _pump_events(self, sel, timeout=None):
+        """Copies the chunks of output the selector says are available,
+        ends of file are unregistered.
+        """
+        for key, _ in sel.select(timeout):
+            if key.data is None:
+                continue  # the process exited
+            size = self._read_sizes.get(key.fd, MIN_READ_SIZE)
+            try:
+                chunk = os.read(key.fd, size)
+            except OSError:
+                # EIO on a pty once the process is gone
+                chunk = b""
+            if not chunk:
+                sel.unregister(key.fd)
+                continue
+            if len(chunk) == size and size < MAX_READ_SIZE:
+                # lots of output, read it in larger chunks
+                self._read_sizes[key.fd] = size * 2
+            membuf, stdbuf = key.data
+            self._alt_mode_switch(chunk, membuf, stdbuf)
+            membuf.flush()
+            stdbuf.flush()
+            self._output_ready.set()
+
+    def _poll_readers(self, capout, stdout, caperr, stderr):
+        """Copies the captured output of the process through background
+        reader threads, for the platforms where pipes can not be selected.
+        """
+        proc = self.proc
         if capout is None:
             procout = None
         else:
             procout = NonBlockingFDReader(capout.fileno(), timeout=self.timeout)
-        # get non-blocking stderr
-        stderr = self.stderr.buffer if self.universal_newlines else self.stderr
-        caperr = spec.captured_stderr
         if caperr is None:
             procerr = None
         else:
@@ -169,16 +282,7 @@ class PopenThread(threading.Thread):
         # loop over reads while process is running.
         i = j = cnt = 1
         while proc.poll() is None:
-            info = proc_untraced_waitpid(proc, hang=False)
-            if getattr(proc, "suspended", False):
-                self.suspended = True
-                if XSH.env.get("XONSH_DEBUG", False):
-                    procname = f"{getattr(proc, 'args', '')} {proc.pid}".strip()
-                    print(
-                        f"Process {procname} suspended with signal {info['signal_name']}.",
-                        file=sys.stderr,
-                    )
-
+            self._check_suspended()
             # this is here for CPU performance reasons.
             if i + j == 0:
                 cnt = min(cnt + 1, 1000)
@@ -209,18 +313,15 @@ class PopenThread(threading.Thread):
         # with orig_* needed to be closed before cap*
         safe_fdclose(self.orig_stdout)
         safe_fdclose(self.orig_stderr)
-        if xp.ON_WINDOWS:
-            safe_fdclose(capout)
-            safe_fdclose(caperr)
+        safe_fdclose(capout)
+        safe_fdclose(caperr)
         # read in the remaining data in a blocking fashion.
         while (procout is not None and not procout.is_fully_read()) or (
             procerr is not None and not procerr.is_fully_read()
         ):
             self._read_write(procout, stdout, sys.__stdout__)
             self._read_write(procerr, stderr, sys.__stderr__)
-        # kill the process if it is still alive. Happens when piping.
-        if proc.poll() is None:
-            proc.terminate()
+            self._output_ready.set()
 
     def _wait_and_getattr(self, name):
         """make sure the instance has a certain attr, and return it."""
@@ -443,6 +544,14 @@ class PopenThread(threading.Thread):
     # Dispatch methods
     #
 
+    def wait_for_output(self, timeout=None):
+        """Blocks until some output was captured or the process is over, for
+        at most ``timeout`` seconds. Returns whether that happened.
+        """
+        ready = self._output_ready.wait(timeout)
+        self._output_ready.clear()
+        return ready
+
     def poll(self):
         """Dispatches to Popen.returncode."""
         return self.proc.returncode
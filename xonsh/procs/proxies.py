@@ -21,6 +21,12 @@ import xonsh.platform as xp
 import xonsh.tools as xt
 from xonsh.built_ins import XSH
 from xonsh.cli_utils import run_with_partial_args
+from xonsh.procs.channels import (
+    ChannelReader,
+    ChannelWriter,
+    read_records,
+    write_records,
+)
 from xonsh.procs.readers import safe_fdclose
 
 
@@ -346,7 +352,12 @@ class ProcProxyThread(threading.Thread):
         self.returncode = None
         self._closed_handle_cache = {}
 
-        handles = self._get_handles(stdin, stdout, stderr)
+        # channels have no file descriptors
+        handles = self._get_handles(
+            None if isinstance(stdin, ChannelReader) else stdin,
+            None if isinstance(stdout, ChannelWriter) else stdout,
+            stderr,
+        )
         (
             self.p2cread,
             self.p2cwrite,
@@ -363,6 +374,9 @@ class ProcProxyThread(threading.Thread):
         self.close_fds = close_fds
         self.env = env
         self._interrupted = False
+        self._done = False
+        self._done_lock = threading.Lock()
+        self._on_done = []
 
         if xp.ON_WINDOWS:
             if self.p2cwrite != -1:
@@ -419,6 +433,10 @@ class ProcProxyThread(threading.Thread):
         if last_in_pipeline:
             capout = spec.captured_stdout  # NOQA
             caperr = spec.captured_stderr  # NOQA
+        # the pipeline closes the handles of the other procs, which must not
+        # be closed again when the streams are collected, as they may have
+        # been reused in the meantime.
+        closefd = last_in_pipeline or xp.ON_WINDOWS
         env = XSH.env
         enc = env.get("XONSH_ENCODING")
         err = env.get("XONSH_ENCODING_ERRORS")
@@ -432,25 +450,29 @@ class ProcProxyThread(threading.Thread):
         # get stdin
         if self.stdin is None:
             sp_stdin = None
+        elif isinstance(self.stdin, ChannelReader):
+            sp_stdin = self.stdin
         elif self.p2cread != -1:
             sp_stdin = io.TextIOWrapper(
-                open(self.p2cread, "rb", -1), encoding=enc, errors=err
+                open(self.p2cread, "rb", -1, closefd=closefd), encoding=enc, errors=err
             )
         else:
             sp_stdin = sys.stdin
         # stdout
-        if self.c2pwrite != -1:
+        if isinstance(self.stdout, ChannelWriter):
+            sp_stdout = self.stdout
+        elif self.c2pwrite != -1:
             sp_stdout = io.TextIOWrapper(
-                open(self.c2pwrite, "wb", -1), encoding=enc, errors=err
+                open(self.c2pwrite, "wb", -1, closefd=closefd), encoding=enc, errors=err
             )
         else:
             sp_stdout = sys.stdout
         # stderr
-        if self.errwrite == self.c2pwrite:
+        if self.errwrite == self.c2pwrite and not isinstance(sp_stdout, ChannelWriter):
             sp_stderr = sp_stdout
         elif self.errwrite != -1:
             sp_stderr = io.TextIOWrapper(
-                open(self.errwrite, "wb", -1), encoding=enc, errors=err
+                open(self.errwrite, "wb", -1, closefd=closefd), encoding=enc, errors=err
             )
         else:
             sp_stderr = sys.stderr
@@ -476,8 +498,11 @@ class ProcProxyThread(threading.Thread):
                         "stderr": sp_stderr,
                         "spec": spec,
                         "stack": spec.stack,
+                        "records": read_records(sp_stdin),
                     },
                 )
+                if isinstance(r, cabc.Iterator):
+                    r = write_records(r, sp_stdout)
         except SystemExit as e:
             r = e.code if isinstance(e.code, int) else int(bool(e.code))
         except OSError:
@@ -504,6 +529,11 @@ class ProcProxyThread(threading.Thread):
         safe_flush(sp_stdout)
         safe_flush(sp_stderr)
         self.returncode = parse_proxy_return(r, sp_stdout, sp_stderr)
+        # the channels end with the function, as pipes with a process
+        for handle in (sp_stdin, sp_stdout):
+            if isinstance(handle, ChannelReader | ChannelWriter):
+                handle.close()
+        self._set_done()
         if not last_in_pipeline and not xp.ON_WINDOWS:
             # mac requires us *not to* close the handles here while
             # windows requires us *to* close the handles here
@@ -518,6 +548,24 @@ class ProcProxyThread(threading.Thread):
         for handle in handles:
             safe_fdclose(handle, cache=self._closed_handle_cache)
 
+    def _set_done(self):
+        with self._done_lock:
+            self._done = True
+            on_done, self._on_done = self._on_done, []
+        for func in on_done:
+            func()
+
+    def call_when_done(self, func):
+        """Calls ``func`` once the function has returned, right away if it
+        already has. This lets the pipeline close the file descriptors the
+        function writes to without waiting for it.
+        """
+        with self._done_lock:
+            if not self._done and self.is_alive():
+                self._on_done.append(func)
+                return
+        func()
+
     def _wait_and_getattr(self, name):
         """make sure the instance has a certain attr, and return it."""
         while not hasattr(self, name):
@@ -561,6 +609,9 @@ class ProcProxyThread(threading.Thread):
         )
         for handle in handles:
             safe_fdclose(handle)
+        for handle in (self.stdin, self.stdout):
+            if isinstance(handle, ChannelReader | ChannelWriter):
+                handle.channel.close()
         if self.poll() is not None:
             self._restore_sigint(frame=frame)
         if xt.on_main_thread() and not xp.ON_WINDOWS:
@@ -790,8 +841,11 @@ class ProcProxy:
                         "stderr": stderr,
                         "spec": spec,
                         "stack": spec.stack,
+                        "records": read_records(stdin),
                     },
                 )
+                if isinstance(r, cabc.Iterator):
+                    r = write_records(r, stdout)
         except SystemExit as e:
             # the alias function is running in the main thread, so we need to
             # catch SystemExit to prevent the entire shell from exiting (see #5689)
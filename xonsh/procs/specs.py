@@ -7,7 +7,6 @@ import os
 import pathlib
 import re
 import shlex
-import signal
 import stat
 import subprocess
 import sys
@@ -18,6 +17,7 @@ import xonsh.platform as xp
 import xonsh.procs.jobs as xj
 import xonsh.tools as xt
 from xonsh.built_ins import XSH
+from xonsh.procs.channels import Channel
 from xonsh.procs.executables import locate_executable
 from xonsh.procs.pipelines import (
     STDOUT_CAPTURE_KINDS,
@@ -264,19 +264,6 @@ def _flatten_cmd_redirects(cmd):
     return new_cmd
 
 
-def default_signal_pauser(n, f):
-    """Pauses a signal, as needed."""
-    signal.pause()
-
-
-def no_pg_xonsh_preexec_fn():
-    """Default subprocess preexec function for when there is no existing
-    pipeline group.
-    """
-    os.setpgrp()
-    signal.signal(signal.SIGTSTP, default_signal_pauser)
-
-
 class DecoratorAlias:
     """Decorator alias base class."""
 
@@ -507,7 +494,7 @@ class SubprocSpec:
             p = self.cls(self.alias, self.cmd, **kwargs)
         else:
             self.prep_env_subproc(kwargs)
-            self.prep_preexec_fn(kwargs, pipeline_group=pipeline_group)
+            self.prep_process_group(kwargs, pipeline_group=pipeline_group)
             self._fix_null_cmd_bytes()
             p = self._run_binary(kwargs)
         p.spec = self
@@ -560,34 +547,32 @@ class SubprocSpec:
     def prep_env_subproc(self, kwargs):
         """Prepares the environment to use in the subprocess."""
         with XSH.env.swap(self.env) as env:
-            denv = env.detype()
+            denv = env.detyped_view()
         if xp.ON_WINDOWS:
             # Over write prompt variable as xonsh's $PROMPT does
             # not make much sense for other subprocs
-            denv["PROMPT"] = "$P$G"
+            denv = dict(denv, PROMPT="$P$G")
         kwargs["env"] = denv
 
-    def prep_preexec_fn(self, kwargs, pipeline_group=None):
-        """Prepares the 'preexec_fn' keyword argument"""
+    def prep_process_group(self, kwargs, pipeline_group=None):
+        """Prepares the 'process_group' keyword argument.
+
+        Unlike a ``preexec_fn``, it lets the process be spawned without
+        copying the memory mappings of the shell (with ``vfork()``). The
+        process starts with the default action of SIGTSTP, since the shell
+        handles this signal rather than ignoring it (see ``ignore_sigtstp()``).
+        """
         if not xp.ON_POSIX:
             return
         if not XSH.env.get("XONSH_INTERACTIVE"):
             return
         if pipeline_group is None or xp.ON_WSL1:
             # If there is no pipeline group
-            # or the platform is windows subsystem for linux (WSL)
-            xonsh_preexec_fn = no_pg_xonsh_preexec_fn
+            # or the platform is windows subsystem for linux (WSL),
+            # the process leads a new group
+            kwargs["process_group"] = 0
         else:
-
-            def xonsh_preexec_fn():
-                """Preexec function bound to a pipeline group."""
-                os.setpgid(0, pipeline_group)
-                signal.signal(
-                    signal.SIGTERM if xp.ON_WINDOWS else signal.SIGTSTP,
-                    default_signal_pauser,
-                )
-
-        kwargs["preexec_fn"] = xonsh_preexec_fn
+            kwargs["process_group"] = pipeline_group
 
     def _fix_null_cmd_bytes(self):
         # Popen does not accept null bytes in its input commands.
@@ -838,6 +823,19 @@ def _safe_pipe_properties(fd, use_tty=False):
         xli.fcntl.ioctl(fd, xli.termios.TIOCSWINSZ, winsize)
 
 
+def _enlarge_pipe(fd, size=1 << 20):
+    """Grows the buffer of a pipe where possible, so that large outputs are
+    captured in fewer and larger reads.
+    """
+    setpipe_sz = getattr(xli.fcntl, "F_SETPIPE_SZ", None) if xp.ON_LINUX else None
+    if setpipe_sz is None:
+        return
+    try:
+        xli.fcntl.fcntl(fd, setpipe_sz, size)
+    except OSError:
+        pass  # above /proc/sys/fs/pipe-max-size or the pipe quota
+
+
 def _update_last_spec(last):
     last.last_in_pipeline = True
 
@@ -906,6 +904,7 @@ def _make_last_spec_captured(last: SubprocSpec):
     elif captured in STDOUT_CAPTURE_KINDS:
         last.universal_newlines = False
         r, w = os.pipe()
+        _enlarge_pipe(w)
         last.stdout = safe_open(w, "wb")
         last.captured_stdout = safe_open(r, "rb")
     elif XSH.stdout_uncaptured is not None:
@@ -1031,7 +1030,12 @@ def cmds_to_specs(cmds, captured=False, envs=None):
             i += 1
     # now modify the subprocs based on the redirects.
     for i, redirect in enumerate(redirects):
-        if redirect == "|":
+        if redirect == "|" and _can_use_channel(specs[i], specs[i + 1]):
+            # callable aliases running on threads pass text to each other
+            channel = Channel()
+            specs[i].stdout = channel.writer
+            specs[i + 1].stdin = channel.reader
+        elif redirect == "|":
             # these should remain integer file descriptors, and not Python
             # file objects since they connect processes.
             r, w = os.pipe()
@@ -1059,6 +1063,29 @@ def cmds_to_specs(cmds, captured=False, envs=None):
     return specs
 
 
+def _can_use_channel(upstream, downstream):
+    """Whether two adjacent specs of a pipeline may be connected with an
+    in-process channel instead of an OS pipe.
+    """
+    return (
+        upstream.cls is ProcProxyThread
+        and downstream.cls is ProcProxyThread
+        and upstream.stdout is None
+        and upstream.stderr != subprocess.STDOUT
+        and downstream.stdin is None
+        and (XSH.env.get("XONSH_ALIAS_CHANNELS") or _takes_records(downstream))
+    )
+
+
+def _takes_records(spec):
+    """Whether the alias of a spec reads the records of the previous one."""
+    try:
+        sig = inspect.signature(getattr(spec.alias, "func", spec.alias))
+    except (TypeError, ValueError):
+        return False
+    return "records" in sig.parameters
+
+
 def _set_specs_capture_always(specs_to_capture):
     """Set XONSH_CAPTURE_ALWAYS for all specs."""
     for spec in specs_to_capture:
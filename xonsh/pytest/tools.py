@@ -155,5 +155,5 @@ def copy_env(old):
 
     env._d = internal
     env._vars = env._vars.copy()
-    env._detyped = None
+    env._invalidate_detyped()
     return env
@@ -8,12 +8,10 @@ import time
 from xonsh.ansi_colors import ansi_partial_color_format
 from xonsh.built_ins import XSH
 from xonsh.codecache import (
-    code_cache_check,
-    code_cache_name,
-    get_cache_filename,
+    CompiledCodeCache,
+    compiled_code_cache_filename,
     run_compiled_code,
     should_use_cache,
-    update_cache,
 )
 from xonsh.completer import Completer
 from xonsh.events import events
@@ -326,6 +324,16 @@ class BaseShell:
         self.precwd = (
             None  # The current working directory just before execution of the line
         )
+        self.code_cache = CompiledCodeCache(
+            maxsize=XSH.env.get("XONSH_CODE_CACHE_SIZE", 1024)
+        )
+        if should_use_cache(self.execer, "single"):
+            self.code_cache.load(compiled_code_cache_filename())
+            events.on_exit(self._dump_code_cache)
+
+    def _dump_code_cache(self, **_):
+        if self.code_cache.dirty:
+            self.code_cache.dump(compiled_code_cache_filename())
 
     @property
     def styler(self):
@@ -502,14 +510,6 @@ class BaseShell:
         """Compiles source code and returns the (possibly modified) source and
         a valid code object.
         """
-        _cache = should_use_cache(self.execer, "single")
-        if _cache:
-            codefname = code_cache_name(src)
-            cachefname = get_cache_filename(codefname, code=True)
-            usecache, code = code_cache_check(cachefname)
-            if usecache:
-                self.reset_buffer()
-                return src, code
         lincont = get_line_continuation()
         if src.endswith(lincont + "\n"):
             self.need_more_lines = True
@@ -522,9 +522,8 @@ class BaseShell:
                 locs=None,
                 filename="<stdin>",
                 compile_empty_tree=False,
+                cache=self.code_cache,
             )
-            if _cache:
-                update_cache(code, cachefname)
             self.reset_buffer()
         except SyntaxError:
             partial_string_info = check_for_partial_string(src)
@@ -212,6 +212,8 @@ class PromptToolkitShell(BaseShell):
 
         # Store original `_history_matches` in case we need to restore it
         self._history_matches_orig = self.prompter.default_buffer._history_matches
+        if self.history.history.window:
+            self.prompter.default_buffer.on_text_changed += self._load_more_history
         # This assumes that PromptToolkitShell is a singleton
         events.on_ptk_create.fire(
             prompter=self.prompter,
@@ -225,6 +227,13 @@ class PromptToolkitShell(BaseShell):
             [self.key_bindings, load_emacs_shift_selection_bindings()]
         )
 
+    def _load_more_history(self, buffer):
+        """Loads the next window of history once the oldest loaded entry
+        is reached.
+        """
+        if buffer.working_index == 0:
+            self.history.history.request_more()
+
     def get_lazy_ptk_kwargs(self):
         """These are non-essential attributes for the PTK shell to start.
         Lazy loading these later would save some startup time.
@@ -1,5 +1,7 @@
 """History object for use with prompt_toolkit."""
 
+import threading
+
 import prompt_toolkit.history
 
 from xonsh.built_ins import XSH
@@ -10,16 +12,47 @@ class PromptToolkitHistory(prompt_toolkit.history.History):
     with the xonsh backend.
     """
 
-    def __init__(self, load_prev=True, *args, **kwargs):
-        """Initialize history object."""
+    def __init__(self, load_prev=True, window=None, *args, **kwargs):
+        """Initialize history object.
+
+        Parameters
+        ----------
+        load_prev : bool, optional
+            Whether to load the history of the previous sessions.
+        window : int, optional
+            Number of entries loaded at a time, defaults to
+            ``$XONSH_PTK_HISTORY_WINDOW``. ``0`` loads everything.
+        """
         super().__init__()
         self.load_prev = load_prev
+        if window is None:
+            window = XSH.env.get("XONSH_PTK_HISTORY_WINDOW", 0)
+        self.window = window
+        self._nloaded = 0
+        self._nwanted = window
+        self._more = threading.Condition()
 
     def store_string(self, entry):
         pass
 
+    def request_more(self):
+        """Lets the loader go on with the next window of older entries."""
+        if not self.window:
+            return
+        with self._more:
+            self._nwanted = max(self._nwanted, self._nloaded + self.window)
+            self._more.notify_all()
+
+    def _wait_for_request(self):
+        with self._more:
+            self._more.wait_for(lambda: self._nloaded < self._nwanted)
+
     def load_history_strings(self):
-        """Loads synchronous history strings"""
+        """Loads synchronous history strings, newest first.
+
+        The history backend streams the entries, which are handed over one
+        window at a time when ``window`` is set.
+        """
         if not self.load_prev:
             return
         hist = XSH.history
@@ -29,7 +62,10 @@ class PromptToolkitHistory(prompt_toolkit.history.History):
         for cmd in hist.all_items(newest_first=True):
             line = cmd["inp"].rstrip()
             if line != prev_line:
+                if self.window:
+                    self._wait_for_request()
                 yield line
+                self._nloaded += 1
             prev_line = line
 
     def __getitem__(self, index):
@@ -9,6 +9,7 @@ The following time_it alias and Timer was forked from the IPython project:
 
 import gc
 import itertools
+import json
 import math
 import os
 import sys
@@ -338,3 +339,170 @@ def setup_timings(argv):
                 print(entry_format.format(name, ts - tstart, ts - prevtime))
                 prevtime = ts
             print(sepline)
+
+
+class StartupProfiler:
+    """Records the wall and CPU time of the startup phases together with the
+    modules that were imported during each of them.
+
+    A phase ``X`` starts with the ``pre_X`` timing probe and ends with the
+    ``post_X`` probe (see ``on_timingprobe``). Phases can be nested, each
+    phase keeps the name of its parent.
+    """
+
+    VERSION = 1
+
+    def __init__(self, output="-"):
+        self.output = output
+        self.phases = []
+        self.done = False
+        self._stack = []
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self._preloaded = len(sys.modules)
+
+    def start(self, name):
+        """Opens the phase ``name``."""
+        if self.done or name in [p["name"] for p, *_ in self._stack]:
+            return
+        phase = {
+            "name": name,
+            "parent": self._stack[-1][0]["name"] if self._stack else None,
+            "start": time.perf_counter() - self._wall0,
+        }
+        self.phases.append(phase)
+        self._stack.append(
+            (phase, time.perf_counter(), time.process_time(), set(sys.modules))
+        )
+
+    def stop(self, name):
+        """Closes the phase ``name`` and any phase still open inside of it."""
+        if self.done or name not in [p["name"] for p, *_ in self._stack]:
+            return
+        while self._stack:
+            phase, wall, cpu, modules = self._stack.pop()
+            phase["wall"] = time.perf_counter() - wall
+            phase["cpu"] = time.process_time() - cpu
+            phase["imports"] = sorted(set(sys.modules) - modules)
+            if phase["name"] == name:
+                break
+
+    def report(self):
+        """Returns the JSON-serializable report."""
+        return {
+            "version": self.VERSION,
+            "argv": sys.argv,
+            "python": sys.version.split()[0],
+            "wall": time.perf_counter() - self._wall0,
+            # CPU time is counted from the start of the process
+            "cpu": time.process_time(),
+            "preloaded_modules": self._preloaded,
+            "modules": len(sys.modules),
+            "phases": self.phases,
+        }
+
+    def finish(self):
+        """Closes all the phases and writes the report to ``output``,
+        which is either a file name or ``-`` for stderr."""
+        if self.done:
+            return
+        if self._stack:
+            self.stop(self._stack[0][0]["name"])
+        self.done = True
+        s = json.dumps(self.report(), indent=1)
+        if self.output == "-":
+            print(s, file=sys.stderr)
+        else:
+            with open(self.output, "w", encoding="utf-8") as f:
+                f.write(s + "\n")
+
+
+def setup_startup_profiler(argv):
+    """Starts a ``StartupProfiler`` when ``--profile-startup`` or
+    ``--profile-startup-file`` is in ``argv``.
+    The profile is written once the first prompt is shown or on exit, and the
+    profiler is then unregistered from the events. The profiler already
+    running is returned if there is one.
+    """
+    global _startup_profiler
+    if not any(
+        a == "--profile-startup" or a.startswith("--profile-startup-file")
+        for a in argv
+    ):
+        return None
+    if _startup_profiler is not None and not _startup_profiler.done:
+        return _startup_profiler
+    profiler = _startup_profiler = StartupProfiler()
+
+    def profile_on_timingprobe(name, **kw):
+        if name.startswith("pre_"):
+            profiler.start(name[4:])
+        elif name.startswith("post_"):
+            profiler.stop(name[5:])
+
+    def profile_on_pre_rc(**kw):
+        profiler.start("rc")
+
+    def profile_on_post_rc(**kw):
+        profiler.stop("rc")
+
+    def profile_on_pre_prompt_format(**kw):
+        profiler.start("first_prompt")
+
+    def profile_finish(**kw):
+        profiler.finish()
+        for event, handler in handlers:
+            event.discard(handler)
+
+    handlers = [
+        (events.on_timingprobe, profile_on_timingprobe),
+        (events.on_pre_rc, profile_on_pre_rc),
+        (events.on_post_rc, profile_on_post_rc),
+        (events.on_pre_prompt_format, profile_on_pre_prompt_format),
+        (events.on_pre_prompt, profile_finish),
+        (events.on_exit, profile_finish),
+    ]
+    for event, handler in handlers:
+        event(handler)
+    return profiler
+
+
+_startup_profiler = None
+
+
+def format_startup_diff(old, new):
+    """Formats the comparison of two ``StartupProfiler`` reports as a table of
+    the per-phase times followed by the modules each phase newly imports."""
+    old_phases = {p["name"]: p for p in old["phases"]}
+    new_phases = {p["name"]: p for p in new["phases"]}
+    names = list(old_phases)
+    names.extend(n for n in new_phases if n not in old_phases)
+
+    def ms(phase, key):
+        return phase.get(key, 0.0) * 1000 if phase else None
+
+    rows = [("total", old["wall"] * 1000, new["wall"] * 1000)]
+    rows.append(("total (cpu)", old["cpu"] * 1000, new["cpu"] * 1000))
+    for name in names:
+        o, n = old_phases.get(name), new_phases.get(name)
+        rows.append((name, ms(o, "wall"), ms(n, "wall")))
+        rows.append((f"{name} (cpu)", ms(o, "cpu"), ms(n, "cpu")))
+    width = max(len(r[0]) for r in rows) + 2
+    header_format = f"|{{:<{width}}}|{{:^11}}|{{:^11}}|{{:^11}}|"
+    sepline = "|{}|{}|{}|{}|".format("-" * width, "-" * 11, "-" * 11, "-" * 11)
+
+    def cell(val):
+        return "-" if val is None else f"{val:.1f}"
+
+    lines = [sepline, header_format.format("Phase", "Old (ms)", "New (ms)", "Delta")]
+    lines.append(sepline)
+    for name, o, n in rows:
+        delta = None if o is None or n is None else n - o
+        lines.append(header_format.format(name, cell(o), cell(n), cell(delta)))
+    lines.append(sepline)
+    for name in names:
+        o, n = old_phases.get(name) or {}, new_phases.get(name) or {}
+        added = sorted(set(n.get("imports", ())) - set(o.get("imports", ())))
+        if added:
+            lines.append(f"New imports in {name}: {', '.join(added)}")
+    return "\n".join(lines)
@@ -196,9 +196,12 @@ class EnvPath(cabc.MutableSequence):
     """A class that implements an environment path, which is a list of
     strings. Provides a custom method that expands all paths if the
     relevant env variable has been set.
+
+    The ``version`` attribute is incremented whenever the path is modified.
     """
 
     def __init__(self, args=None):
+        self.version = 0
         if not args:
             self._l = []
         else:
@@ -237,12 +240,14 @@ class EnvPath(cabc.MutableSequence):
 
     def __setitem__(self, index, item):
         self._l.__setitem__(index, item)
+        self.version += 1
 
     def __len__(self):
         return len(self._l)
 
     def __delitem__(self, key):
         self._l.__delitem__(key)
+        self.version += 1
 
     @staticmethod
     def _prepare_path(p):
@@ -250,16 +255,20 @@ class EnvPath(cabc.MutableSequence):
 
     def insert(self, index, value):
         self._l.insert(index, self._prepare_path(value))
+        self.version += 1
 
     def append(self, value):
         self._l.append(self._prepare_path(value))
+        self.version += 1
 
     def prepend(self, value):
         self._l.insert(0, self._prepare_path(value))
+        self.version += 1
 
     def remove(self, value):
         try:
             self._l.remove(self._prepare_path(value))
+            self.version += 1
         except ValueError:
             print(f"EnvPath warning: path {repr(value)} not found.", file=sys.stderr)
 
@@ -327,10 +336,12 @@ class EnvPath(cabc.MutableSequence):
         data = self._prepare_path(data)
         if data not in self._l:
             self._l.insert(0 if front else len(self._l), data)
+            self.version += 1
         elif replace:
             # https://stackoverflow.com/a/25251306/1621381
             self._l = list(filter(lambda x: x != data, self._l))
             self._l.insert(0 if front else len(self._l), data)
+            self.version += 1
 
 
 class FlexibleFormatter(string.Formatter):
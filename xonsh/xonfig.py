@@ -711,6 +711,25 @@ def _web(
     main.serve(browser)
 
 
+def _startup_diff(old: str, new: str):
+    """Compare two startup profiles written by ``xonsh --profile-startup``
+
+    Parameters
+    ----------
+    old
+        path to the report used as the baseline
+    new
+        path to the report that is compared with the baseline
+    """
+    from xonsh.timings import format_startup_diff
+
+    reports = []
+    for path in (old, new):
+        with open(path, encoding="utf-8") as f:
+            reports.append(json.load(f))
+    print(format_startup_diff(*reports))
+
+
 class XonfigAlias(ArgParserAlias):
     """Manage xonsh configuration."""
 
@@ -730,6 +749,7 @@ class XonfigAlias(ArgParserAlias):
         parser.add_command(_styles)
         parser.add_command(_colors)
         parser.add_command(_tutorial)
+        parser.add_command(_startup_diff)
         for fn in self.extra_commands:
             parser.add_command(fn)
 
@@ -160,7 +160,7 @@ def which(args, stdin=None, stdout=None, stderr=None, spec=None):
         # from os.environ so we temporarily override it with
         # __xosnh_env__['PATH']
         original_os_path = xp.os_environ["PATH"]
-        xp.os_environ["PATH"] = XSH.env.detype()["PATH"]
+        xp.os_environ["PATH"] = XSH.env.get_detyped("PATH")
         matches = _which.whichgen(arg, exts=exts, verbose=verbose)
         if matches is not None:
             for match in matches: